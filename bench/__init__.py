@@ -0,0 +1,6 @@
+"""
+Benchmarks
+
+Standalone scripts that measure the MapReduce building blocks. Run them
+from the repository root with `python -m bench.<script>`.
+"""
@@ -0,0 +1,317 @@
+"""
+End-to-end MapReduce benchmark of the gRPC and REST stacks.
+
+Generates synthetic corpora of Zipf-distributed words (cached in
+--corpus-dir, so the same size, vocabulary, exponent and seed always give
+the same file), starts N local workers of a stack as subprocesses on
+localhost ports, runs that stack's client against them and records the
+phase times of its PERFORMANCE SUMMARY, the throughput, and the peak RSS
+of the client and of every worker. Every combination of --stacks,
+--workers and --sizes-mb is run --repeat times, each with fresh workers.
+The word counts the client prints are checked against the number of words
+written to the corpus.
+
+Results are written to a JSON file (host, git commit, configuration and
+one object per run) so runs can be compared over time. Exits with status
+1 if a run failed or counted the wrong number of words.
+
+Usage (from the repository root, with the gRPC and REST requirements installed):
+    python -m bench.mapreduce_bench [--stacks grpc,rest] [--workers 1,2,4] [--sizes-mb 1,8]
+        [--vocabulary 50000] [--zipf 1.1] [--repeat 1] [--env CLIENT_MODE=async ...]
+        [--output mapreduce_bench.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import socket
+import string
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from itertools import accumulate
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Per stack: source directory, first worker port, and worker address as the client expects it
+STACKS = {
+    'grpc': {'dir': 'grpc', 'base_port': 50061, 'address': '127.0.0.1:{port}'},
+    'rest': {'dir': 'rest', 'base_port': 5101, 'address': 'http://127.0.0.1:{port}'},
+}
+WORDS_PER_LINE = 12
+LINES_PER_BATCH = 10000
+# Phase lines of the client's PERFORMANCE SUMMARY
+SUMMARY_TIMES = {
+    'total': 'Total Execution Time', 'map': 'Map Phase', 'shuffle': 'Shuffle Phase',
+    'reduce': 'Reduce Phase', 'overhead': r'Other \(overhead\)',
+}
+COUNT_LINE = re.compile(r'^  (\S+): (\d+)$', re.MULTILINE)
+
+
+def make_vocabulary(rng, size):
+    """Return size distinct lowercase words, shortest (so most frequent) first."""
+    seen = set()
+    vocabulary = []
+    while len(vocabulary) < size:
+        word = ''.join(rng.choices(string.ascii_lowercase, k=min(2 + int(rng.expovariate(0.4)), 16)))
+        if word not in seen:
+            seen.add(word)
+            vocabulary.append(word)
+    vocabulary.sort(key=len)
+    return vocabulary
+
+
+def generate_corpus(path, size_bytes, vocabulary_size, zipf, seed):
+    """Write about size_bytes of Zipf-distributed words to path and return the number of words.
+
+    Word rank r is drawn with weight 1 / r**zipf. Each line starts with a
+    capital letter and ends with a full stop, which the tokenizer removes,
+    so every written word is one token.
+    """
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(rng, vocabulary_size)
+    cum_weights = list(accumulate(1 / (rank + 1) ** zipf for rank in range(vocabulary_size)))
+    num_words = written = 0
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='ascii') as f:
+        while written < size_bytes:
+            words = rng.choices(vocabulary, cum_weights=cum_weights, k=WORDS_PER_LINE * LINES_PER_BATCH)
+            for start in range(0, len(words), WORDS_PER_LINE):
+                line = ' '.join(words[start:start + WORDS_PER_LINE]).capitalize() + '.\n'
+                f.write(line)
+                written += len(line)
+                num_words += WORDS_PER_LINE
+                if written >= size_bytes:
+                    break
+    os.replace(tmp_path, path)
+    return num_words
+
+
+def corpus_file(corpus_dir, size_mb, vocabulary, zipf, seed):
+    """Return (path, size in bytes, number of words) of a corpus, generating it on first use."""
+    path = os.path.join(corpus_dir, f'zipf-{size_mb:g}mb-v{vocabulary}-s{zipf:g}-seed{seed}.txt')
+    meta_path = path + '.json'
+    if os.path.exists(path) and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            num_words = json.load(f)['words']
+    else:
+        print(f"Generating {size_mb:g} MB corpus ({vocabulary} words, Zipf s={zipf:g}): {path}")
+        num_words = generate_corpus(path, int(size_mb * 1024 * 1024), vocabulary, zipf, seed)
+        with open(meta_path, 'w') as f:
+            json.dump({'words': num_words}, f)
+    return path, os.path.getsize(path), num_words
+
+
+def stack_env(stack, extra):
+    """Return the environment of a stack's processes: its directory and the repository root on PYTHONPATH."""
+    env = dict(os.environ)
+    paths = [os.path.join(REPO_ROOT, STACKS[stack]['dir']), REPO_ROOT]
+    if env.get('PYTHONPATH'):
+        paths.append(env['PYTHONPATH'])
+    env['PYTHONPATH'] = os.pathsep.join(paths)
+    env['PYTHONUNBUFFERED'] = '1'
+    env.update(extra)
+    return env
+
+
+def wait_for_port(port, process, log_path, timeout=30.0):
+    """Wait until a worker accepts connections on port, raising RuntimeError if it exits or times out."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Worker on port {port} exited with status {process.returncode}, see {log_path}")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Worker on port {port} did not start within {timeout:.0f}s, see {log_path}")
+
+
+def reap(process):
+    """Wait for a process to exit and return its peak RSS in MB."""
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss is in bytes on macOS and in KB elsewhere
+    return usage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def start_workers(stack, num_workers, env, log_dir):
+    """Start num_workers workers of a stack on consecutive ports and return (processes, addresses)."""
+    config = STACKS[stack]
+    processes, addresses = [], []
+    try:
+        for i in range(num_workers):
+            port = config['base_port'] + i
+            log_path = os.path.join(log_dir, f'{stack}-worker{i + 1}.log')
+            with open(log_path, 'w') as log:
+                process = subprocess.Popen(
+                    [sys.executable, '-m', 'server.worker'], cwd=os.path.join(REPO_ROOT, config['dir']),
+                    env=stack_env(stack, {**env, 'WORKER_ID': str(i + 1), 'PORT': str(port)}),
+                    stdout=log, stderr=subprocess.STDOUT)
+            processes.append(process)
+            addresses.append(config['address'].format(port=port))
+            wait_for_port(port, process, log_path)
+    except BaseException:
+        stop_workers(processes)
+        raise
+    return processes, addresses
+
+
+def stop_workers(processes):
+    """Stop workers with SIGTERM and return their peak RSS in MB."""
+    for process in processes:
+        if process.poll() is None:
+            process.terminate()
+    return [reap(process) if process.returncode is None else None for process in processes]
+
+
+def run_client(stack, env, timeout, log_path):
+    """Run a stack's client, logging to log_path, and return (exit status, output, peak RSS in MB)."""
+    with open(log_path, 'w+') as log:
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'client.client'], cwd=os.path.join(REPO_ROOT, STACKS[stack]['dir']),
+            env=stack_env(stack, env), stdout=log, stderr=subprocess.STDOUT)
+        timer = threading.Timer(timeout, process.kill)
+        timer.start()
+        try:
+            peak_rss = reap(process)
+        finally:
+            timer.cancel()
+        log.seek(0)
+        output = log.read()
+    return process.returncode, output, peak_rss
+
+
+def parse_summary(output):
+    """Return {phase: seconds} from a client's PERFORMANCE SUMMARY (None for a phase it did not time)."""
+    times = {}
+    for key, label in SUMMARY_TIMES.items():
+        match = re.search(rf'^\s*{label}:\s+([0-9.]+) seconds', output, re.MULTILINE)
+        times[key] = float(match.group(1)) if match else None
+    return times
+
+
+def counted_words(output):
+    """Return the sum of the word counts a client printed, or None if it printed none."""
+    start = output.find('FINAL WORD COUNTS')
+    end = output.find('PERFORMANCE SUMMARY', start)
+    if start < 0 or end < 0:
+        return None
+    return sum(int(count) for _, count in COUNT_LINE.findall(output, start, end))
+
+
+def record_run(stack, num_workers, size_mb, repeat, num_bytes, num_words, returncode, output,
+               client_rss, worker_rss):
+    """Return the JSON record of one client run."""
+    times = parse_summary(output)
+    words = counted_words(output)
+    total = times['total']
+    return {
+        'stack': stack, 'workers': num_workers, 'size_mb': size_mb, 'repeat': repeat,
+        'input_bytes': num_bytes, 'input_words': num_words, 'counted_words': words,
+        'returncode': returncode, 'ok': returncode == 0 and words == num_words,
+        'seconds': times,
+        'mb_per_second': num_bytes / (1024 * 1024) / total if total else None,
+        'words_per_second': num_words / total if total else None,
+        'peak_rss_mb': {'client': client_rss, 'workers': worker_rss},
+    }
+
+
+def print_run(run):
+    """Print one row of the results table."""
+    def cell(value, width, precision=3):
+        return f"{value:>{width}.{precision}f}" if value is not None else f"{'-':>{width}}"
+
+    times = run['seconds']
+    worker_rss = [rss for rss in run['peak_rss_mb']['workers'] if rss is not None]
+    mwords = run['words_per_second'] / 1e6 if run['words_per_second'] else None
+    check = 'ok' if run['ok'] else f"FAILED (exit {run['returncode']}, {run['counted_words']} words)"
+    print(f"{run['stack']:<6}{run['workers']:>8}{run['size_mb']:>7g}{cell(times['total'], 11)}"
+          f"{cell(times['map'], 9)}{cell(times['shuffle'], 13)}{cell(times['reduce'], 12)}"
+          f"{cell(run['mb_per_second'], 8, 2)}{cell(mwords, 8, 2)}{cell(run['peak_rss_mb']['client'], 11, 1)}"
+          f"{cell(max(worker_rss, default=None), 11, 1)}  {check}")
+
+
+def git_commit():
+    """Return the commit the benchmark ran on, or None outside a git checkout."""
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stacks', default='grpc,rest', help='comma-separated stacks to run (grpc, rest)')
+    parser.add_argument('--workers', default='1,2,4', help='comma-separated worker counts')
+    parser.add_argument('--sizes-mb', default='1,8', help='comma-separated corpus sizes in MB')
+    parser.add_argument('--vocabulary', type=int, default=50000, help='number of distinct words')
+    parser.add_argument('--zipf', type=float, default=1.1, help='Zipf exponent of the word frequencies')
+    parser.add_argument('--seed', type=int, default=435, help='corpus random seed')
+    parser.add_argument('--repeat', type=int, default=1, help='runs per combination')
+    parser.add_argument('--map-processes', type=int, default=1, help='MAP_PROCESSES of every worker')
+    parser.add_argument('--env', action='append', default=[], metavar='NAME=VALUE',
+                        help='extra environment for the clients and workers (repeatable)')
+    parser.add_argument('--timeout', type=float, default=600, help='seconds a client run may take')
+    parser.add_argument('--corpus-dir', default=os.path.join(tempfile.gettempdir(), 'mapreduce-bench'),
+                        help='directory of the generated corpora and the worker logs')
+    parser.add_argument('--output', default='mapreduce_bench.json', help='JSON results file')
+    args = parser.parse_args()
+
+    stacks = [stack.strip() for stack in args.stacks.split(',') if stack.strip()]
+    unknown = [stack for stack in stacks if stack not in STACKS]
+    if unknown:
+        parser.error(f"unknown stack(s): {', '.join(unknown)}")
+    worker_counts = [int(count) for count in args.workers.split(',')]
+    sizes = [float(size) for size in args.sizes_mb.split(',')]
+    extra_env = dict(item.split('=', 1) for item in args.env)
+    os.makedirs(args.corpus_dir, exist_ok=True)
+    corpora = {size: corpus_file(args.corpus_dir, size, args.vocabulary, args.zipf, args.seed) for size in sizes}
+
+    runs = []
+    ok = True
+    print(f"\n{'Stack':<6}{'Workers':>8}{'MB':>7}{'Total (s)':>11}{'Map (s)':>9}{'Shuffle (s)':>13}"
+          f"{'Reduce (s)':>12}{'MB/s':>8}{'Mtok/s':>8}{'Client MB':>11}{'Worker MB':>11}  Check")
+    for stack in stacks:
+        for num_workers in worker_counts:
+            for size in sizes:
+                path, num_bytes, num_words = corpora[size]
+                for repeat in range(args.repeat):
+                    # Local gRPC workers would all claim the default metrics port
+                    worker_env = {'MAP_PROCESSES': str(args.map_processes), 'METRICS_PORT': '0', **extra_env}
+                    workers, addresses = start_workers(stack, num_workers, worker_env, args.corpus_dir)
+                    try:
+                        client_env = {**extra_env, 'NUM_WORKERS': str(num_workers),
+                                      'WORKER_ADDRESSES': ','.join(addresses), 'INPUT_FILE': path}
+                        returncode, output, client_rss = run_client(
+                            stack, client_env, args.timeout, os.path.join(args.corpus_dir, f'{stack}-client.log'))
+                    finally:
+                        worker_rss = stop_workers(workers)
+                    run = record_run(stack, num_workers, size, repeat, num_bytes, num_words,
+                                     returncode, output, client_rss, worker_rss)
+                    ok = ok and run['ok']
+                    runs.append(run)
+                    print_run(run)
+
+    results = {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'host': {'platform': platform.platform(), 'python': platform.python_version(), 'cpus': os.cpu_count()},
+        'git_commit': git_commit(),
+        'config': vars(args),
+        'runs': runs,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
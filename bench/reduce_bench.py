@@ -0,0 +1,153 @@
+"""
+REST reduce payload benchmark.
+
+Builds the /reduce request of one reducer from synthetic map results
+(Zipf-distributed words, one {word: count} dictionary per map task) in each
+format the REST worker accepts, and compares encoded size, client-side
+encode time and worker-side decode + aggregate time:
+
+  json-dicts       {"counts": [{word: count}, ...]}, one dict per pair (original format)
+  json-columnar    {"keys", "lengths", "counts"} summed with sum_groups()
+  binary-pairs     application/vnd.wordcount.kv
+  binary-columnar  application/vnd.wordcount.kv-columnar summed with sum_groups()
+
+Exits with status 1 if any format aggregates to different counts.
+
+Usage (from the repository root):
+    python -m bench.reduce_bench [--maps 32] [--vocabulary 200000] [--words 100000] [--repeat 3]
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from itertools import accumulate
+
+from common.kvcodec import decode_columnar, decode_pairs, encode_columnar, encode_pairs, sum_groups
+
+
+def generate_map_results(rng, num_maps, vocabulary_size, words_per_map):
+    """Return one Counter per map task of Zipf-distributed words."""
+    vocabulary = [f'w{i}' for i in range(vocabulary_size)]
+    weights = list(accumulate(1 / (rank + 1) for rank in range(vocabulary_size)))
+    return [Counter(rng.choices(vocabulary, cum_weights=weights, k=words_per_map)) for _ in range(num_maps)]
+
+
+def shuffle(map_results):
+    """Group counts by word, as the REST client does before the reduce phase."""
+    grouped = defaultdict(list)
+    for counts in map_results:
+        for word, count in counts.items():
+            grouped[word].append(count)
+    return grouped
+
+
+def encode_json_dicts(grouped):
+    return json.dumps({"counts": [{key: count} for key, group in grouped.items() for count in group]}).encode('utf-8')
+
+
+def reduce_json_dicts(body):
+    final_counts = defaultdict(int)
+    for count_dict in json.loads(body)["counts"]:
+        for key, count in count_dict.items():
+            final_counts[key] += count
+    return final_counts
+
+
+def columns(grouped):
+    """Return the (keys, lengths, counts) columns of grouped counts."""
+    keys, lengths, counts = [], [], []
+    for key, group in grouped.items():
+        keys.append(key)
+        lengths.append(len(group))
+        counts.extend(group)
+    return keys, lengths, counts
+
+
+def encode_json_columnar(grouped):
+    keys, lengths, counts = columns(grouped)
+    return json.dumps({"keys": keys, "lengths": lengths, "counts": counts}).encode('utf-8')
+
+
+def reduce_json_columnar(body):
+    payload = json.loads(body)
+    return sum_groups(payload["keys"], payload["lengths"], payload["counts"])
+
+
+def encode_binary_pairs(grouped):
+    keys, counts = [], []
+    for key, group in grouped.items():
+        keys.extend([key] * len(group))
+        counts.extend(group)
+    return encode_pairs(keys, counts)
+
+
+def reduce_binary_pairs(body):
+    final_counts = defaultdict(int)
+    keys, counts = decode_pairs(body)
+    for key, count in zip(keys, counts):
+        final_counts[key] += count
+    return final_counts
+
+
+def encode_binary_columnar(grouped):
+    return encode_columnar(*columns(grouped))
+
+
+def reduce_binary_columnar(body):
+    return sum_groups(*decode_columnar(body))
+
+
+FORMATS = {
+    'json-dicts': (encode_json_dicts, reduce_json_dicts),
+    'json-columnar': (encode_json_columnar, reduce_json_columnar),
+    'binary-pairs': (encode_binary_pairs, reduce_binary_pairs),
+    'binary-columnar': (encode_binary_columnar, reduce_binary_columnar),
+}
+
+
+def best_time(function, argument, repeat):
+    """Return the result and best wall time of function(argument) over repeat runs."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(argument)
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--maps', type=int, default=32, help='number of map results to shuffle')
+    parser.add_argument('--vocabulary', type=int, default=200000, help='number of distinct words')
+    parser.add_argument('--words', type=int, default=100000, help='words counted by each map task')
+    parser.add_argument('--repeat', type=int, default=3, help='timing runs per format')
+    args = parser.parse_args()
+
+    rng = random.Random(435)
+    grouped = shuffle(generate_map_results(rng, args.maps, args.vocabulary, args.words))
+    expected = {key: sum(group) for key, group in grouped.items()}
+    num_pairs = sum(len(group) for group in grouped.values())
+    print(f"Reduce payload: {len(grouped)} unique words, {num_pairs} (word, count) pairs from {args.maps} map results")
+
+    ok = True
+    baseline = None
+    print(f"\n{'Format':<17}{'Size (MB)':>11}{'Encode (s)':>12}{'Reduce (s)':>12}{'Total (s)':>11}{'Speedup':>9}")
+    for name, (encode, reduce) in FORMATS.items():
+        body, encode_time = best_time(encode, grouped, args.repeat)
+        result, reduce_time = best_time(reduce, body, args.repeat)
+        if dict(result) != expected:
+            print(f"!!! {name} aggregated to different counts")
+            ok = False
+        total = encode_time + reduce_time
+        baseline = baseline or total
+        print(f"{name:<17}{len(body) / (1024 * 1024):>11.2f}{encode_time:>12.4f}{reduce_time:>12.4f}"
+              f"{total:>11.4f}{baseline / total:>8.1f}x")
+
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+Tokenizer parity check and micro-benchmark.
+
+Checks that common.tokenizer.tokenize() returns exactly the same tokens as
+tokenize_reference() on the parity corpus (tokenizer_corpus.txt, whole file
+and line by line) and on random text drawn from the whole Unicode range,
+then times both implementations on ASCII and on mixed ASCII/Unicode text.
+Exits with status 1 if any input tokenizes differently.
+
+Usage (from the repository root):
+    python -m bench.tokenizer_bench [--size-mb 8] [--repeat 3] [--fuzz 2000]
+"""
+
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+from common.tokenizer import tokenize, tokenize_reference
+
+CORPUS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tokenizer_corpus.txt')
+
+
+def check_parity(text, label):
+    """Return True if both tokenizers agree on text, printing the first difference otherwise."""
+    expected = tokenize_reference(text)
+    actual = tokenize(text)
+    if actual == expected:
+        return True
+    for i, (want, got) in enumerate(zip(expected, actual)):
+        if want != got:
+            print(f"!!! Parity mismatch in {label} at token {i}: expected {want!r}, got {got!r}")
+            return False
+    print(f"!!! Parity mismatch in {label}: expected {len(expected)} tokens, got {len(actual)}")
+    return False
+
+
+def random_unicode_text(rng, length):
+    """Return text of random code points, biased towards whitespace and punctuation."""
+    pool = string.whitespace + string.punctuation + '\u00a0\u0085\u2003\u2028\u3000\u200b\u0301'
+    chars = []
+    for _ in range(length):
+        if rng.random() < 0.3:
+            chars.append(rng.choice(pool))
+        else:
+            chars.append(chr(rng.randrange(0x110000)))
+    return ''.join(chars)
+
+
+def generate_text(rng, size, alphabet, punctuation):
+    """Return about size characters of words from alphabet with trailing punctuation."""
+    vocabulary = [''.join(rng.choices(alphabet, k=rng.randint(1, 10))) for _ in range(5000)]
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(vocabulary) + rng.choice(punctuation)
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)
+
+
+def time_tokenizer(tokenizer, text, repeat):
+    """Return the best wall time of tokenizer(text) over repeat runs."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        tokenizer(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', type=float, default=8, help='size of each benchmark text in MB')
+    parser.add_argument('--repeat', type=int, default=3, help='timing runs per implementation')
+    parser.add_argument('--fuzz', type=int, default=2000, help='number of random Unicode parity inputs')
+    args = parser.parse_args()
+
+    # Parity: corpus file, each corpus line, and random Unicode text
+    with open(CORPUS_FILE, encoding='utf-8', newline='') as f:
+        corpus = f.read()
+    ok = check_parity(corpus, 'corpus')
+    lines = corpus.split('\n')
+    for number, line in enumerate(lines, start=1):
+        ok = check_parity(line, f'corpus line {number}') and ok
+    rng = random.Random(435)
+    for i in range(args.fuzz):
+        ok = check_parity(random_unicode_text(rng, rng.randint(0, 200)), f'fuzz input {i}') and ok
+    print(f"Parity: {'OK' if ok else 'FAILED'} (corpus, {len(lines)} lines, {args.fuzz} fuzz inputs)")
+
+    # Benchmark
+    size = int(args.size_mb * 1024 * 1024)
+    ascii_punctuation = ['', '', '', ',', '.', "'s", '!', '?', ';', ')', '"']
+    texts = {
+        'ascii': generate_text(rng, size, string.ascii_letters + string.digits, ascii_punctuation),
+        'unicode': generate_text(rng, size, string.ascii_letters + 'éüñßçøåæœαβγδεжзий中文',
+                                 ascii_punctuation + ['—', '»', '、', '。']),
+    }
+    print(f"\n{'Input':<10}{'Reference (s)':>16}{'Fast (s)':>12}{'Speedup':>10}{'MB/s':>10}")
+    for name, text in texts.items():
+        ok = check_parity(text, f'{name} benchmark text') and ok
+        reference = time_tokenizer(tokenize_reference, text, args.repeat)
+        fast = time_tokenizer(tokenize, text, args.repeat)
+        megabytes = len(text.encode('utf-8')) / (1024 * 1024)
+        print(f"{name:<10}{reference:>16.4f}{fast:>12.4f}{reference / fast:>9.1f}x{megabytes / fast:>10.1f}")
+
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
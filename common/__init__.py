@@ -0,0 +1,7 @@
+"""
+Shared MapReduce Helpers
+
+Code used by both the gRPC and the REST stacks. Each stack's Docker build
+copies this package into the image as /app/common (see the
+`additional_contexts` entries in the docker-compose files).
+"""
@@ -0,0 +1,140 @@
+"""
+asyncio counterpart of common.scheduler for the async coordinators.
+
+Every task is a coroutine that waits for a free request slot on any worker
+(at most in_flight_per_worker requests per worker at a time), so many
+requests stay in flight without a thread each and a fast worker frees
+slots, and therefore takes tasks, more often. With an affinity, a task
+waits for a slot on the worker it prefers and only takes another worker's
+slot that no waiting task prefers. A failed attempt waits an
+exponential backoff and takes a slot on a worker it has not failed on yet,
+up to max_attempts; if a task has no attempts left, run() raises
+JobFailedError. There are no speculative backups.
+
+Backpressure: a worker whose attempt fails with an overloaded(error) error
+(e.g. a deadline or resource exhaustion) loses one of its slots, down to a
+single one, and gets it back one success at a time, so a slowing worker
+is sent fewer concurrent requests until it recovers.
+"""
+
+import asyncio
+import time
+
+from common.scheduler import JobFailedError, task_summary_lines
+
+
+class AsyncTaskScheduler:
+    """Run tasks on workers with bounded in-flight requests per worker and retries.
+
+    run_task(worker_index, task, attempt) is a coroutine function that
+    performs attempt number attempt (starting at 1) of a task on a worker.
+    A failed attempt is retried only if retryable(error) is true, and
+    shrinks the worker's in-flight limit if overloaded(error) is true.
+    """
+
+    def __init__(self, num_workers, in_flight_per_worker=4, max_attempts=3, retry_backoff=0.5,
+                 retryable=None, overloaded=None):
+        self.num_workers = num_workers
+        self.in_flight_per_worker = in_flight_per_worker
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.retryable = retryable or (lambda error: True)
+        self.overloaded = overloaded or (lambda error: False)
+        self.latencies = {}  # task index -> latency of the successful attempt
+        self.retries = 0
+        self.failed_tasks = []
+        self.throttled = 0  # slots taken away from overloaded workers
+
+    async def _acquire(self, condition, free_slots, excluded, preferred=None, waiting=None):
+        """Wait for a free slot, preferring workers not in excluded, and return its worker.
+
+        If preferred is set, its free slot is taken first, and other workers
+        are used only while no waiting task prefers them (waiting[w] counts
+        the tasks waiting for worker w).
+        """
+        async with condition:
+            if preferred is not None:
+                waiting[preferred] += 1
+            try:
+                while True:
+                    allowed = [w for w in range(self.num_workers) if w not in excluded] or range(self.num_workers)
+                    if preferred in allowed and free_slots[preferred] > 0:
+                        free_slots[preferred] -= 1
+                        return preferred
+                    candidates = [w for w in allowed if free_slots[w] > 0 and not (waiting and waiting[w])]
+                    if candidates:
+                        worker_index = max(candidates, key=lambda w: free_slots[w])
+                        free_slots[worker_index] -= 1
+                        return worker_index
+                    await condition.wait()
+            finally:
+                if preferred is not None:
+                    waiting[preferred] -= 1
+
+    async def run(self, tasks, run_task, on_result=None, on_error=None, affinity=None):
+        """Run every task and return their results in task order.
+
+        on_result(task_index, result) is called once per task as soon as its
+        result is available; on_error(task_index, worker_index, error) is
+        called for every failed attempt. affinity(task_index), if given,
+        returns the worker a task should preferably run on. Raises
+        JobFailedError if a task failed on all of its attempts.
+        """
+        tasks = list(tasks)
+        results = [None] * len(tasks)
+        free_slots = [self.in_flight_per_worker] * self.num_workers
+        limits = [self.in_flight_per_worker] * self.num_workers
+        waiting = [0] * self.num_workers  # Tasks waiting for a slot on the worker they prefer
+        condition = asyncio.Condition()
+
+        async def run_one(index):
+            excluded = set()
+            for attempt in range(1, self.max_attempts + 1):
+                preferred = affinity(index) if affinity else None
+                if preferred in excluded:
+                    preferred = None
+                worker_index = await self._acquire(condition, free_slots, excluded, preferred, waiting)
+                start = time.perf_counter()
+                result = error = None
+                try:
+                    result = await run_task(worker_index, tasks[index], attempt)
+                except Exception as e:
+                    error = e
+                finally:
+                    async with condition:
+                        if error is None and limits[worker_index] < self.in_flight_per_worker:
+                            # Recovered: give back one slot taken for overload
+                            limits[worker_index] += 1
+                            free_slots[worker_index] += 1
+                        if error is not None and self.overloaded(error) and limits[worker_index] > 1:
+                            limits[worker_index] -= 1
+                            self.throttled += 1
+                        else:
+                            free_slots[worker_index] += 1
+                        condition.notify_all()
+                if error is None:
+                    self.latencies[index] = time.perf_counter() - start
+                    results[index] = result
+                    if on_result:
+                        on_result(index, result)
+                    return
+                if on_error:
+                    on_error(index, worker_index, error)
+                if not self.retryable(error) or attempt == self.max_attempts:
+                    break
+                excluded.add(worker_index)
+                self.retries += 1
+                await asyncio.sleep(self.retry_backoff * 2 ** (attempt - 1))
+            self.failed_tasks.append(index)
+
+        await asyncio.gather(*(run_one(index) for index in range(len(tasks))))
+        if self.failed_tasks:
+            raise JobFailedError(self.failed_tasks, self.max_attempts)
+        return results
+
+    def summary_lines(self, label):
+        """Return performance summary lines describing the last run."""
+        lines = task_summary_lines(label, self.latencies.values(), len(self.failed_tasks), self.retries)
+        if self.throttled:
+            lines.append(f"{'  ' + label + ' Throttled:':<25}{self.throttled} slot(s) taken from overloaded workers")
+        return lines
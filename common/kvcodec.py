@@ -0,0 +1,142 @@
+"""
+Compact binary encodings of word counts for the REST stack.
+
+Pairs layout, MEDIA_TYPE (all integers little-endian):
+    b'WCKV' magic, uint32 number of pairs n,
+    n int64 counts,
+    the n UTF-8 keys joined by b'\\n'.
+
+Columnar layout, COLUMNAR_MEDIA_TYPE, used for reduce requests: every key
+appears once, with the number of counts it has (one per map result) and
+its counts stored back to back:
+    b'WCKC' magic, uint32 number of keys n, uint32 number of counts m,
+    n uint32 lengths, m int64 counts,
+    the n UTF-8 keys joined by b'\\n'.
+
+Keys come from tokenize(), which splits on whitespace, so they never
+contain '\\n'. Numbers are packed and unpacked with array() in a single
+C-level copy, and keys with one join/split, instead of building and
+parsing a JSON object per pair. sum_groups() reduces the columnar layout
+without a Python-level loop over the counts.
+"""
+
+import operator
+import struct
+import sys
+from array import array
+from itertools import accumulate
+
+MEDIA_TYPE = 'application/vnd.wordcount.kv'
+COLUMNAR_MEDIA_TYPE = 'application/vnd.wordcount.kv-columnar'
+MAGIC = b'WCKV'
+COLUMNAR_MAGIC = b'WCKC'
+_HEADER = struct.Struct('<4sI')
+_COLUMNAR_HEADER = struct.Struct('<4sII')
+
+
+def _to_bytes(values):
+    """Return the little-endian bytes of an array."""
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_bytes(typecode, data):
+    """Return an array of typecode from little-endian bytes."""
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def _split_keys(data, num_keys):
+    """Decode num_keys newline-joined UTF-8 keys."""
+    keys = data.decode('utf-8').split('\n') if num_keys else []
+    if len(keys) != num_keys:
+        raise ValueError(f"Expected {num_keys} keys, got {len(keys)}")
+    return keys
+
+
+def encode_pairs(keys, counts):
+    """Encode parallel lists of keys and int counts."""
+    values = array('q', counts)
+    if len(values) != len(keys):
+        raise ValueError(f"{len(keys)} keys but {len(values)} counts")
+    return b''.join((_HEADER.pack(MAGIC, len(values)), _to_bytes(values), '\n'.join(keys).encode('utf-8')))
+
+
+def decode_pairs(data):
+    """Decode a payload into (list of keys, array of counts)."""
+    if len(data) < _HEADER.size:
+        raise ValueError("Truncated key/count payload")
+    magic, num_pairs = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a key/count payload")
+    counts_end = _HEADER.size + 8 * num_pairs
+    if len(data) < counts_end:
+        raise ValueError("Truncated key/count payload")
+    values = _from_bytes('q', data[_HEADER.size:counts_end])
+    return _split_keys(data[counts_end:], num_pairs), values
+
+
+def encode_counts(counts):
+    """Encode a {word: count} dictionary."""
+    return encode_pairs(list(counts), list(counts.values()))
+
+
+def decode_counts(data):
+    """Decode a payload of unique keys into a {word: count} dictionary."""
+    keys, values = decode_pairs(data)
+    return dict(zip(keys, values))
+
+
+def encode_columnar(keys, lengths, counts):
+    """Encode unique keys, the number of counts of each key, and all counts back to back."""
+    lengths = array('I', lengths)
+    counts = array('q', counts)
+    if len(lengths) != len(keys) or sum(lengths) != len(counts):
+        raise ValueError("Lengths do not match the keys and counts")
+    header = _COLUMNAR_HEADER.pack(COLUMNAR_MAGIC, len(keys), len(counts))
+    return b''.join((header, _to_bytes(lengths), _to_bytes(counts), '\n'.join(keys).encode('utf-8')))
+
+
+def decode_columnar(data):
+    """Decode a columnar payload into (list of keys, array of lengths, array of counts)."""
+    if len(data) < _COLUMNAR_HEADER.size:
+        raise ValueError("Truncated columnar payload")
+    magic, num_keys, num_counts = _COLUMNAR_HEADER.unpack_from(data)
+    if magic != COLUMNAR_MAGIC:
+        raise ValueError("Not a columnar payload")
+    lengths_end = _COLUMNAR_HEADER.size + 4 * num_keys
+    counts_end = lengths_end + 8 * num_counts
+    if len(data) < counts_end:
+        raise ValueError("Truncated columnar payload")
+    lengths = _from_bytes('I', data[_COLUMNAR_HEADER.size:lengths_end])
+    counts = _from_bytes('q', data[lengths_end:counts_end])
+    if sum(lengths) != num_counts:
+        raise ValueError("Lengths do not match the counts")
+    return _split_keys(data[counts_end:], num_keys), lengths, counts
+
+
+def sum_groups(keys, lengths, counts):
+    """Return {key: sum of its counts} for a columnar payload.
+
+    Each key's total is the difference of two prefix sums of the counts, so
+    the work is done by accumulate() and map() in C rather than a Python
+    loop over every count. Keys listed more than once are added together.
+    """
+    prefix = list(accumulate(counts, initial=0))
+    ends = list(accumulate(lengths))
+    if len(counts) != (ends[-1] if ends else 0):
+        raise ValueError("Lengths do not match the counts")
+    if len(keys) != len(ends):
+        raise ValueError(f"{len(keys)} keys but {len(ends)} lengths")
+    totals = list(map(operator.sub, map(prefix.__getitem__, ends), map(prefix.__getitem__, [0] + ends[:-1])))
+    result = dict(zip(keys, totals))
+    if len(result) < len(keys):
+        result = {}
+        for key, total in zip(keys, totals):
+            result[key] = result.get(key, 0) + total
+    return result
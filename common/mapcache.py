@@ -0,0 +1,210 @@
+"""
+Content-addressed cache of map results on the workers of both stacks.
+
+The word counts of a chunk depend only on its bytes and on the tokenizer,
+so a worker can keep them under the SHA-256 digest of the chunk's UTF-8
+bytes. A coordinator running over a mostly unchanged corpus first sends a
+chunk's digest and uploads the chunk only if the worker has no counts for
+it (a miss); the upload carries the digest again, and the worker checks it
+against the bytes before caching the counts under it.
+
+Entries are stored encoded with common.kvcodec, least recently used first
+out, up to max_bytes in memory. With a spill directory, every entry is
+also written there, up to spill_bytes (again least recently used first
+out), so an entry evicted from memory is read back from disk on a hit.
+Spill files are named after TOKENIZER_VERSION and the digest, so they are
+found again after a worker restart and ignored once the tokenizer
+changes. The directory must not be shared between workers.
+"""
+
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from common.kvcodec import decode_counts, encode_counts
+from common.tokenizer import TOKENIZER_VERSION
+
+# Header carrying the digest of an uploaded /map chunk (REST)
+DIGEST_HEADER = 'X-Chunk-Digest'
+_DIGEST = re.compile(r'[0-9a-f]{64}')
+_SPILL_FILE = re.compile(rf'v{TOKENIZER_VERSION}-([0-9a-f]{{64}})\.kv')
+
+
+def chunk_digest(data):
+    """Return the hex SHA-256 digest of a chunk's UTF-8 bytes (any bytes-like object)."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def check_digest(digest):
+    """Return digest if it is a hex SHA-256 digest, raising ValueError otherwise."""
+    if not _DIGEST.fullmatch(digest or ''):
+        raise ValueError(f"Invalid chunk digest: {digest!r}")
+    return digest
+
+
+def verify_digest(digest, data):
+    """Raise ValueError unless digest is the digest of data."""
+    if chunk_digest(data) != check_digest(digest):
+        raise ValueError("Chunk digest does not match the uploaded chunk")
+
+
+class MapResultCache:
+    """Bounded LRU cache of {word: count} map results keyed by chunk digest, thread-safe."""
+
+    def __init__(self, max_bytes, spill_dir='', spill_bytes=0):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.spill_bytes = spill_bytes if spill_dir else 0
+        self.memory = OrderedDict()   # digest -> encoded counts, least recently used first
+        self.memory_size = 0
+        self.spilled = OrderedDict()  # digest -> spill file size, least recently used first
+        self.spilled_size = 0
+        self.hits = 0
+        self.spill_hits = 0  # Hits read back from the spill directory
+        self.misses = 0
+        self.lock = threading.Lock()
+        if self.spill_bytes:
+            os.makedirs(spill_dir, exist_ok=True)
+            self._load_spilled()
+
+    @property
+    def enabled(self):
+        """True if the cache can hold any entry."""
+        return self.max_bytes > 0 or self.spill_bytes > 0
+
+    def _spill_path(self, digest):
+        return os.path.join(self.spill_dir, f'v{TOKENIZER_VERSION}-{digest}.kv')
+
+    def _load_spilled(self):
+        """Index the spill files left by an earlier run, oldest first."""
+        entries = []
+        for name in os.listdir(self.spill_dir):
+            match = _SPILL_FILE.fullmatch(name)
+            if match:
+                stat = os.stat(os.path.join(self.spill_dir, name))
+                entries.append((stat.st_mtime, match.group(1), stat.st_size))
+        for _, digest, size in sorted(entries):
+            self.spilled[digest] = size
+            self.spilled_size += size
+        self._evict_spilled()
+
+    def _evict_spilled(self):
+        while self.spilled_size > self.spill_bytes:
+            digest, size = self.spilled.popitem(last=False)
+            self.spilled_size -= size
+            try:
+                os.remove(self._spill_path(digest))
+            except OSError:
+                pass
+
+    def _spill(self, digest, data):
+        """Write an entry to the spill directory, if it fits there."""
+        if digest in self.spilled:
+            self.spilled.move_to_end(digest)
+            return
+        if len(data) > self.spill_bytes:
+            return
+        path = self._spill_path(digest)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self.spilled[digest] = len(data)
+        self.spilled_size += len(data)
+        self._evict_spilled()
+
+    def _store(self, digest, data):
+        """Put an entry in memory, evicting the least recently used ones that no longer fit."""
+        if digest in self.memory:
+            self.memory.move_to_end(digest)
+            return
+        if len(data) > self.max_bytes:
+            return
+        self.memory[digest] = data
+        self.memory_size += len(data)
+        while self.memory_size > self.max_bytes:
+            _, evicted_data = self.memory.popitem(last=False)
+            self.memory_size -= len(evicted_data)
+
+    def get(self, digest):
+        """Return the cached {word: count} of a chunk digest, or None on a miss."""
+        check_digest(digest)
+        with self.lock:
+            data = self.memory.get(digest)
+            if data is not None:
+                self.memory.move_to_end(digest)
+            elif digest in self.spilled:
+                try:
+                    with open(self._spill_path(digest), 'rb') as f:
+                        data = f.read()
+                except OSError:
+                    self.spilled_size -= self.spilled.pop(digest)
+                else:
+                    self.spilled.move_to_end(digest)
+                    self.spill_hits += 1
+                    self._store(digest, data)
+            if data is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return decode_counts(data)
+
+    def put(self, digest, counts):
+        """Cache the {word: count} map result of a chunk digest."""
+        check_digest(digest)
+        if not self.enabled:
+            return
+        data = encode_counts(counts)
+        with self.lock:
+            self._store(digest, data)
+            if self.spill_bytes:
+                self._spill(digest, data)
+
+    def summary(self):
+        """Return a one-line description of the cache's hits and contents."""
+        with self.lock:
+            text = (f"{self.hits} hit(s) ({self.spill_hits} from disk), {self.misses} miss(es), "
+                    f"{len(self.memory)} entries ({self.memory_size / (1024 * 1024):.2f} MB) in memory")
+            if self.spill_bytes:
+                text += f", {len(self.spilled)} ({self.spilled_size / (1024 * 1024):.2f} MB) on disk"
+        return text
+
+
+class MapCacheStats:
+    """Coordinator-side outcome of the cache probes sent before map uploads, thread-safe."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0  # Chunk bytes a hit spared sending
+        self.lock = threading.Lock()
+
+    def record(self, hit, num_bytes):
+        """Count one probe for a chunk of num_bytes bytes."""
+        with self.lock:
+            if hit:
+                self.hits += 1
+                self.bytes_saved += num_bytes
+            else:
+                self.misses += 1
+
+    def summary_lines(self):
+        """Return performance summary lines with the hit rate and the input bytes not sent."""
+        probes = self.hits + self.misses
+        if not probes:
+            return []
+        return [f"{'Map Cache:':<26}{self.hits}/{probes} hit(s) ({100 * self.hits / probes:.1f}%), "
+                f"{self.bytes_saved / (1024 * 1024):.2f} MB of input not sent"]
+
+
+def cache_affinity(addresses):
+    """Return affinity(task_index) -> index in addresses of the worker that should map a chunk.
+
+    Chunk i goes to the same worker address on every run with the same
+    workers (round-robin over the sorted addresses), so its counts are
+    found in that worker's cache.
+    """
+    by_address = sorted(range(len(addresses)), key=addresses.__getitem__)
+    return lambda task_index: by_address[task_index % len(by_address)]
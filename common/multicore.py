@@ -0,0 +1,108 @@
+"""
+Multi-core map execution for a single worker.
+
+Tokenizing is pure-Python CPU work, so threads inside one worker process
+share a single core because of the GIL. MapProcessPool fans a large chunk
+out over a process pool sized to the container's CPU quota: the chunk is
+sub-split at whitespace, each part is counted in a separate process and the
+partial counts are merged.
+"""
+
+import math
+import os
+import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+_WHITESPACE = re.compile(r'\s')
+
+
+def cpu_quota():
+    """Return how many CPUs this process may use (cgroup quota, then CPU affinity)."""
+    available = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+    quota = None
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            limit, period = f.read().split()
+        if limit != 'max':
+            quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1: quota is -1 when unlimited
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+                limit = int(f.read())
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+                period = int(f.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+    if quota is not None:
+        available = min(available, math.ceil(quota))
+    return max(1, available)
+
+
+def split_text(text, num_parts):
+    """Split text into up to num_parts pieces, cutting only at whitespace."""
+    parts = []
+    start = 0
+    step = len(text) // num_parts
+    for i in range(1, num_parts):
+        match = _WHITESPACE.search(text, max(start, i * step))
+        if not match:
+            break
+        parts.append(text[start:match.end()])
+        start = match.end()
+    parts.append(text[start:])
+    return parts
+
+
+class MapProcessPool:
+    """Count words of large map inputs on several cores.
+
+    count_fn must be a module-level function (so it can be pickled) that
+    returns a Counter of the words in a str. Inputs shorter than min_chars,
+    or a pool of a single process, are counted inline in the calling thread.
+    The pool uses the 'spawn' start method because forking a process that
+    already runs gRPC or Flask threads is unsafe.
+    """
+
+    def __init__(self, count_fn, processes=None, min_chars=1_000_000):
+        self.count_fn = count_fn
+        self.processes = processes or cpu_quota()
+        self.min_chars = min_chars
+        self._executor = None
+        if self.processes > 1:
+            self._executor = ProcessPoolExecutor(max_workers=self.processes, mp_context=get_context('spawn'))
+
+    def count(self, text):
+        """Return a Counter of the words in text, sub-splitting it across processes if large."""
+        if self._executor is None or len(text) < self.min_chars:
+            return self.count_fn(text)
+        counts = Counter()
+        for partial in self._executor.map(self.count_fn, split_text(text, self.processes)):
+            counts.update(partial)
+        return counts
+
+    def count_segments(self, segments):
+        """Return a Counter over an iterable of text segments, keeping a bounded number in flight."""
+        counts = Counter()
+        if self._executor is None:
+            for segment in segments:
+                counts.update(self.count_fn(segment))
+            return counts
+        pending = []
+        for segment in segments:
+            pending.append(self._executor.submit(self.count_fn, segment))
+            if len(pending) >= 2 * self.processes:
+                counts.update(pending.pop(0).result())
+        for future in pending:
+            counts.update(future.result())
+        return counts
+
+    def shutdown(self):
+        """Stop the worker processes."""
+        if self._executor is not None:
+            self._executor.shutdown()
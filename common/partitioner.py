@@ -0,0 +1,162 @@
+"""
+Reduce-side partitioning shared by the coordinator and the workers.
+
+Partitions are computed with crc32 instead of hash(), whose value for
+strings is randomized per process, so every process that partitions the
+same key (the client, or any map worker pushing to reducers) agrees on
+which reduce partition owns it.
+
+Plain hashing balances the number of keys per partition, not the data:
+with Zipfian text a few very frequent words make some partitions far
+bigger than others. A PartitionPlan is built from a sample of the map
+output instead (whole map results taken at a stride, like block sampling
+of the input): it estimates every key's volume (the reduce input entries
+it carries), splits keys estimated above hot_key_fraction of a balanced
+partition over several partitions (their entries are dealt out in turn,
+and the coordinator adds up the partial counts the reducers return), and
+assigns BUCKETS_PER_PARTITION crc32 buckets per partition to the
+partitions greedily, heaviest first, each to the least loaded one. Keys
+missing from the sample still land in their hash bucket. Splitting a key
+breaks the one-owner-per-key property that TOP_K and result files rely
+on, so those disable it.
+"""
+
+import heapq
+import math
+import statistics
+import threading
+import zlib
+from collections import Counter
+
+# Hash buckets per reduce partition a PartitionPlan balances (more buckets, finer balance)
+BUCKETS_PER_PARTITION = 16
+# PartitionPlan.partition_of() result of a key split over several partitions
+SPLIT = -1
+
+
+def partition_for_key(key, num_partitions):
+    """Return the reduce partition of a key (stable across processes, unlike hash())."""
+    return zlib.crc32(key.encode('utf-8')) % num_partitions
+
+
+def partition_counts(counts, num_partitions):
+    """Split {word: count} into num_partitions {word: count} dictionaries."""
+    partitions = [{} for _ in range(num_partitions)]
+    for key, count in counts.items():
+        partitions[partition_for_key(key, num_partitions)][key] = count
+    return partitions
+
+
+def sample_stride(num_entries, sample_size):
+    """Return the stride that takes about sample_size of num_entries entries (1: everything)."""
+    return max(1, math.ceil(num_entries / sample_size)) if sample_size else 1
+
+
+class PartitionPlan:
+    """Assignment of keys to reduce partitions balanced by their sampled volume (see the module docstring)."""
+
+    def __init__(self, num_partitions, buckets, split_keys, estimated_loads):
+        self.num_partitions = num_partitions
+        self.buckets = buckets                  # crc32 bucket -> partition
+        self.split_keys = split_keys            # Hot key -> partitions sharing its entries
+        self.estimated_loads = estimated_loads  # Sampled entries per partition
+        self.next_piece = {}                    # Hot key -> entries dealt out so far
+
+    @classmethod
+    def from_sample(cls, keys, num_partitions, hot_key_fraction=0.5, split_hot_keys=True):
+        """Build a plan from the keys of the sampled reduce input entries (a key once per entry)."""
+        weights = Counter(keys)
+        target = sum(weights.values()) / num_partitions  # Volume of a perfectly balanced partition
+        loads = [(0, 0, partition) for partition in range(num_partitions)]  # (volume, pieces, partition) heap
+        split_keys = {}
+        if split_hot_keys and num_partitions > 1 and target:
+            for key, weight in weights.most_common():
+                pieces = min(num_partitions, math.ceil(weight / (hot_key_fraction * target)))
+                if pieces < 2:
+                    break
+                # Each piece goes to a different partition, the least loaded ones first
+                taken = [heapq.heappop(loads) for _ in range(pieces)]
+                split_keys[key] = [partition for _, _, partition in taken]
+                for load, count, partition in taken:
+                    heapq.heappush(loads, (load + weight / pieces, count + 1, partition))
+
+        num_buckets = num_partitions * BUCKETS_PER_PARTITION
+        bucket_weights = [0] * num_buckets
+        for key, weight in weights.items():
+            if key not in split_keys:
+                bucket_weights[zlib.crc32(key.encode('utf-8')) % num_buckets] += weight
+        buckets = [0] * num_buckets
+        # Heaviest bucket first, each to the least loaded partition (ties: the one with the fewest pieces)
+        for bucket in sorted(range(num_buckets), key=lambda bucket: -bucket_weights[bucket]):
+            load, count, partition = heapq.heappop(loads)
+            buckets[bucket] = partition
+            heapq.heappush(loads, (load + bucket_weights[bucket], count + 1, partition))
+        estimated_loads = [0] * num_partitions
+        for load, _, partition in loads:
+            estimated_loads[partition] = round(load)
+        return cls(num_partitions, buckets, split_keys, estimated_loads)
+
+    def partition_of(self, key):
+        """Return the partition owning a key, or SPLIT if its entries are shared by several (see next_partition)."""
+        if key in self.split_keys:
+            return SPLIT
+        return self.buckets[zlib.crc32(key.encode('utf-8')) % len(self.buckets)]
+
+    def next_partition(self, key):
+        """Return the partition of the next entry of a split key, dealing its entries out in turn."""
+        partitions = self.split_keys[key]
+        index = self.next_piece.get(key, 0)
+        self.next_piece[key] = index + 1
+        return partitions[index % len(partitions)]
+
+    def split_entries(self, key, entries):
+        """Yield (partition, slice of entries) sharing a split key's entries out in contiguous slices."""
+        partitions = self.split_keys[key]
+        pieces = min(len(partitions), len(entries))
+        for piece in range(pieces):
+            start, end = piece * len(entries) // pieces, (piece + 1) * len(entries) // pieces
+            yield partitions[piece], entries[start:end]
+
+
+class PartitionLoadStats:
+    """Coordinator-side reduce input entries per partition of the last shuffle, thread-safe."""
+
+    def __init__(self):
+        self.loads = []
+        self.num_split_keys = 0
+        self.lock = threading.Lock()
+
+    def record(self, loads, num_split_keys=0):
+        """Set the entries each reduce partition received and the number of hot keys split over several."""
+        with self.lock:
+            self.loads = list(loads)
+            self.num_split_keys = num_split_keys
+
+    def summary_lines(self):
+        """Return performance summary lines with the spread of the partition loads (max/mean 1.00x is balanced)."""
+        with self.lock:
+            loads, num_split_keys = self.loads, self.num_split_keys
+        if not loads or not sum(loads):
+            return []
+        imbalance = max(loads) / statistics.mean(loads)
+        lines = [f"Reduce Partition Load:    min {min(loads)}, median {statistics.median(loads):.0f}, "
+                 f"max {max(loads)} entries (max/mean {imbalance:.2f}x)"
+                 + (f", {num_split_keys} hot key(s) split" if num_split_keys else "")]
+        if len(loads) <= 16:
+            lines.append(f"  Entries per Partition:  {', '.join(map(str, loads))}")
+        return lines
+
+
+class PartitionPushes:
+    """Map tasks and bytes whose pushes to each reduce partition were acknowledged, thread-safe."""
+
+    def __init__(self, num_partitions):
+        self.num_tasks = [0] * num_partitions
+        self.num_bytes = [0] * num_partitions
+        self.lock = threading.Lock()
+
+    def record(self, partition, num_bytes):
+        """Count one map task's acknowledged push of num_bytes to a partition."""
+        with self.lock:
+            self.num_tasks[partition] += 1
+            self.num_bytes[partition] += num_bytes
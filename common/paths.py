@@ -0,0 +1,25 @@
+"""
+Path containment for file names sent between processes of both stacks.
+
+Coordinators and workers that share a directory (the input files of
+INPUT_DIR, the result files of OUTPUT_DIR) only exchange file names
+relative to it. Before opening one, the receiver resolves it with
+resolve_contained_path(), which follows symlinks and ".." components and
+rejects any name that would end up outside the shared directory.
+"""
+
+import os
+
+
+def resolve_contained_path(root_dir, name, kind):
+    """Return the path of a file name inside root_dir, raising ValueError if it would escape it.
+
+    kind names the directory ('input' or 'output') in the error messages.
+    """
+    if not root_dir:
+        raise ValueError(f"No {kind} directory is configured")
+    root = os.path.realpath(root_dir)
+    path = os.path.realpath(os.path.join(root, name))
+    if not path.startswith(root + os.sep):
+        raise ValueError(f"{kind.capitalize()} file {name!r} is outside the {kind} directory")
+    return path
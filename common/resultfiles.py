@@ -0,0 +1,91 @@
+"""
+Sorted result files written by the reducers of both stacks.
+
+Each reduce task writes its final counts to one TSV partition file
+("word<TAB>count" per line) under the output directory, sorted by word or
+by count (highest first, ties by word, as in common/topk.py). Reducers
+and the coordinator must see the same directory (a shared volume); the
+coordinator only sends file names relative to it, and resolve_output_file()
+rejects names that would escape it (common/paths.py).
+
+merge_partition_files() streams a k-way merge of the partition files into
+one globally sorted file, holding one line per partition in memory.
+"""
+
+import heapq
+import os
+import uuid
+from operator import itemgetter
+
+from common.paths import resolve_contained_path
+from common.topk import rank_key
+
+MERGED_FILE_NAME = 'result.tsv'
+
+
+def partition_file_name(job_id, index):
+    """Return the name of a job's partition file, relative to the output directory."""
+    return f'{job_id}/part-{index:05d}.tsv'
+
+
+def resolve_output_file(output_dir, name):
+    """Return the path of a file name inside output_dir, raising ValueError if it would escape it."""
+    return resolve_contained_path(output_dir, name, 'output')
+
+
+def sort_key(by_count):
+    """Return the sort key of (word, count) pairs in a result file."""
+    return rank_key if by_count else itemgetter(0)
+
+
+def temporary_path(path):
+    """Return a unique temporary name next to path, to write it under before renaming it into place.
+
+    The name must differ between workers writing the same file (e.g. a task
+    and its backup), and containerized workers all run as PID 1.
+    """
+    return f'{path}.{uuid.uuid4().hex}.tmp'
+
+
+def write_partition_file(path, counts, by_count=False):
+    """Write {word: count} to a sorted TSV file and return (number of words, total count).
+
+    counts may also be a common.spill.SpillingCounter, whose items() are
+    already sorted by word: its merged runs are then streamed to the file.
+    The file is written under a temporary name and renamed, so a retried
+    reduce task replaces it whole and a reader never sees half a file.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if by_count or isinstance(counts, dict):
+        items = sorted(counts.items(), key=sort_key(by_count))
+    else:
+        items = counts.items()
+    num_keys = num_words = 0
+    tmp_path = temporary_path(path)
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for word, count in items:
+            f.write(f'{word}\t{count}\n')
+            num_keys += 1
+            num_words += count
+    os.replace(tmp_path, path)
+    return num_keys, num_words
+
+
+def read_partition_file(path):
+    """Yield the (word, count) pairs of a TSV result file in file order."""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            word, _, count = line.rstrip('\n').rpartition('\t')
+            yield word, int(count)
+
+
+def merge_partition_files(paths, out_path, by_count=False):
+    """Merge sorted partition files into one sorted TSV file and return its number of lines."""
+    num_lines = 0
+    tmp_path = temporary_path(out_path)
+    with open(tmp_path, 'w', encoding='utf-8') as out:
+        for word, count in heapq.merge(*(read_partition_file(path) for path in paths), key=sort_key(by_count)):
+            out.write(f'{word}\t{count}\n')
+            num_lines += 1
+    os.replace(tmp_path, out_path)
+    return num_lines
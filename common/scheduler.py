@@ -0,0 +1,253 @@
+"""
+Pull-based task scheduler used by the coordinators.
+
+Instead of assigning task i to worker i % NUM_WORKERS up front, every
+worker slot pulls the next task from a shared queue as soon as it is free,
+so a slow worker or a dense chunk only delays the tasks it is running.
+With an affinity, a worker first pulls the tasks that prefer it (so a
+task keeps going to the worker that cached its result) and only then
+steals the others. When the queue is empty, idle workers launch
+speculative backups of straggling tasks (running longer than
+speculative_factor times the median task latency) and the first attempt
+to finish wins.
+
+A failed attempt is put back on the queue after an exponential backoff and
+is retried on a healthy worker it has not already failed on, up to
+max_attempts attempts per task. Results of completed tasks are kept, so
+only the failed tasks are recomputed. A worker that fails unhealthy_after
+attempts in a row stops pulling tasks. If a task has no attempts left,
+run() raises JobFailedError instead of dropping it.
+"""
+
+import statistics
+import threading
+import time
+
+
+class JobFailedError(Exception):
+    """Raised when tasks still failed after every allowed attempt."""
+
+    def __init__(self, failed_tasks, max_attempts):
+        self.failed_tasks = sorted(failed_tasks)
+        shown = ', '.join(str(index) for index in self.failed_tasks[:10])
+        if len(self.failed_tasks) > 10:
+            shown += ', ...'
+        super().__init__(f"{len(self.failed_tasks)} task(s) failed after up to {max_attempts} "
+                         f"attempt(s): {shown}")
+
+
+class TaskState:
+    """Attempt bookkeeping for one task."""
+
+    def __init__(self):
+        self.attempts = 0
+        self.workers = set()   # workers currently running an attempt
+        self.excluded = set()  # workers an attempt has failed on
+        self.started = None    # start of the oldest attempt still running
+        self.not_before = 0.0  # earliest start of the next retry (backoff)
+
+
+class TaskScheduler:
+    """Run tasks on workers from a shared work queue with retries and speculative backups.
+
+    run_task(worker_index, task, attempt) performs attempt number attempt
+    (starting at 1) of a task on a worker and returns its result; it must be
+    safe to run the same task twice. A failed attempt is retried only if
+    retryable(error) is true (the default for every error).
+    """
+
+    def __init__(self, num_workers, speculative=True, speculative_factor=2.0,
+                 speculative_min_seconds=0.5, max_attempts=3, retry_backoff=0.5,
+                 retryable=None, unhealthy_after=3, poll_interval=0.05):
+        self.num_workers = num_workers
+        self.speculative = speculative
+        self.speculative_factor = speculative_factor
+        self.speculative_min_seconds = speculative_min_seconds
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.retryable = retryable or (lambda error: True)
+        self.unhealthy_after = unhealthy_after
+        self.poll_interval = poll_interval
+        self.latencies = {}      # task index -> latency of the attempt that won
+        self.backups_launched = 0
+        self.backups_won = 0
+        self.retries = 0
+        self.failed_tasks = []
+        self.unhealthy_workers = set()
+
+    def _straggler(self, worker_index, states, now):
+        """Return a running task worth backing up on worker_index, or None."""
+        if not self.speculative or not self.latencies:
+            return None
+        threshold = max(self.speculative_min_seconds,
+                        self.speculative_factor * statistics.median(self.latencies.values()))
+        candidates = [
+            (state.started, index) for index, state in states.items()
+            if len(state.workers) == 1 and worker_index not in state.workers
+            and worker_index not in state.excluded and now - state.started > threshold
+        ]
+        return min(candidates)[1] if candidates else None
+
+    def _next_pending(self, worker_index, pending, states, now, affinity=None):
+        """Remove and return the first queued task worker_index may start now, or None.
+
+        Tasks whose affinity is worker_index come first; any other task is
+        taken only if none of those is queued.
+        """
+        healthy = set(range(self.num_workers)) - self.unhealthy_workers
+        fallback = None
+        for position, index in enumerate(pending):
+            state = states[index]
+            if state.not_before > now:
+                continue
+            # Leave a retry to another healthy worker unless all of them failed it already
+            if worker_index in state.excluded and not healthy <= state.excluded:
+                continue
+            if affinity is None or affinity(index) == worker_index:
+                del pending[position]
+                return index
+            if fallback is None:
+                fallback = position
+        return pending.pop(fallback) if fallback is not None else None
+
+    def run(self, tasks, run_task, on_result=None, on_error=None, affinity=None):
+        """Run every task and return their results in task order.
+
+        on_result(task_index, result) is called once per task, with the first
+        successful attempt's result, as soon as it is available (never by two
+        threads at once, so it may append to shared structures without a lock).
+        on_error(task_index, worker_index, error) is called for every failed attempt.
+        affinity(task_index), if given, returns the worker a task should preferably run on.
+        Raises JobFailedError if a task failed on all of its attempts. If a
+        callback raises, no more tasks are started and run() re-raises the
+        first such exception.
+        """
+        tasks = list(tasks)
+        results = [None] * len(tasks)
+        states = [TaskState() for _ in tasks]
+        pending = list(range(len(tasks)))
+        done = set()        # tasks that succeeded or failed for good
+        finished = [0]      # tasks whose outcome has been fully reported
+        consecutive_failures = [0] * self.num_workers
+        condition = threading.Condition()
+        result_lock = threading.Lock()
+        callback_errors = []  # Exceptions raised by on_result / on_error, first one first
+
+        def call_back(callback, *args):
+            try:
+                callback(*args)
+            except Exception as e:
+                with condition:
+                    callback_errors.append(e)
+                    condition.notify_all()
+
+        def give_up(index):
+            done.add(index)
+            self.failed_tasks.append(index)
+            finished[0] += 1
+
+        def worker_loop(worker_index):
+            while True:
+                with condition:
+                    while True:
+                        if (worker_index in self.unhealthy_workers or len(done) == len(tasks)
+                                or callback_errors):
+                            return
+                        now = time.perf_counter()
+                        index = self._next_pending(worker_index, pending, states, now, affinity)
+                        if index is not None:
+                            is_backup = False
+                            break
+                        if not pending:
+                            running = {i: state for i, state in enumerate(states)
+                                       if state.workers and i not in done}
+                            index = self._straggler(worker_index, running, now)
+                            if index is not None:
+                                self.backups_launched += 1
+                                is_backup = True
+                                break
+                        condition.wait(self.poll_interval)
+                    state = states[index]
+                    if not state.workers:
+                        state.started = now
+                    state.workers.add(worker_index)
+                    state.attempts += 1
+                    attempt = state.attempts
+
+                try:
+                    result = run_task(worker_index, tasks[index], attempt)
+                    error = None
+                except Exception as e:
+                    result, error = None, e
+
+                if error is not None and on_error:
+                    call_back(on_error, index, worker_index, error)
+                with condition:
+                    now = time.perf_counter()
+                    state.workers.discard(worker_index)
+                    won = index not in done and error is None
+                    if error is None:
+                        consecutive_failures[worker_index] = 0
+                    else:
+                        consecutive_failures[worker_index] += 1
+                        if consecutive_failures[worker_index] >= self.unhealthy_after:
+                            self.unhealthy_workers.add(worker_index)
+                        state.excluded.add(worker_index)
+                    if won:
+                        done.add(index)
+                        results[index] = result
+                        self.latencies[index] = now - state.started
+                        self.backups_won += is_backup
+                    elif index not in done and not state.workers:
+                        # Every running attempt of this task failed
+                        if self.retryable(error) and state.attempts < self.max_attempts:
+                            state.not_before = now + self.retry_backoff * 2 ** (state.attempts - 1)
+                            pending.append(index)
+                            self.retries += 1
+                        else:
+                            give_up(index)
+                    if len(self.unhealthy_workers) == self.num_workers:
+                        # No worker is left to run the queued tasks
+                        for queued in pending:
+                            give_up(queued)
+                        pending.clear()
+                    condition.notify_all()
+                if won:
+                    try:
+                        if on_result:
+                            with result_lock:
+                                call_back(on_result, index, result)
+                    finally:
+                        with condition:
+                            finished[0] += 1
+                            condition.notify_all()
+
+        # Losing attempts of backed-up tasks may still be running when this returns;
+        # their results are discarded
+        for worker_index in range(self.num_workers):
+            threading.Thread(target=worker_loop, args=(worker_index,), daemon=True).start()
+        with condition:
+            while finished[0] < len(tasks) and not callback_errors:
+                condition.wait()
+        if callback_errors:
+            raise callback_errors[0]
+        if self.failed_tasks:
+            raise JobFailedError(self.failed_tasks, self.max_attempts)
+        return results
+
+    def summary_lines(self, label):
+        """Return performance summary lines describing the last run."""
+        return task_summary_lines(label, self.latencies.values(), len(self.failed_tasks), self.retries,
+                                  self.backups_launched, self.backups_won)
+
+
+def task_summary_lines(label, latencies, num_failed, retries, backups_launched=0, backups_won=0):
+    """Return performance summary lines for a scheduler run."""
+    latencies = sorted(latencies)
+    lines = [f"{label + ' Tasks:':<26}{len(latencies) + num_failed} "
+             f"({num_failed} failed, {retries} retried, {backups_launched} backup(s), {backups_won} won)"]
+    if latencies:
+        p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+        lines.append(f"{'  ' + label + ' Task Latency:':<25}min {latencies[0]:.4f}s, "
+                     f"median {statistics.median(latencies):.4f}s, p95 {p95:.4f}s, max {latencies[-1]:.4f}s")
+    return lines
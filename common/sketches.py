@@ -0,0 +1,213 @@
+"""
+Mergeable fixed-size sketches of word counts for the approximate job mode.
+
+A WordSketch summarizes any number of words in memory that depends only on
+its parameters, never on the vocabulary:
+  - a Count-Min Sketch (depth rows of width int64 counters) estimating the
+    count of any word: never below the true count, and with probability
+    at least 1 - delta at most epsilon * N above it (epsilon = e / width,
+    delta = e ** -depth, N the number of words added);
+  - a HyperLogLog (2 ** precision one-byte registers) estimating the number
+    of distinct words with a relative standard error of 1.04 / sqrt(2 ** precision);
+  - a Misra-Gries summary of at most num_heavy_hitters counters holding
+    the heavy hitters: every word whose count is above the summary's error
+    is kept, with a count at most error below its true count. While words
+    are added it may hold up to twice that many, and is pruned back down
+    whenever it grows past that.
+A chunk's text is added segment by segment (add_text()), so sketching it
+never needs the counts of its whole vocabulary.
+Sketches built with the same parameters merge by adding counters (taking
+the maximum of registers), so map workers sketch their chunks and the
+coordinator merges the sketches as they arrive.
+
+Words are hashed with BLAKE2b, so sketches built in different processes
+agree. Binary layout, MEDIA_TYPE (all integers little-endian):
+    b'WCSK' magic, uint32 width, uint8 depth, uint8 precision,
+    uint32 num_heavy_hitters, int64 words added, int64 heavy hitter error,
+    uint32 number of heavy hitters h,
+    width * depth int64 counters (row by row), 2 ** precision uint8 registers,
+    h int64 heavy hitter counts, the h UTF-8 heavy hitters joined by b'\\n'.
+"""
+
+import math
+import struct
+from array import array
+from hashlib import blake2b
+
+from common.kvcodec import _from_bytes, _split_keys, _to_bytes
+from common.tokenizer import count_words, iter_segments
+
+MEDIA_TYPE = 'application/vnd.wordcount.sketch'
+MAGIC = b'WCSK'
+_HEADER = struct.Struct('<4sIBBIqqI')
+_MASK_64 = (1 << 64) - 1
+# Characters of text counted at a time by add_text()
+TEXT_SEGMENT_CHARS = 1024 * 1024
+# HyperLogLog bias correction for the smallest register counts; larger ones use 0.7213 / (1 + 1.079 / m)
+_SMALL_ALPHA = {16: 0.673, 32: 0.697, 64: 0.709}
+
+
+def word_hash(word):
+    """Return a 128-bit hash of a word as (64-bit HyperLogLog hash, row hash, odd row step)."""
+    value = int.from_bytes(blake2b(word.encode('utf-8'), digest_size=16).digest(), 'little')
+    return value & _MASK_64, (value >> 64) & 0xFFFFFFFF, (value >> 96) | 1
+
+
+def sketch_parameters(epsilon, delta, precision, num_heavy_hitters):
+    """Return the (width, depth, precision, num_heavy_hitters) giving Count-Min error epsilon with probability 1 - delta."""
+    if not 0 < epsilon < 1 or not 0 < delta < 1:
+        raise ValueError("epsilon and delta must be between 0 and 1")
+    if not 4 <= precision <= 18 or num_heavy_hitters < 1:
+        raise ValueError("precision must be between 4 and 18 and num_heavy_hitters at least 1")
+    return math.ceil(math.e / epsilon), math.ceil(math.log(1 / delta)), precision, num_heavy_hitters
+
+
+class WordSketch:
+    """Count-Min Sketch, HyperLogLog and Misra-Gries heavy hitters over the same words."""
+
+    def __init__(self, width, depth, precision, num_heavy_hitters):
+        if width < 1 or not 1 <= depth <= 255 or not 4 <= precision <= 18 or num_heavy_hitters < 1:
+            raise ValueError(f"Invalid sketch parameters: {width} x {depth}, precision {precision}, "
+                             f"{num_heavy_hitters} heavy hitters")
+        self.width = width
+        self.depth = depth
+        self.precision = precision
+        self.num_heavy_hitters = num_heavy_hitters
+        self.total = 0                                     # Words added (N)
+        self.counters = array('q', bytes(8 * width * depth))
+        self.registers = bytearray(1 << precision)
+        self.heavy_hitters = {}                            # word -> Misra-Gries count
+        self.heavy_hitter_error = 0                        # Most any Misra-Gries count is below the true count
+
+    @property
+    def parameters(self):
+        """The (width, depth, precision, num_heavy_hitters) a sketch must share to be merged with this one."""
+        return self.width, self.depth, self.precision, self.num_heavy_hitters
+
+    def add_text(self, text):
+        """Add the words of a text, counting only TEXT_SEGMENT_CHARS of it at a time."""
+        for segment in iter_segments(text, TEXT_SEGMENT_CHARS):
+            self.add_counts(count_words(segment))
+
+    def add_counts(self, counts):
+        """Add a {word: count} mapping (e.g. one segment's or a cached chunk's exact counts)."""
+        width, counters, registers = self.width, self.counters, self.registers
+        max_heavy_hitters = 2 * self.num_heavy_hitters
+        value_bits = 64 - self.precision
+        for word, count in counts.items():
+            hll_hash, row_hash, step = word_hash(word)
+            for row in range(self.depth):
+                counters[row * width + (row_hash + row * step) % width] += count
+            index, rest = hll_hash >> value_bits, hll_hash & ((1 << value_bits) - 1)
+            rank = value_bits - rest.bit_length() + 1
+            if rank > registers[index]:
+                registers[index] = rank
+            self.heavy_hitters[word] = self.heavy_hitters.get(word, 0) + count
+            self.total += count
+            if len(self.heavy_hitters) > max_heavy_hitters:
+                self._prune_heavy_hitters()
+        self._prune_heavy_hitters()
+
+    def _prune_heavy_hitters(self):
+        """Keep at most num_heavy_hitters counters, subtracting the largest dropped count from the rest."""
+        if len(self.heavy_hitters) <= self.num_heavy_hitters:
+            return
+        cut = sorted(self.heavy_hitters.values(), reverse=True)[self.num_heavy_hitters]
+        self.heavy_hitters = {word: count - cut for word, count in self.heavy_hitters.items() if count > cut}
+        self.heavy_hitter_error += cut
+
+    def merge(self, other):
+        """Add another sketch with the same parameters into this one."""
+        if other.parameters != self.parameters:
+            raise ValueError(f"Cannot merge sketches with parameters {other.parameters} and {self.parameters}")
+        counters, other_counters = self.counters, other.counters
+        for index in range(len(counters)):
+            counters[index] += other_counters[index]
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        for word, count in other.heavy_hitters.items():
+            self.heavy_hitters[word] = self.heavy_hitters.get(word, 0) + count
+        self.heavy_hitter_error += other.heavy_hitter_error
+        self.total += other.total
+        self._prune_heavy_hitters()
+
+    def estimate(self, word):
+        """Return the Count-Min estimate of a word's count (never below the true count)."""
+        _, row_hash, step = word_hash(word)
+        return min(self.counters[row * self.width + (row_hash + row * step) % self.width]
+                   for row in range(self.depth))
+
+    def distinct_words(self):
+        """Return the HyperLogLog estimate of the number of distinct words."""
+        m = len(self.registers)
+        alpha = _SMALL_ALPHA.get(m, 0.7213 / (1 + 1.079 / m))
+        raw = alpha * m * m / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            return round(m * math.log(m / zeros))  # Linear counting while registers are mostly empty
+        return round(raw)
+
+    def top_words(self, limit=None):
+        """Return [(word, estimate, lower bound)] of the heavy hitters, highest estimate first.
+
+        The estimate is the Count-Min estimate, capped by the Misra-Gries
+        upper bound; the lower bound is the Misra-Gries count.
+        """
+        items = [(word, min(self.estimate(word), count + self.heavy_hitter_error), count)
+                 for word, count in self.heavy_hitters.items()]
+        items.sort(key=lambda item: (-item[1], item[0]))
+        return items[:limit] if limit else items
+
+    def error_bounds(self):
+        """Return {name: value} describing the error bounds of the estimates."""
+        epsilon = math.e / self.width
+        return {
+            'words': self.total,
+            'count_min_epsilon': epsilon,
+            'count_min_error': epsilon * self.total,
+            'count_min_confidence': 1 - math.exp(-self.depth),
+            'distinct_relative_error': 1.04 / math.sqrt(len(self.registers)),
+            'heavy_hitter_error': self.heavy_hitter_error,
+        }
+
+    def to_bytes(self):
+        """Encode the sketch in the MEDIA_TYPE layout."""
+        words = list(self.heavy_hitters)
+        header = _HEADER.pack(MAGIC, self.width, self.depth, self.precision, self.num_heavy_hitters,
+                              self.total, self.heavy_hitter_error, len(words))
+        return b''.join((header, _to_bytes(self.counters), bytes(self.registers),
+                         _to_bytes(array('q', self.heavy_hitters.values())), '\n'.join(words).encode('utf-8')))
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Decode a sketch from the MEDIA_TYPE layout, raising ValueError if it is malformed."""
+        if len(data) < _HEADER.size:
+            raise ValueError("Truncated sketch")
+        magic, width, depth, precision, num_heavy_hitters, total, error, num_words = _HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError("Not a sketch")
+        sketch = cls(width, depth, precision, num_heavy_hitters)
+        registers_start = _HEADER.size + 8 * width * depth
+        counts_start = registers_start + (1 << precision)
+        words_start = counts_start + 8 * num_words
+        if len(data) < words_start or num_words > num_heavy_hitters:
+            raise ValueError("Truncated sketch")
+        sketch.counters = _from_bytes('q', data[_HEADER.size:registers_start])
+        sketch.registers = bytearray(data[registers_start:counts_start])
+        counts = _from_bytes('q', data[counts_start:words_start])
+        sketch.heavy_hitters = dict(zip(_split_keys(bytes(data[words_start:]), num_words), counts))
+        sketch.total, sketch.heavy_hitter_error = total, error
+        return sketch
+
+
+def error_summary_lines(sketch):
+    """Return result lines stating the error bounds of a merged sketch."""
+    bounds = sketch.error_bounds()
+    return [
+        f"Count-Min Sketch ({sketch.width} x {sketch.depth}): every count is at most "
+        f"{bounds['count_min_error']:.0f} (epsilon {bounds['count_min_epsilon']:.2g} x {bounds['words']} words) "
+        f"too high, with probability {100 * bounds['count_min_confidence']:.2f}%",
+        f"Heavy hitters (Misra-Gries, {sketch.num_heavy_hitters} counters): every word counted more than "
+        f"{bounds['heavy_hitter_error']} times is listed, and is counted at least its lower bound",
+        f"Distinct words: ~{sketch.distinct_words()} (HyperLogLog, {len(sketch.registers)} registers, "
+        f"standard error {100 * bounds['distinct_relative_error']:.2f}%)",
+    ]
@@ -0,0 +1,250 @@
+"""
+Memory-budgeted aggregation that spills to local disk, used by the
+reducers of both stacks and by the REST coordinator's shuffle.
+
+A SpillingCounter sums (word, count) pairs in a dictionary, like the plain
+aggregation it replaces, until the dictionary holds more entries than its
+memory budget allows (estimated at ENTRY_BYTES per entry). The entries are
+then sorted by word and written to an anonymous temporary file (a run),
+and the dictionary starts over. items() streams a k-way merge of the runs,
+adding up the counts of each word, so the aggregation holds at most its
+budget plus one block per run in memory. A table that never spilled is
+just its dictionary. SpillingGroups does the same for the REST shuffle,
+which keeps every partial count of a word (a group) instead of their sum.
+
+Runs are written as blocks of up to SPILL_BLOCK_ENTRIES entries, each in a
+common.kvcodec binary layout (key/count pairs, or columnar for groups)
+preceded by its uint32 length. Once there are more than MAX_RUNS runs
+they are merged into one, so a small budget does not run out of file
+descriptors. Run files are deleted when the table is closed or collected.
+"""
+
+import heapq
+import struct
+import tempfile
+import threading
+from itertools import accumulate, groupby
+from operator import itemgetter
+
+from common.kvcodec import decode_columnar, decode_pairs, encode_columnar, encode_pairs, sum_groups
+from common.topk import top_k_items
+
+# Estimated memory of one dictionary entry of a short word (hash slot, str and int objects)
+ENTRY_BYTES = 150
+# Estimated memory of one more partial count in a group
+VALUE_BYTES = 40
+# Entries per encoded block of a run (the unit read back during the merge)
+SPILL_BLOCK_ENTRIES = 65536
+# Runs kept before they are merged into one
+MAX_RUNS = 64
+_FRAME = struct.Struct('<I')
+
+
+class _SpillingTable:
+    """Dictionary of key -> value that spills sorted runs past memory_bytes (0: never)."""
+
+    def __init__(self, memory_bytes=0, spill_dir=''):
+        self.memory_bytes = memory_bytes
+        self.spill_dir = spill_dir or None  # None: the system temporary directory
+        self.table = {}
+        self.runs = []  # Anonymous temporary files, each sorted by key
+        self.spills = 0  # Runs written (including merges of runs)
+        self.spilled_bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def spilled(self):
+        """True if some entries are on disk rather than in the dictionary."""
+        return bool(self.runs)
+
+    def spill(self):
+        """Write the in-memory entries to a new sorted run and start an empty dictionary."""
+        if not self.table:
+            return
+        items = sorted(self.table.items(), key=itemgetter(0))
+        self.table = {}
+        self._reset()
+        self._write_run(items)
+        if len(self.runs) > MAX_RUNS:
+            runs, self.runs = self.runs, []
+            self._write_run(self._merge(runs))
+            for run in runs:
+                run.close()
+
+    def items(self):
+        """Return an iterator over the (key, value) entries, sorted by key, merging any spilled runs."""
+        if not self.runs:
+            return iter(sorted(self.table.items(), key=itemgetter(0)))
+        self.spill()  # Frees the dictionary: only one block per run is held during the merge
+        return self._merge(self.runs)
+
+    def close(self):
+        """Delete the spilled runs and drop the in-memory entries."""
+        for run in self.runs:
+            run.close()
+        self.runs = []
+        self.table = {}
+
+    def _write_run(self, items):
+        run = tempfile.TemporaryFile(dir=self.spill_dir)
+        block = []
+        for item in items:
+            block.append(item)
+            if len(block) == SPILL_BLOCK_ENTRIES:
+                self._write_block(run, block)
+                block = []
+        if block:
+            self._write_block(run, block)
+        self.runs.append(run)
+        self.spills += 1
+
+    def _write_block(self, run, block):
+        data = self._encode(block)
+        run.write(_FRAME.pack(len(data)))
+        run.write(data)
+        self.spilled_bytes += _FRAME.size + len(data)
+
+    def _read_run(self, run):
+        run.seek(0)
+        while True:
+            header = run.read(_FRAME.size)
+            if not header:
+                return
+            (size,) = _FRAME.unpack(header)
+            yield from self._decode(run.read(size))
+
+    def _merge(self, runs):
+        merged = heapq.merge(*(self._read_run(run) for run in runs), key=itemgetter(0))
+        for key, entries in groupby(merged, key=itemgetter(0)):
+            yield key, self._combine(value for _, value in entries)
+
+    def _reset(self):
+        pass
+
+
+class SpillingCounter(_SpillingTable):
+    """{word: count} aggregation under a memory budget (see the module docstring)."""
+
+    @property
+    def max_entries(self):
+        """Entries the dictionary may hold before it is spilled (0: no limit)."""
+        return max(1, self.memory_bytes // ENTRY_BYTES) if self.memory_bytes else 0
+
+    def add_pairs(self, pairs):
+        """Add (word, count) pairs; a word may repeat."""
+        table = self.table
+        max_entries = self.max_entries
+        if not max_entries:
+            for key, count in pairs:
+                table[key] = table.get(key, 0) + count
+            return self
+        for key, count in pairs:
+            table[key] = table.get(key, 0) + count
+            if len(table) > max_entries:
+                self.spill()
+                table = self.table
+        return self
+
+    def add_counts(self, counts):
+        """Add a {word: count} mapping."""
+        return self.add_pairs(counts.items())
+
+    def add_groups(self, keys, lengths, counts):
+        """Add columnar data (keys[i] has the next lengths[i] counts), summed with common.kvcodec.sum_groups.
+
+        Data with more keys than the dictionary may hold is summed in slices
+        of that many keys.
+        """
+        max_entries = self.max_entries
+        if not self.table and (not max_entries or len(keys) <= max_entries):
+            self.table = sum_groups(keys, lengths, counts)
+            return self
+        ends = [0, *accumulate(lengths)]
+        if len(keys) != len(lengths) or ends[-1] != len(counts):
+            raise ValueError("Lengths do not match the keys and counts")
+        step = max_entries or len(keys)
+        for start in range(0, len(keys), step):
+            end = min(start + step, len(keys))
+            self.add_counts(sum_groups(keys[start:end], lengths[start:end], counts[ends[start]:ends[end]]))
+        return self
+
+    def to_dict(self):
+        """Return the totals as one {word: count} dictionary (sorted by word if anything was spilled)."""
+        return dict(self.items()) if self.runs else self.table
+
+    def top_k(self, k):
+        """Return the k highest (word, count) pairs, best first, streaming the merge if anything was spilled."""
+        return top_k_items(self if self.runs else self.table, k)
+
+    def _encode(self, block):
+        return encode_pairs([key for key, _ in block], [count for _, count in block])
+
+    def _decode(self, data):
+        return zip(*decode_pairs(data))
+
+    def _combine(self, values):
+        return sum(values)
+
+
+class SpillingGroups(_SpillingTable):
+    """{word: [partial counts]} grouping under a memory budget (see the module docstring)."""
+
+    def __init__(self, memory_bytes=0, spill_dir=''):
+        super().__init__(memory_bytes, spill_dir)
+        self.num_values = 0  # Partial counts in the dictionary
+
+    def add_counts(self, counts):
+        """Add one partial {word: count} result, spilling afterwards if the groups outgrew the budget."""
+        table = self.table
+        for key, count in counts.items():
+            group = table.get(key)
+            if group is None:
+                table[key] = [count]
+            else:
+                group.append(count)
+        self.num_values += len(counts)
+        if self.memory_bytes and len(table) * ENTRY_BYTES + self.num_values * VALUE_BYTES > self.memory_bytes:
+            self.spill()
+        return self
+
+    def _reset(self):
+        self.num_values = 0
+
+    def _encode(self, block):
+        keys = [key for key, _ in block]
+        lengths = [len(group) for _, group in block]
+        return encode_columnar(keys, lengths, [count for _, group in block for count in group])
+
+    def _decode(self, data):
+        keys, lengths, counts = decode_columnar(data)
+        ends = list(accumulate(lengths))
+        return ((key, counts[end - length:end].tolist()) for key, length, end in zip(keys, lengths, ends))
+
+    def _combine(self, values):
+        return [count for group in values for count in group]
+
+
+class SpillStats:
+    """Coordinator-side totals of the runs spilled by its own tables, thread-safe."""
+
+    def __init__(self):
+        self.spills = 0
+        self.spilled_bytes = 0
+        self.lock = threading.Lock()
+
+    def record(self, table):
+        """Add the runs a table spilled."""
+        with self.lock:
+            self.spills += table.spills
+            self.spilled_bytes += table.spilled_bytes
+
+    def summary_lines(self, label):
+        """Return a performance summary line with the runs spilled and their size, if any were."""
+        if not self.spills:
+            return []
+        return [f"{label + ' Spills:':<26}{self.spills} run(s), {self.spilled_bytes / (1024 * 1024):.2f} MB written"]
@@ -0,0 +1,185 @@
+"""
+Whitespace-aligned, memory-mapped input splitter.
+
+The input file is memory-mapped instead of read and decoded into one str.
+Split points are byte offsets moved forward to just after the next
+whitespace byte, so no word is cut in two, and chunks are handed out as
+zero-copy memoryviews over the mapping. Callers decode or copy a chunk only
+when it is about to be sent.
+
+When the workers can read the file themselves (shared storage), a
+ByteRangeSplitter only cuts the file size into raw FileRange byte ranges,
+without reading the file, and each worker reads its range with
+read_word_range(): the words that start in a range are its own, so a range
+starting inside a word leaves that word to the previous range and one
+ending inside a word reads past its end to finish it. Raw ranges that tile
+the file then count every word exactly once.
+"""
+
+import mmap
+import os
+import re
+
+from common.paths import resolve_contained_path
+
+# ASCII bytes that str.split() treats as whitespace. They never occur inside
+# a multi-byte UTF-8 character, so a split after one is also a character boundary.
+_WHITESPACE = re.compile(rb'[ \t\n\r\x0b\x0c\x1c-\x1f]')
+
+
+def _target_offsets(file_size, num_chunks, chunk_size):
+    """Return the unaligned split offsets of a file (chunk_size wins over num_chunks)."""
+    if chunk_size:
+        return list(range(chunk_size, file_size, chunk_size))
+    num_chunks = max(1, num_chunks or 1)
+    step = file_size // num_chunks
+    return [i * step for i in range(1, num_chunks)] if step else []
+
+
+class InputSplitter:
+    """Split a file into whitespace-aligned byte ranges and yield them as memoryviews.
+
+    Use either num_chunks (split the file into that many ranges) or
+    chunk_size (target bytes per range); chunk_size wins when both are set.
+    Chunks must not be used after the splitter is closed.
+    """
+
+    def __init__(self, path, num_chunks=None, chunk_size=None):
+        self.path = path
+        self.file_size = os.path.getsize(path)
+        self._file = open(path, 'rb')
+        # mmap cannot map an empty file; an empty input simply has no chunks
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.file_size else None
+        self._view = memoryview(self._mmap) if self._mmap is not None else None
+        self.ranges = self._compute_ranges(num_chunks, chunk_size)
+
+    def _align(self, offset):
+        """Move offset forward to just after the next whitespace byte (or to the end of the file)."""
+        # Start one byte back so an offset that already follows whitespace stays put
+        match = _WHITESPACE.search(self._mmap, offset - 1)
+        # No whitespace until end of file: the last word stays whole in the last range
+        return match.end() if match else self.file_size
+
+    def _compute_ranges(self, num_chunks, chunk_size):
+        """Compute the aligned (start, end) byte ranges, dropping empty ones."""
+        if not self.file_size:
+            return []
+        ranges = []
+        start = 0
+        for target in _target_offsets(self.file_size, num_chunks, chunk_size):
+            if target <= start:
+                continue  # The previous range already ran past this split point
+            end = self._align(target)
+            if end >= self.file_size:
+                break
+            ranges.append((start, end))
+            start = end
+        ranges.append((start, self.file_size))
+        return ranges
+
+    def __len__(self):
+        return len(self.ranges)
+
+    def __iter__(self):
+        """Lazily yield each chunk as a zero-copy memoryview of the mapped file."""
+        for start, end in self.ranges:
+            yield self._view[start:end]
+
+    def close(self):
+        """Release the mapping and the underlying file."""
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass  # A chunk view is still referenced; the mapping is freed with it
+            self._mmap = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class FileRange:
+    """Raw byte range of an input file, named relative to the directory the workers read it from."""
+
+    __slots__ = ('name', 'offset', 'length')
+
+    def __init__(self, name, offset, length):
+        self.name = name
+        self.offset = offset
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+
+class ByteRangeSplitter:
+    """Split a file into raw FileRange byte ranges for workers that read it themselves.
+
+    Takes num_chunks or chunk_size like InputSplitter, but only needs the
+    file's size: the ranges are not aligned to whitespace (read_word_range
+    handles the words cut at their ends). name is the file name the
+    workers resolve in their own input directory.
+    """
+
+    def __init__(self, path, name, num_chunks=None, chunk_size=None):
+        self.path = path
+        self.file_size = os.path.getsize(path)
+        offsets = [0, *_target_offsets(self.file_size, num_chunks, chunk_size), self.file_size]
+        self.ranges = [FileRange(name, start, end - start) for start, end in zip(offsets, offsets[1:]) if end > start]
+
+    def __len__(self):
+        return len(self.ranges)
+
+    def __iter__(self):
+        return iter(self.ranges)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def resolve_input_file(input_dir, name):
+    """Return the path of a file name inside input_dir, raising ValueError if it would escape it."""
+    return resolve_contained_path(input_dir, name, 'input')
+
+
+def word_range(data, offset, length):
+    """Return the (start, end) of the bytes of data holding the words that start in [offset, offset + length)."""
+    size = len(data)
+    start, end = min(offset, size), min(offset + length, size)
+    if start > 0 and not _WHITESPACE.match(data, start - 1):
+        # The range starts inside a word: it belongs to the previous range
+        match = _WHITESPACE.search(data, start)
+        start = match.end() if match else size
+    if start >= end:
+        return start, start
+    if end < size and not _WHITESPACE.match(data, end - 1):
+        # The range ends inside a word that started in it: read on to the word's end
+        match = _WHITESPACE.search(data, end)
+        end = match.end() if match else size
+    return start, end
+
+
+def read_word_range(path, offset, length):
+    """Memory-map a file and return the decoded text of the words starting in its byte range (see word_range).
+
+    Raises OSError if the file cannot be read and ValueError if the text is not UTF-8.
+    """
+    with open(path, 'rb') as file:
+        if not os.fstat(file.fileno()).st_size:
+            return ''
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+            start, end = word_range(mapping, offset, length)
+            return str(mapping[start:end], 'utf-8')
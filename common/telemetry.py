@@ -0,0 +1,267 @@
+"""
+Per-task telemetry of the workers of both stacks.
+
+A worker times every task with a TaskTimer, split into queue wait (from
+the request being handed to a server thread pool to a thread picking it
+up), compute (tokenizing and counting, or aggregating), serialize
+(decoding the request and encoding the response in the handler) and, for
+a direct-shuffle map task, shuffle (pushing partitions to the reducers),
+and counts the items and bytes it took in and gave back (and any runs a
+reducer spilled to disk, see common/spill.py). The totals
+travel back with the response (a TaskTelemetry message in gRPC, a JSON
+TELEMETRY_HEADER in REST), so the coordinator can tell the worker's time
+apart from network and client-side serialization time: TelemetryStats
+adds them up per worker against the round trips it measured.
+
+Every task is also added to the worker's WorkerMetrics, which renders
+Prometheus text-format metrics (task latency and queue wait histograms,
+throughput counters and the number of tasks in progress).
+"""
+
+import bisect
+import json
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# REST response header carrying a task's telemetry as a JSON object
+TELEMETRY_HEADER = 'X-Task-Telemetry'
+# Content type of the Prometheus text exposition format
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Fields of a task's telemetry, in the order of the TaskTelemetry message
+TELEMETRY_FIELDS = ('queue_seconds', 'compute_seconds', 'serialize_seconds', 'shuffle_seconds', 'total_seconds',
+                    'items_in', 'items_out', 'bytes_in', 'bytes_out', 'spills', 'spilled_bytes')
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Counters summed from the telemetry of every task: (metric name, telemetry field, help text)
+TASK_COUNTERS = (
+    ('mapreduce_task_compute_seconds_total', 'compute_seconds', 'Time spent tokenizing, counting or aggregating.'),
+    ('mapreduce_task_serialize_seconds_total', 'serialize_seconds',
+     'Time spent decoding requests and encoding responses.'),
+    ('mapreduce_task_shuffle_seconds_total', 'shuffle_seconds', 'Time spent pushing partitions to reducers.'),
+    ('mapreduce_task_items_in_total', 'items_in', 'Tokens mapped or partial counts reduced.'),
+    ('mapreduce_task_items_out_total', 'items_out', 'Pairs, words or keys returned.'),
+    ('mapreduce_task_bytes_in_total', 'bytes_in', 'Request payload bytes, before compression.'),
+    ('mapreduce_task_bytes_out_total', 'bytes_out', 'Response payload bytes, before compression.'),
+    ('mapreduce_task_spills_total', 'spills', 'Sorted runs spilled to disk over the memory budget.'),
+    ('mapreduce_task_spilled_bytes_total', 'spilled_bytes', 'Bytes of the runs spilled to disk.'),
+)
+
+_submitted = threading.local()
+
+
+class QueueTimingExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor that remembers when the function a thread runs was submitted (see queued_at)."""
+
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(_run_submitted, time.perf_counter(), fn, args, kwargs)
+
+
+def _run_submitted(submitted_at, fn, args, kwargs):
+    _submitted.at = submitted_at
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        _submitted.at = None
+
+
+def queued_at():
+    """Return when the function running in this QueueTimingExecutor thread was submitted, or None."""
+    return getattr(_submitted, 'at', None)
+
+
+class TaskTimer:
+    """Phase times, item counts and payload sizes of one task, measured from its creation."""
+
+    def __init__(self, task):
+        self.task = task
+        self.start = time.perf_counter()
+        submitted_at = queued_at()
+        self.queue_seconds = self.start - submitted_at if submitted_at is not None else 0.0
+        self.compute_seconds = self.serialize_seconds = self.shuffle_seconds = 0.0
+        self.total_seconds = None
+        self.items_in = self.items_out = self.bytes_in = self.bytes_out = 0
+        self.spills = self.spilled_bytes = 0
+        self.last_lap = self.start
+
+    def lap(self, phase):
+        """Add the time since the previous lap (or the start) to phase: 'compute', 'serialize' or 'shuffle'."""
+        now = time.perf_counter()
+        setattr(self, f'{phase}_seconds', getattr(self, f'{phase}_seconds') + now - self.last_lap)
+        self.last_lap = now
+
+    def finish(self):
+        """Stop the clock (on the first call) and return the telemetry as {field: value}."""
+        if self.total_seconds is None:
+            self.total_seconds = time.perf_counter() - self.start
+        return {field: getattr(self, field) for field in TELEMETRY_FIELDS}
+
+    def record_spills(self, table):
+        """Add the runs a common.spill table spilled to disk."""
+        self.spills += table.spills
+        self.spilled_bytes += table.spilled_bytes
+
+
+class WorkerMetrics:
+    """Prometheus metrics of the tasks a worker ran, thread-safe."""
+
+    def __init__(self, worker_id):
+        self.worker_id = worker_id
+        self.tasks = defaultdict(int)  # (task, status) -> tasks finished
+        self.latency = {}              # task -> [count per bucket, +Inf count, sum] of total_seconds
+        self.queue = {}                # task -> [count per bucket, +Inf count, sum] of queue_seconds
+        self.counters = defaultdict(float)  # (telemetry field, task) -> total
+        self.in_progress = 0
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def task(self, name):
+        """Time a task in the TaskTimer it yields and add it to the metrics when it ends (as failed if it raises)."""
+        timer = TaskTimer(name)
+        with self.lock:
+            self.in_progress += 1
+        status = 'error'
+        try:
+            yield timer
+            status = 'ok'
+        finally:
+            self.record(timer, status)
+
+    def record(self, timer, status):
+        """Add a task that ended with status ('ok' or 'error') to the metrics."""
+        telemetry = timer.finish()
+        with self.lock:
+            self.in_progress -= 1
+            self.tasks[(timer.task, status)] += 1
+            _observe(self.latency, timer.task, telemetry['total_seconds'])
+            _observe(self.queue, timer.task, telemetry['queue_seconds'])
+            for _, field, _ in TASK_COUNTERS:
+                self.counters[(field, timer.task)] += telemetry[field]
+
+    def render(self):
+        """Return the metrics in the Prometheus text exposition format."""
+        lines = [
+            '# HELP mapreduce_worker_info Worker identity.',
+            '# TYPE mapreduce_worker_info gauge',
+            f'mapreduce_worker_info{{worker_id="{self.worker_id}"}} 1',
+        ]
+        with self.lock:
+            lines += ['# HELP mapreduce_tasks_in_progress Tasks currently running.',
+                      '# TYPE mapreduce_tasks_in_progress gauge',
+                      f'mapreduce_tasks_in_progress {self.in_progress}',
+                      '# HELP mapreduce_tasks_total Tasks finished, by task and status.',
+                      '# TYPE mapreduce_tasks_total counter']
+            lines += [f'mapreduce_tasks_total{{task="{task}",status="{status}"}} {count}'
+                      for (task, status), count in sorted(self.tasks.items())]
+            lines += _histogram_lines('mapreduce_task_duration_seconds',
+                                      'Time from a task starting to its response being ready.', self.latency)
+            lines += _histogram_lines('mapreduce_task_queue_seconds',
+                                      'Time a task waited for a server thread.', self.queue)
+            for metric, field, help_text in TASK_COUNTERS:
+                lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} counter']
+                lines += [f'{metric}{{task="{task}"}} {value!r}'
+                          for (counter_field, task), value in sorted(self.counters.items()) if counter_field == field]
+        return '\n'.join(lines) + '\n'
+
+
+def _observe(histograms, task, value):
+    histogram = histograms.setdefault(task, [0] * (len(LATENCY_BUCKETS) + 1) + [0.0])
+    histogram[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+    histogram[-1] += value
+
+
+def _histogram_lines(metric, help_text, histograms):
+    lines = [f'# HELP {metric} {help_text}', f'# TYPE {metric} histogram']
+    for task, histogram in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), histogram):
+            cumulative += count
+            lines.append(f'{metric}_bucket{{task="{task}",le="{bound}"}} {cumulative}')
+        lines.append(f'{metric}_sum{{task="{task}"}} {histogram[-1]!r}')
+        lines.append(f'{metric}_count{{task="{task}"}} {cumulative}')
+    return lines
+
+
+def start_metrics_server(metrics, port):
+    """Serve GET /metrics on port from a daemon thread and return the server."""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = metrics.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', METRICS_CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Scrapes would flood the worker log
+
+    server = ThreadingHTTPServer(('', port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def telemetry_header(timer):
+    """Return a finished task's telemetry as the compact JSON value of TELEMETRY_HEADER."""
+    return json.dumps(timer.finish(), separators=(',', ':'))
+
+
+def parse_telemetry_header(value):
+    """Return the {field: value} telemetry of a TELEMETRY_HEADER value, or None if it is missing or invalid."""
+    try:
+        telemetry = json.loads(value) if value else None
+    except ValueError:
+        return None
+    return telemetry if isinstance(telemetry, dict) else None
+
+
+class TelemetryStats:
+    """Coordinator-side per-worker totals of task telemetry and measured round trips, thread-safe."""
+
+    def __init__(self):
+        self.workers = {}  # worker -> {'tasks': n, 'round_trip_seconds': s, field: total, ...}
+        self.lock = threading.Lock()
+
+    def record(self, worker, round_trip_seconds, telemetry):
+        """Add one call's round trip and the worker's telemetry for it ({field: value}, or None if not reported)."""
+        if not telemetry:
+            return
+        with self.lock:
+            totals = self.workers.setdefault(
+                worker, dict.fromkeys(('tasks', 'round_trip_seconds') + TELEMETRY_FIELDS, 0))
+            totals['tasks'] += 1
+            totals['round_trip_seconds'] += round_trip_seconds
+            for field in TELEMETRY_FIELDS:
+                totals[field] += telemetry.get(field, 0)
+
+    def summary_lines(self):
+        """Return performance summary lines breaking each worker's round trips down into where the time went.
+
+        Network/client is the part of the round trips the worker did not
+        account for: transfer, (de)compression, and (de)serialization in the
+        gRPC library or the HTTP stack on either side.
+        """
+        if not self.workers:
+            return []
+        lines = ["Worker Breakdown:         (seconds summed over the calls to each worker)"]
+        for worker, totals in sorted(self.workers.items()):
+            network = totals['round_trip_seconds'] - totals['queue_seconds'] - totals['total_seconds']
+            lines.append(f"  {worker}: {totals['tasks']} call(s), round trip {totals['round_trip_seconds']:.4f}s, "
+                         f"{totals['items_in']} item(s) in, {totals['items_out']} out, "
+                         f"{totals['bytes_in'] / (1024 * 1024):.2f} MB in, "
+                         f"{totals['bytes_out'] / (1024 * 1024):.2f} MB out")
+            lines.append(f"    queue {totals['queue_seconds']:.4f}s, compute {totals['compute_seconds']:.4f}s, "
+                         f"serialize {totals['serialize_seconds']:.4f}s, shuffle {totals['shuffle_seconds']:.4f}s, "
+                         f"worker total {totals['total_seconds']:.4f}s, network/client {network:.4f}s")
+            if totals['spills']:
+                lines.append(f"    spilled {totals['spills']} run(s) "
+                             f"({totals['spilled_bytes'] / (1024 * 1024):.2f} MB) over the reduce memory budget")
+        return lines
@@ -0,0 +1,89 @@
+"""
+Word tokenizer shared by the gRPC and REST workers.
+
+A word is a whitespace-separated token of the lowercased text with every
+non-alphanumeric character removed; tokens left empty are dropped.
+tokenize_reference() is the original per-character implementation and
+defines the expected output. tokenize() produces exactly the same tokens
+but deletes the unwanted characters from the whole text with C-level
+str/bytes operations before a single split(); bench/tokenizer_bench.py
+checks the two against each other. iter_segments() cuts a text into
+pieces that end on whitespace, whose tokens together are those of the text.
+"""
+
+import re
+from collections import Counter
+
+# Bump when tokenize() output changes, so cached map results are not reused
+TOKENIZER_VERSION = 1
+
+# ASCII characters that are neither alphanumeric nor whitespace, i.e. the
+# characters the reference implementation drops inside a word
+_ASCII_DELETE = bytes(i for i in range(128) if not (chr(i).isalnum() or chr(i).isspace()))
+_ASCII_DELETE_TABLE = dict.fromkeys(_ASCII_DELETE)
+
+# Characters str.split() splits on (re's \s is the same set as str.isspace())
+_WHITESPACE = re.compile(r'\s')
+
+# Above this many distinct non-ASCII characters to delete, one translate()
+# pass is cheaper than one replace() pass per character
+_MAX_REPLACE_PASSES = 32
+
+
+class _UnicodeDeleteTable(dict):
+    """str.translate() table that deletes non-alphanumeric, non-whitespace characters.
+
+    Entries are computed on first lookup and cached.
+    """
+
+    def __missing__(self, codepoint):
+        char = chr(codepoint)
+        value = codepoint if char.isalnum() or char.isspace() else None
+        self[codepoint] = value
+        return value
+
+
+_UNICODE_DELETE_TABLE = _UnicodeDeleteTable()
+
+
+def tokenize_reference(text):
+    """Tokenize text: split by whitespace and filter alphanumeric characters."""
+    text = text.lower()
+    words = [''.join(filter(str.isalnum, word)) for word in text.split()]
+    return [word for word in words if word]
+
+
+def tokenize(text):
+    """Tokenize text with the same result as tokenize_reference(), much faster.
+
+    Deleting a non-alphanumeric character inside a word joins its neighbours
+    exactly like the reference per-word filter, and whitespace is never
+    deleted, so splitting afterwards yields the same tokens.
+    """
+    text = text.lower()
+    if text.isascii():
+        return text.translate(_ASCII_DELETE_TABLE).split()
+    # Drop ASCII punctuation at the byte level, then the (usually few) distinct non-ASCII ones
+    text = text.encode('utf-8', 'surrogatepass').translate(None, _ASCII_DELETE).decode('utf-8', 'surrogatepass')
+    deletions = [char for char in set(text)
+                 if char > '\x7f' and not (char.isalnum() or char.isspace())]
+    if len(deletions) > _MAX_REPLACE_PASSES:
+        return text.translate(_UNICODE_DELETE_TABLE).split()
+    for char in deletions:
+        text = text.replace(char, '')
+    return text.split()
+
+
+def count_words(text):
+    """Return a Counter of the words in text."""
+    return Counter(tokenize(text))
+
+
+def iter_segments(text, segment_chars):
+    """Yield consecutive pieces of text of about segment_chars that end after whitespace, so no word is cut."""
+    start = 0
+    while start < len(text):
+        match = _WHITESPACE.search(text, start + segment_chars)
+        end = match.end() if match else len(text)
+        yield text[start:end]
+        start = end
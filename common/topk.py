@@ -0,0 +1,24 @@
+"""
+Top-K selection shared by the reducers and the coordinators of both stacks.
+
+Words are ranked by count, highest first, with ties broken by the word so
+every process agrees on the same total order. Reduce partitions own
+disjoint sets of words, so a word's final count is known on exactly one
+reducer: each reducer's local top K under this order contains every word
+of the global top K it owns, and selecting the top K of the union of the
+local lists gives the exact global top K while moving at most K words per
+partition.
+"""
+
+import heapq
+
+
+def rank_key(item):
+    """Sort key of a (word, count) pair: highest count first, then by word."""
+    return -item[1], item[0]
+
+
+def top_k_items(counts, k):
+    """Return the k highest (word, count) pairs of a {word: count} mapping, best first."""
+    return heapq.nsmallest(k, counts.items(), key=rank_key)
+
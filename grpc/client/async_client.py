@@ -0,0 +1,175 @@
+"""
+asyncio (grpc.aio) coordinator for the gRPC stack, selected with CLIENT_MODE=async.
+
+Runs the same map, direct-shuffle map and reduce phases as the threaded
+coordinator in client.py, with its configuration, request formats, worker
+selection, retries and payload-sized deadlines, but keeps up to
+IN_FLIGHT_PER_WORKER RPCs in flight per worker from a single thread
+instead of one blocking RPC per worker thread. A worker whose RPCs time
+out or report RESOURCE_EXHAUSTED is given fewer concurrent RPCs until it
+recovers. Each phase opens one grpc.aio channel per selected worker.
+"""
+
+import asyncio
+import time
+
+import grpc
+
+from common.async_scheduler import AsyncTaskScheduler
+from proto import mapreduce_pb2_grpc
+
+# Errors showing that a worker is slowing down rather than gone
+OVERLOADED_CODES = (grpc.StatusCode.DEADLINE_EXCEEDED, grpc.StatusCode.RESOURCE_EXHAUSTED)
+
+
+def is_overloaded(error):
+    """Return True if a failed attempt means its worker should get fewer concurrent RPCs."""
+    return isinstance(error, grpc.RpcError) and error.code() in OVERLOADED_CODES
+
+
+class AsyncCoordinator:
+    """Map and reduce phases over grpc.aio, configured by the client module."""
+
+    def __init__(self, client):
+        self.client = client  # client.client module: configuration and request helpers
+
+    def new_scheduler(self, workers):
+        """Create an async scheduler over the given workers."""
+        return AsyncTaskScheduler(len(workers), in_flight_per_worker=self.client.IN_FLIGHT_PER_WORKER,
+                                  max_attempts=self.client.TASK_MAX_ATTEMPTS,
+                                  retry_backoff=self.client.RETRY_BACKOFF_SECONDS,
+                                  retryable=self.client.is_retryable, overloaded=is_overloaded)
+
+    async def run_phase(self, registry, workers, tasks, build_call, on_result, rpc_label, build_probe=None):
+        """Run every task on the workers and return the scheduler.
+
+        build_call(task) returns (rpc_name, request, payload_bytes) for one attempt.
+        With MAP_CACHE, build_probe(task) returns (rpc_name, request, chunk) of
+        the cache probe sent first; build_call is only used if it misses.
+        """
+        client = self.client
+        channels = [grpc.aio.insecure_channel(address, options=registry.options) for address in workers]
+        stubs = [mapreduce_pb2_grpc.MapReduceServiceStub(channel) for channel in channels]
+
+        async def call(worker_index, rpc_name, request, timeout):
+            address = workers[worker_index]
+            with registry.lock:
+                registry.in_flight[address] += 1
+            try:
+                start = time.perf_counter()
+                response = await getattr(stubs[worker_index], rpc_name)(
+                    registry.count_request(rpc_name, request), timeout=timeout,
+                    metadata=registry.metadata, compression=registry.compression)
+                return registry.count_response(rpc_name, response, address, time.perf_counter() - start)
+            finally:
+                with registry.lock:
+                    registry.in_flight[address] -= 1
+
+        async def run_task(worker_index, task, attempt):
+            if build_probe and client.MAP_CACHE:
+                rpc_name, request, chunk = build_probe(task)
+                response = await call(worker_index, rpc_name, request, client.task_deadline(attempt))
+                if client.record_cache_probe(chunk, response):
+                    return response
+            rpc_name, request, num_bytes = build_call(task)
+            return await call(worker_index, rpc_name, request, client.task_deadline(attempt, num_bytes))
+
+        scheduler = self.new_scheduler(workers)
+        try:
+            await scheduler.run(tasks, run_task, on_result=on_result,
+                                on_error=client.task_error_reporter(rpc_label, workers),
+                                affinity=client.cache_affinity(workers) if build_probe and client.MAP_CACHE else None)
+        finally:
+            for channel in channels:
+                await channel.close()
+        return scheduler
+
+    def run_map_phase(self, registry, chunks, pipeline=None):
+        """Execute Map phase with many RPCs in flight per worker, handing results to the pipeline if given."""
+        client = self.client
+        workers = client.select_workers(registry)
+        all_intermediate_data = []
+
+        def build_call(chunk):
+            return (*client.build_map_call(chunk), len(chunk))
+
+        def build_probe(chunk):
+            return (*client.build_cache_probe(chunk), chunk)
+
+        print(f"\n[Map Phase] Starting {len(chunks)} task(s) on {len(workers)} worker(s), "
+              f"up to {client.IN_FLIGHT_PER_WORKER} in flight each...")
+        start_time = time.perf_counter()
+        scheduler = asyncio.run(self.run_phase(
+            registry, workers, chunks, build_call,
+            pipeline.shuffle if pipeline else (
+                lambda task_index, response: client.collect_map_response(all_intermediate_data, response)),
+            'MapTask', build_probe))
+        elapsed = time.perf_counter() - start_time
+        if pipeline:
+            pipeline.end_map_phase(elapsed)
+        else:
+            client.report_map_phase(all_intermediate_data, elapsed)
+        return all_intermediate_data, elapsed, scheduler
+
+    def run_direct_map_phase(self, registry, chunks, job_id, reducers, pushes):
+        """Execute Map phase with direct shuffle and many RPCs in flight per worker."""
+        client = self.client
+        workers = client.select_workers(registry)
+        num_words = num_unique_words = 0
+
+        def build_call(task):
+            task_id, chunk = task
+            return 'ShuffleMapTask', client.build_shuffle_map_request(job_id, task_id, chunk, reducers), len(chunk)
+
+        def build_probe(task):
+            task_id, chunk = task
+            return 'ShuffleMapTask', client.build_shuffle_map_request(job_id, task_id, chunk, reducers, True), chunk
+
+        def collect(task_index, response):
+            nonlocal num_words, num_unique_words
+            num_words += response.num_words
+            num_unique_words += response.num_unique_words
+            registry.add_traffic('PushPartition', response.bytes_pushed, 0)
+            for push in response.pushes:
+                pushes.record(push.partition, push.bytes)
+
+        print(f"\n[Map Phase] Starting job {job_id}: {len(chunks)} task(s) on {len(workers)} worker(s) "
+              f"with direct shuffle, up to {client.IN_FLIGHT_PER_WORKER} in flight each...")
+        start_time = time.perf_counter()
+        # Retries are safe: reducers ignore a second push from the same task id
+        scheduler = asyncio.run(self.run_phase(registry, workers, enumerate(chunks), build_call, collect,
+                                               'ShuffleMapTask', build_probe))
+        elapsed = time.perf_counter() - start_time
+        print(f"[Map Phase] Complete - Time: {elapsed:.6f}s, Words: {num_words}, "
+              f"Partial counts pushed to reducers: {num_unique_words}")
+        return elapsed, scheduler
+
+    def run_reduce_phase(self, registry, intermediate_data, job_id):
+        """Execute Reduce phase - shuffle data into partitions and send them asynchronously."""
+        client = self.client
+        shuffle_start = time.perf_counter()
+        partitions, num_unique_keys = client.shuffle_intermediate_data(intermediate_data)
+        shuffle_elapsed = time.perf_counter() - shuffle_start
+        print(f"[Shuffle Phase] Complete - Time: {shuffle_elapsed:.6f}s, Unique keys: {num_unique_keys}, "
+              f"Partitions: {client.NUM_REDUCE_PARTITIONS}")
+
+        workers = client.select_workers(registry)
+        final_results = {}
+        tasks = [(index, partition) for index, partition in enumerate(partitions)
+                 if partition and not (client.MAP_FORMAT in client.COUNTED_FORMATS and not partition[0])]
+
+        def build_call(task):
+            reduce_rpc, reduce_request = client.build_reduce_call(job_id, task)
+            return reduce_rpc, reduce_request, reduce_request.ByteSize()
+
+        def collect(task_index, response):
+            if response:
+                client.collect_reduce_response(final_results, response)
+
+        print(f"[Reduce Phase] Starting {len(tasks)} partition(s) on {len(workers)} worker(s)...")
+        reduce_start = time.perf_counter()
+        scheduler = asyncio.run(self.run_phase(registry, workers, tasks, build_call, collect, 'ReduceTask'))
+        reduce_elapsed = time.perf_counter() - reduce_start
+        print(f"[Reduce Phase] Complete - Time: {reduce_elapsed:.6f}s, "
+              f"Results: {client.num_result_keys(final_results)} keys")
+        return final_results, reduce_elapsed, shuffle_elapsed, scheduler
@@ -1,174 +1,736 @@
 import grpc
-from proto import mapreduce_pb2, mapreduce_pb2_grpc
-from collections import defaultdict
+from proto import mapreduce_pb2
+from proto.codec import COMPRESSION_ALGORITHMS, call_metadata, iter_fields, pairs_to_encoded
+from client.pipeline import PipelinedShuffle
+from client.registry import WorkerRegistry, discover_worker_addresses
+from common.mapcache import MapCacheStats, cache_affinity, chunk_digest
+from common.partitioner import (SPLIT, PartitionLoadStats, PartitionPlan, PartitionPushes, partition_for_key,
+                                sample_stride)
+from common.resultfiles import (MERGED_FILE_NAME, merge_partition_files, partition_file_name,
+                                resolve_output_file)
+from common.topk import top_k_items
+from common.scheduler import JobFailedError, TaskScheduler
+from common.sketches import WordSketch, error_summary_lines, sketch_parameters
+from common.splitter import ByteRangeSplitter, InputSplitter, resolve_input_file
 import os
+import sys
 import time
+import uuid
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Configuration
 NUM_WORKERS = int(os.environ.get('NUM_WORKERS', '2'))
-WORKER_ADDRESSES = [f'worker{i+1}:50051' for i in range(NUM_WORKERS)]
-INPUT_FILE_NAME = "testfile.txt"
+# Workers: WORKER_ADDRESSES (comma-separated), WORKER_SERVICE (headless Service DNS name) or worker1..N;
+# each phase uses up to NUM_WORKERS of the ones passing a health check, least loaded first
+WORKER_ADDRESSES = discover_worker_addresses(NUM_WORKERS)
+# Input file, relative to the client directory (or an absolute path)
+INPUT_FILE_NAME = os.environ.get('INPUT_FILE', 'testfile.txt')
+# Data locality: if INPUT_DIR is set (a directory shared with the workers), INPUT_FILE is taken relative to it and
+# map tasks carry only the file name and a byte range, which each worker reads from its own INPUT_DIR
+INPUT_DIR = os.environ.get('INPUT_DIR', '')
+# Input splitting: NUM_CHUNKS chunks, or chunks of about CHUNK_SIZE bytes if set. Many more
+# tasks than workers (TASKS_PER_WORKER each) let fast workers pull more of them from the queue
+TASKS_PER_WORKER = int(os.environ.get('TASKS_PER_WORKER', '4'))
+NUM_CHUNKS = int(os.environ.get('NUM_CHUNKS', str(NUM_WORKERS * TASKS_PER_WORKER)))
+CHUNK_SIZE = int(os.environ.get('CHUNK_SIZE', '0'))
+# Intermediate format: 'combined' (per-chunk word counts), 'encoded' (the same counts, dictionary-encoded)
+# or 'legacy' ("word:1" strings)
+MAP_FORMAT = os.environ.get('MAP_FORMAT', 'combined').lower()
+COUNTED_FORMATS = ('combined', 'encoded')
+# Map result cache: send each chunk's digest first and upload the chunk only if the worker has not cached its
+# counts (combined/encoded map format without MAP_STREAMING). Chunk i goes to the same worker on every run
+MAP_CACHE = os.environ.get('MAP_CACHE', 'false').lower() in ('1', 'true', 'yes')
+# Compression of every request and response: 'none', 'gzip' or 'deflate' (asked for per call)
+GRPC_COMPRESSION = os.environ.get('GRPC_COMPRESSION', 'none').lower()
+# Top-K mode: if set, reducers return only their TOP_K most frequent words and the client prints the
+# exact top TOP_K instead of the whole vocabulary
+TOP_K = int(os.environ.get('TOP_K', '0'))
+# Result files: if OUTPUT_DIR is set (a directory shared with the workers), reducers write one sorted TSV file
+# per partition under OUTPUT_DIR/<job id>/, sorted by OUTPUT_ORDER ('key' or 'count'), instead of returning
+# their counts; OUTPUT_MERGE also k-way merges them into one sorted result.tsv. Only a summary is printed
+OUTPUT_DIR = os.environ.get('OUTPUT_DIR', '')
+OUTPUT_ORDER = os.environ.get('OUTPUT_ORDER', 'key').lower()
+OUTPUT_MERGE = os.environ.get('OUTPUT_MERGE', 'false').lower() in ('1', 'true', 'yes')
+# Counting: 'exact', or 'approximate': workers return fixed-size mergeable sketches of their chunks, which this
+# client merges as they arrive (no shuffle or reduce phase). Counts are at most SKETCH_EPSILON x the total number
+# of words too high with probability 1 - SKETCH_DELTA (Count-Min Sketch), the number of distinct words comes from
+# a HyperLogLog of 2^SKETCH_HLL_PRECISION registers, and the SKETCH_HEAVY_HITTERS most frequent words are tracked
+# (Misra-Gries) and printed (only the top TOP_K if set), with their error bounds
+COUNT_MODE = os.environ.get('COUNT_MODE', 'exact').lower()
+SKETCH_EPSILON = float(os.environ.get('SKETCH_EPSILON', '0.001'))
+SKETCH_DELTA = float(os.environ.get('SKETCH_DELTA', '0.01'))
+SKETCH_HLL_PRECISION = int(os.environ.get('SKETCH_HLL_PRECISION', '14'))
+SKETCH_HEAVY_HITTERS = int(os.environ.get('SKETCH_HEAVY_HITTERS', '100'))
+# Number of hash partitions for the reduce phase (one ReduceTask call per partition)
+NUM_REDUCE_PARTITIONS = int(os.environ.get('NUM_REDUCE_PARTITIONS', str(NUM_WORKERS)))
+# Client-side shuffle partitioner: 'hash' (crc32 of the word) or 'sampled': balance the partitions by the volume of
+# a sample of about PARTITION_SAMPLE_SIZE map output entries, splitting words estimated above HOT_KEY_FRACTION of a
+# balanced partition over several partitions (not with TOP_K or OUTPUT_DIR, which need one partition per word)
+PARTITIONER = os.environ.get('PARTITIONER', 'hash').lower()
+PARTITION_SAMPLE_SIZE = int(os.environ.get('PARTITION_SAMPLE_SIZE', '100000'))
+HOT_KEY_FRACTION = float(os.environ.get('HOT_KEY_FRACTION', '0.5'))
+# Stream each chunk to StreamMapTask in bounded frames instead of one MapRequest per chunk
+MAP_STREAMING = os.environ.get('MAP_STREAMING', 'false').lower() in ('1', 'true', 'yes')
+STREAM_FRAME_SIZE = int(os.environ.get('STREAM_FRAME_SIZE', str(1024 * 1024)))  # 1 MB
+# Speculative execution: back up map tasks running longer than SPECULATIVE_FACTOR x the median latency
+SPECULATIVE_EXECUTION = os.environ.get('SPECULATIVE_EXECUTION', 'true').lower() in ('1', 'true', 'yes')
+SPECULATIVE_FACTOR = float(os.environ.get('SPECULATIVE_FACTOR', '2.0'))
+# Shuffle: 'client' (intermediate data flows through this client), 'direct' (map workers push to reducers) or
+# 'pipelined' (this client pushes each map result to the reducers as soon as it arrives, see client/pipeline.py)
+SHUFFLE_MODE = os.environ.get('SHUFFLE_MODE', 'client').lower()
+# Retries: a failed task is retried on another worker after RETRY_BACKOFF_SECONDS (doubling), up to
+# TASK_MAX_ATTEMPTS attempts. An attempt's deadline is TASK_DEADLINE_SECONDS plus
+# TASK_DEADLINE_SECONDS_PER_MB for every MB of request payload, doubled for every retry
+TASK_MAX_ATTEMPTS = int(os.environ.get('TASK_MAX_ATTEMPTS', '3'))
+TASK_DEADLINE_SECONDS = float(os.environ.get('TASK_DEADLINE_SECONDS', '10'))
+TASK_DEADLINE_SECONDS_PER_MB = float(os.environ.get('TASK_DEADLINE_SECONDS_PER_MB', '2'))
+RETRY_BACKOFF_SECONDS = float(os.environ.get('RETRY_BACKOFF_SECONDS', '0.5'))
+# Coordinator: 'threads' (one RPC per worker at a time) or 'async' (grpc.aio, see client/async_client.py)
+CLIENT_MODE = os.environ.get('CLIENT_MODE', 'threads').lower()
+# RPCs kept in flight per worker by the async coordinator (fewer while a worker is overloaded)
+IN_FLIGHT_PER_WORKER = int(os.environ.get('IN_FLIGHT_PER_WORKER', '4'))
+# ShuffleMapTasks a worker runs at once (half of its SERVER_THREADS, default 10); with direct shuffle
+# IN_FLIGHT_PER_WORKER may not exceed it, or the extra tasks are only refused and retried
+MAX_SHUFFLE_MAP_TASKS = int(os.environ.get('MAX_SHUFFLE_MAP_TASKS', '5'))
+# Phase each RPC's traffic is reported under (PushPartition is worker-to-worker, reported by the map workers)
+RPC_PHASES = {
+    'MapTask': 'Map', 'CombinedMapTask': 'Map', 'StreamMapTask': 'Map', 'ShuffleMapTask': 'Map',
+    'PushPartition': 'Shuffle',
+    'SketchMapTask': 'Map',
+    'ReduceTask': 'Reduce', 'CombinedReduceTask': 'Reduce', 'FinishPartition': 'Reduce',
+}
 GRPC_OPTIONS = [
     ('grpc.max_send_message_length', 50 * 1024 * 1024),    # 50 MB
     ('grpc.max_receive_message_length', 50 * 1024 * 1024)  # 50 MB
 ]
 
 print(f"\n{'='*60}")
-print(f"MapReduce Configuration: {NUM_WORKERS} Worker(s)")
+print(f"MapReduce Configuration: {NUM_WORKERS} Worker(s), {NUM_REDUCE_PARTITIONS} Reduce Partition(s), "
+      f"{MAP_FORMAT} map format, {GRPC_COMPRESSION} compression, {SHUFFLE_MODE} shuffle, {CLIENT_MODE} coordinator")
+if MAP_CACHE:
+    print("Map result cache: chunks are uploaded only on a cache miss")
+if INPUT_DIR:
+    print(f"Data locality: workers read byte ranges of the input from {INPUT_DIR}")
+if PARTITIONER == 'sampled':
+    print(f"Sampled partitioner: partitions balanced on about {PARTITION_SAMPLE_SIZE} map output entries")
+if COUNT_MODE == 'approximate':
+    print(f"Approximate mode: sketches with epsilon {SKETCH_EPSILON}, delta {SKETCH_DELTA}, "
+          f"HyperLogLog precision {SKETCH_HLL_PRECISION}, {SKETCH_HEAVY_HITTERS} heavy hitters")
+elif TOP_K:
+    print(f"Top-K mode: reducers return their top {TOP_K} word(s)")
+if OUTPUT_DIR:
+    print(f"Result files: {OUTPUT_DIR}, sorted by {OUTPUT_ORDER}{', merged' if OUTPUT_MERGE else ''}")
 print(f"{'='*60}")
 
-def read_input_file(filename):
-    """Read input file."""
+# OutputFile of every partition the reducers wrote in this job
+output_files = []
+# Hits and misses of the MAP_CACHE probes
+cache_stats = MapCacheStats()
+# Reduce input entries per partition of the client-side shuffle
+partition_load_stats = PartitionLoadStats()
+
+def input_file_path(filename):
+    """Return the path of the input file in the client directory."""
     filepath = os.path.join('client', filename)
     if not os.path.exists(filepath):
         raise FileNotFoundError(f"Error: The input file '{filename}' was not found in the client directory.")
-    print(f"Reading input data from: {filepath}")
-    with open(filepath, 'r', encoding='utf-8') as f:
-        return f.read()
-
-def split_input_data(data, num_chunks):
-    """Split input data into chunks for workers."""
-    chunk_size = len(data) // num_chunks
-    chunks = []
-    for i in range(num_chunks):
-        start = i * chunk_size
-        end = (i + 1) * chunk_size if i < num_chunks - 1 else len(data)
-        chunks.append(data[start:end])
-    return chunks
-
-def run_map_phase(chunks):
-    """Execute Map phase - send chunks to workers and collect results."""
-    stubs = [
-        mapreduce_pb2_grpc.MapReduceServiceStub(
-            grpc.insecure_channel(addr, options=GRPC_OPTIONS)
-        )
-        for addr in WORKER_ADDRESSES
-    ]
-    
+    return filepath
+
+def open_input_splitter(filename):
+    """Memory-map the input file and split it into whitespace-aligned chunks (byte ranges with INPUT_DIR)."""
+    if INPUT_DIR:
+        filepath = resolve_input_file(INPUT_DIR, filename)
+        if not os.path.exists(filepath):
+            raise FileNotFoundError(f"Error: The input file '{filename}' was not found in {INPUT_DIR}.")
+        print(f"Splitting shared input into byte ranges: {filepath}")
+        return ByteRangeSplitter(filepath, filename, num_chunks=NUM_CHUNKS, chunk_size=CHUNK_SIZE)
+    filepath = input_file_path(filename)
+    print(f"Mapping input data from: {filepath}")
+    return InputSplitter(filepath, num_chunks=NUM_CHUNKS, chunk_size=CHUNK_SIZE)
+
+def input_fields(chunk):
+    """Return the map request fields carrying a chunk: its decoded text, or with INPUT_DIR only its byte range."""
+    if INPUT_DIR:
+        return {'input_range': mapreduce_pb2.InputRange(input_file=chunk.name, offset=chunk.offset,
+                                                        length=chunk.length)}
+    return {'input_data': str(chunk, 'utf-8')}
+
+def iter_input_frames(chunk):
+    """Lazily slice a memory-mapped chunk into MapFrame messages of STREAM_FRAME_SIZE bytes."""
+    for offset in range(0, len(chunk), STREAM_FRAME_SIZE):
+        yield mapreduce_pb2.MapFrame(data=bytes(chunk[offset:offset + STREAM_FRAME_SIZE]))
+
+def sketch_fields():
+    """Return the SketchMapRequest fields of the configured sketch parameters."""
+    width, depth, precision, heavy_hitters = sketch_parameters(SKETCH_EPSILON, SKETCH_DELTA, SKETCH_HLL_PRECISION,
+                                                               SKETCH_HEAVY_HITTERS)
+    return {'width': width, 'depth': depth, 'precision': precision, 'heavy_hitters': heavy_hitters}
+
+def build_map_call(chunk):
+    """Return the map RPC name and request (or frame iterator) for one chunk, decoding it only now."""
+    if COUNT_MODE == 'approximate':
+        digest = chunk_digest(chunk) if MAP_CACHE else ''
+        return 'SketchMapTask', mapreduce_pb2.SketchMapRequest(digest=digest, **input_fields(chunk),
+                                                               **sketch_fields())
+    if MAP_STREAMING:
+        return 'StreamMapTask', iter_input_frames(chunk)
+    map_rpc = 'CombinedMapTask' if MAP_FORMAT in COUNTED_FORMATS else 'MapTask'
+    digest = chunk_digest(chunk) if MAP_CACHE else ''
+    return map_rpc, mapreduce_pb2.MapRequest(digest=digest, **input_fields(chunk))
+
+def build_cache_probe(chunk):
+    """Return the map RPC name and request asking a worker for the cached counts of a chunk."""
+    if COUNT_MODE == 'approximate':
+        return 'SketchMapTask', mapreduce_pb2.SketchMapRequest(digest=chunk_digest(chunk), cache_probe=True,
+                                                               **sketch_fields())
+    return 'CombinedMapTask', mapreduce_pb2.MapRequest(digest=chunk_digest(chunk), cache_probe=True)
+
+def record_cache_probe(chunk, response):
+    """Count a cache probe and return True if its response already holds the chunk's map result."""
+    hit = not response.cache_miss
+    cache_stats.record(hit, len(chunk))
+    return hit
+
+def send_map_chunk(registry, address, chunk, timeout):
+    """Send one memory-mapped chunk to a worker (with MAP_CACHE, only if a probe for its digest misses)."""
+    if MAP_CACHE:
+        response = registry.call(address, *build_cache_probe(chunk), timeout)
+        if record_cache_probe(chunk, response):
+            return response
+    return registry.call(address, *build_map_call(chunk), timeout)
+
+def collect_map_response(all_intermediate_data, response):
+    """Add the intermediate data of one map response to all_intermediate_data.
+
+    In approximate mode each chunk's sketch is merged as it arrives into the
+    single sketch all_intermediate_data holds.
+    """
+    if COUNT_MODE == 'approximate':
+        sketch = WordSketch.from_bytes(response.sketch)
+        if all_intermediate_data:
+            all_intermediate_data[0].merge(sketch)
+        else:
+            all_intermediate_data.append(sketch)
+    elif MAP_FORMAT in COUNTED_FORMATS:
+        if response and (response.counts.keys or response.encoded.counts):
+            all_intermediate_data.append(response)
+    elif response and response.mapped:
+        all_intermediate_data.extend(response.mapped)
+
+def report_map_phase(all_intermediate_data, elapsed):
+    """Print the end of the map phase."""
+    if COUNT_MODE == 'approximate':
+        num_words = all_intermediate_data[0].total if all_intermediate_data else 0
+        print(f"[Map Phase] Complete - Time: {elapsed:.6f}s, Results: sketches of {num_words} words merged")
+    elif MAP_FORMAT in COUNTED_FORMATS:
+        num_pairs = sum(len(response.counts.keys) + len(response.encoded.counts) for response in all_intermediate_data)
+        print(f"[Map Phase] Complete - Time: {elapsed:.6f}s, Results: {num_pairs} partial counts")
+    else:
+        print(f"[Map Phase] Complete - Time: {elapsed:.6f}s, Results: {len(all_intermediate_data)} pairs")
+
+def select_workers(registry):
+    """Health-check the workers and return up to NUM_WORKERS serving ones, least loaded first."""
+    registry.refresh()
+    workers = registry.live_workers(NUM_WORKERS)
+    if not workers:
+        raise RuntimeError(f"No worker is serving (checked {len(set(registry.addresses))} address(es))")
+    return workers
+
+def task_deadline(attempt, num_bytes=0):
+    """Return the RPC deadline of a task attempt sending num_bytes, doubling it for every retry."""
+    return (TASK_DEADLINE_SECONDS + TASK_DEADLINE_SECONDS_PER_MB * num_bytes / (1024 * 1024)) * 2 ** (attempt - 1)
+
+def is_retryable(error):
+    """Return True if another attempt of a failed task may succeed."""
+    if not isinstance(error, grpc.RpcError):
+        return False  # A local error (e.g. undecodable input) would fail again
+    return error.code() not in (grpc.StatusCode.INVALID_ARGUMENT, grpc.StatusCode.UNIMPLEMENTED)
+
+def new_scheduler(workers, speculative=SPECULATIVE_EXECUTION):
+    """Create a pull-based task scheduler over the given workers."""
+    return TaskScheduler(len(workers), speculative=speculative, speculative_factor=SPECULATIVE_FACTOR,
+                         max_attempts=TASK_MAX_ATTEMPTS, retry_backoff=RETRY_BACKOFF_SECONDS,
+                         retryable=is_retryable)
+
+def task_error_reporter(rpc_name, workers):
+    """Return an on_error callback that reports failed task attempts."""
+    return lambda task_index, worker_index, error: print_task_error(rpc_name, task_index, workers[worker_index], error)
+
+def print_task_error(rpc_name, task_index, address, error):
+    """Report a failed task attempt."""
+    if isinstance(error, grpc.RpcError):
+        print(f"!!! Error calling {rpc_name} for task {task_index} on {address}: "
+              f"{error.code().name}: {error.details()}")
+    else:
+        print(f"!!! Unexpected error in task {task_index}: {error}")
+
+def run_map_phase(registry, chunks, pipeline=None):
+    """Execute Map phase - send chunks to workers and collect results.
+
+    In 'combined' and 'encoded' mode each result is a CombinedMapResponse with
+    one entry per unique word of a chunk (as KeyCounts or EncodedCounts); in
+    'legacy' mode results are "word:1" strings.
+    Chunks are memoryviews; each is decoded (or framed, with MAP_STREAMING)
+    in the sending thread, so only chunks in flight are copied. Workers pull
+    chunks from a shared queue, stragglers get speculative backups and
+    failed chunks are retried on another worker. With a PipelinedShuffle,
+    results are handed to it as they arrive instead of being collected.
+    """
+    workers = select_workers(registry)
     all_intermediate_data = []
     
-    print(f"\n[Map Phase] Starting on {NUM_WORKERS} worker(s)...")
+    print(f"\n[Map Phase] Starting {len(chunks)} task(s) on {len(workers)} worker(s)...")
     start_time = time.perf_counter()
 
-    with ThreadPoolExecutor(max_workers=NUM_WORKERS) as executor:
-        futures = {}
-        for i, chunk in enumerate(chunks):
-            worker_index = i % NUM_WORKERS
-            future = executor.submit(stubs[worker_index].MapTask, mapreduce_pb2.MapRequest(input_data=chunk), 10)
-            futures[future] = worker_index
+    scheduler = new_scheduler(workers)
+    scheduler.run(
+        chunks,
+        lambda worker_index, chunk, attempt: send_map_chunk(
+            registry, workers[worker_index], chunk, task_deadline(attempt, len(chunk))),
+        on_result=pipeline.shuffle if pipeline else (
+            lambda task_index, response: collect_map_response(all_intermediate_data, response)),
+        on_error=task_error_reporter('MapTask', workers),
+        affinity=cache_affinity(workers) if MAP_CACHE else None,
+    )
 
-        for future in as_completed(futures):
-            worker_index = futures[future]
+    elapsed = time.perf_counter() - start_time
+    if pipeline:
+        pipeline.end_map_phase(elapsed)
+    else:
+        report_map_phase(all_intermediate_data, elapsed)
+    return all_intermediate_data, elapsed, scheduler
+
+def sampled_partition_plan(intermediate_data):
+    """Build a PartitionPlan from about PARTITION_SAMPLE_SIZE entries of the map output.
+
+    Whole map responses are taken at a stride (single "word:1" pairs in
+    'legacy' mode); every entry counts as one unit of reduce input.
+    """
+    if MAP_FORMAT in COUNTED_FORMATS:
+        num_entries = sum(len(response.counts.keys) + len(response.encoded.counts) for response in intermediate_data)
+        sample = intermediate_data[::sample_stride(num_entries, PARTITION_SAMPLE_SIZE)]
+        keys = (key for response in sample for key, _ in iter_fields(response))
+    else:
+        sample = intermediate_data[::sample_stride(len(intermediate_data), PARTITION_SAMPLE_SIZE)]
+        keys = (item.split(':', 1)[0] for item in sample)
+    return PartitionPlan.from_sample(keys, NUM_REDUCE_PARTITIONS, HOT_KEY_FRACTION,
+                                     split_hot_keys=not (TOP_K or OUTPUT_DIR))
+
+def shuffle_intermediate_data(intermediate_data):
+    """Partition intermediate data into NUM_REDUCE_PARTITIONS partitions (by crc32, or by a sampled plan).
+
+    In 'combined' and 'encoded' mode each partition is a (keys, counts) pair
+    of parallel lists; in 'legacy' mode it is a list of "word:1" strings.
+    Returns the partitions and the number of unique keys seen. The map
+    results are consumed (removed from intermediate_data) as they are
+    partitioned, so they are not held twice. The entries each partition
+    received are recorded in partition_load_stats.
+    """
+    plan = sampled_partition_plan(intermediate_data) if PARTITIONER == 'sampled' else None
+    partition_of = plan.partition_of if plan else lambda key: partition_for_key(key, NUM_REDUCE_PARTITIONS)
+    key_partitions = {}
+    if MAP_FORMAT in COUNTED_FORMATS:
+        partitions = [([], []) for _ in range(NUM_REDUCE_PARTITIONS)]
+        while intermediate_data:
+            for key, count in iter_fields(intermediate_data.pop()):
+                partition = key_partitions.get(key)
+                if partition is None:
+                    partition = key_partitions[key] = partition_of(key)
+                if partition == SPLIT:
+                    partition = plan.next_partition(key)
+                keys, values = partitions[partition]
+                keys.append(key)
+                values.append(count)
+        loads = [len(keys) for keys, _ in partitions]
+    else:
+        partitions = [[] for _ in range(NUM_REDUCE_PARTITIONS)]
+        while intermediate_data:
+            item = intermediate_data.pop()
             try:
-                response = future.result()
-                if response and response.mapped:
-                    all_intermediate_data.extend(response.mapped)
-            except grpc.RpcError as e:
-                worker_addr = WORKER_ADDRESSES[worker_index]
-                print(f"!!! Error calling MapTask on {worker_addr}: {e.details()}")
-            except Exception as e:
-                print(f"!!! Unexpected error: {e}")
+                key, _ = item.split(':', 1)
+            except ValueError:
+                continue
+            partition = key_partitions.get(key)
+            if partition is None:
+                partition = key_partitions[key] = partition_of(key)
+            if partition == SPLIT:
+                partition = plan.next_partition(key)
+            partitions[partition].append(item)
+        loads = [len(items) for items in partitions]
+    partition_load_stats.record(loads, len(plan.split_keys) if plan else 0)
+    return partitions, len(key_partitions)
 
-    elapsed = time.perf_counter() - start_time
-    print(f"[Map Phase] Complete - Time: {elapsed:.6f}s, Results: {len(all_intermediate_data)} pairs")
-    return all_intermediate_data, elapsed
+def output_fields(job_id, index):
+    """Return the reduce request fields that make the reducer write partition index to a result file."""
+    if not OUTPUT_DIR:
+        return {}
+    return {'output_file': partition_file_name(job_id, index), 'sort_by_count': OUTPUT_ORDER == 'count'}
+
+def build_reduce_call(job_id, task):
+    """Return the ReduceTask RPC name and request for one (index, shuffled partition) task."""
+    index, partition = task
+    if MAP_FORMAT == 'encoded':
+        keys, values = partition
+        request = mapreduce_pb2.CombinedReduceRequest(encoded=pairs_to_encoded(keys, values), top_k=TOP_K,
+                                                      **output_fields(job_id, index))
+        return 'CombinedReduceTask', request
+    if MAP_FORMAT == 'combined':
+        keys, values = partition
+        request = mapreduce_pb2.CombinedReduceRequest(
+            counts=mapreduce_pb2.KeyCounts(keys=keys, counts=values),
+            top_k=TOP_K,
+            **output_fields(job_id, index),
+        )
+        return 'CombinedReduceTask', request
+    return 'ReduceTask', mapreduce_pb2.ReduceRequest(mapped_data=partition, top_k=TOP_K,
+                                                     **output_fields(job_id, index))
+
+def parse_reduce_response(response):
+    """Return {word: count} from a ReduceTask or CombinedReduceTask response."""
+    if MAP_FORMAT in COUNTED_FORMATS:
+        return dict(iter_fields(response))
+    counts = {}
+    for line in response.result.split('\n'):
+        line = line.strip()
+        if line:
+            try:
+                key, count = line.split(':', 1)
+                counts[key] = int(count)
+            except ValueError:
+                pass
+    return counts
+
+def collect_reduce_response(final_results, response):
+    """Add a reduce response to final_results, or its result file to output_files."""
+    if response.HasField('output_file'):
+        output_files.append(response.output_file)
+    else:
+        # Partial counts of a hot key split over several partitions add up
+        for word, count in parse_reduce_response(response).items():
+            final_results[word] = final_results.get(word, 0) + count
 
-def run_reduce_phase(intermediate_data):
-    """Execute Reduce phase - shuffle data and send to workers."""
-    # Shuffle: Group intermediate data by key
+def num_result_keys(final_results):
+    """Return the number of words returned to the client or written to result files."""
+    return len(final_results) + sum(output_file.num_keys for output_file in output_files)
+
+def run_reduce_phase(registry, intermediate_data, job_id):
+    """Execute Reduce phase - shuffle data into partitions and send one call per partition.
+
+    Partitions are pulled by free workers and a failed partition is retried
+    on another worker; the map results stay in memory, so nothing is re-mapped.
+    """
+    # Shuffle: Hash-partition intermediate data by key
     shuffle_start = time.perf_counter()
-    grouped_data = defaultdict(list)
-    for item in intermediate_data:
-        try:
-            key, _ = item.split(':', 1)
-            grouped_data[key].append(item)
-        except ValueError:
-            pass
-    
-    unique_keys = list(grouped_data.keys())
+    partitions, num_unique_keys = shuffle_intermediate_data(intermediate_data)
     shuffle_elapsed = time.perf_counter() - shuffle_start
-    print(f"[Shuffle Phase] Complete - Time: {shuffle_elapsed:.6f}s, Unique keys: {len(unique_keys)}")
+    print(f"[Shuffle Phase] Complete - Time: {shuffle_elapsed:.6f}s, Unique keys: {num_unique_keys}, "
+          f"Partitions: {NUM_REDUCE_PARTITIONS}")
     
-    # Reduce: Send grouped data to workers
-    stubs = [mapreduce_pb2_grpc.MapReduceServiceStub(grpc.insecure_channel(addr)) for addr in WORKER_ADDRESSES]
+    # Reduce: Send each partition to a worker in a single call
+    workers = select_workers(registry)
     final_results = {}
+    # Skip partitions nothing hashed to
+    tasks = [(index, partition) for index, partition in enumerate(partitions)
+             if partition and not (MAP_FORMAT in COUNTED_FORMATS and not partition[0])]
+    
+    def reduce_partition(worker_index, task, attempt):
+        reduce_rpc, reduce_request = build_reduce_call(job_id, task)
+        return registry.call(workers[worker_index], reduce_rpc, reduce_request,
+                             task_deadline(attempt, reduce_request.ByteSize()))
+    
+    def collect(task_index, response):
+        if response:
+            collect_reduce_response(final_results, response)
     
-    print(f"[Reduce Phase] Starting on {NUM_WORKERS} worker(s)...")
+    print(f"[Reduce Phase] Starting {len(tasks)} partition(s) on {len(workers)} worker(s)...")
     reduce_start = time.perf_counter()
     
-    with ThreadPoolExecutor(max_workers=NUM_WORKERS) as executor:
-        futures = {}
-        for i, key in enumerate(unique_keys):
-            worker_index = i % NUM_WORKERS
-            future = executor.submit(
-                stubs[worker_index].ReduceTask,
-                mapreduce_pb2.ReduceRequest(mapped_data=grouped_data[key]),
-                10
-            )
-            futures[future] = key
+    scheduler = new_scheduler(workers, speculative=False)
+    scheduler.run(
+        tasks,
+        reduce_partition,
+        on_result=collect,
+        on_error=task_error_reporter('ReduceTask', workers),
+    )
+    
+    reduce_elapsed = time.perf_counter() - reduce_start
+    print(f"[Reduce Phase] Complete - Time: {reduce_elapsed:.6f}s, Results: {num_result_keys(final_results)} keys")
+    return final_results, reduce_elapsed, shuffle_elapsed, scheduler
+
+def reducer_address(reducers, partition):
+    """Return the address of the worker that reduces a partition."""
+    return reducers[partition % len(reducers)]
+
+def build_shuffle_map_request(job_id, task_id, chunk, reducers, cache_probe=False):
+    """Return the ShuffleMapTask request for one chunk, decoding it only now (a cache probe sends no input)."""
+    return mapreduce_pb2.ShuffleMapRequest(
+        job_id=job_id,
+        task_id=task_id,
+        reducer_addresses=[reducer_address(reducers, p) for p in range(NUM_REDUCE_PARTITIONS)],
+        digest=chunk_digest(chunk) if MAP_CACHE else '',
+        cache_probe=cache_probe,
+        **({} if cache_probe else input_fields(chunk)),
+    )
+
+def send_shuffle_map_chunk(registry, address, job_id, task_id, chunk, reducers, timeout):
+    """Send one chunk as a ShuffleMapTask (with MAP_CACHE, only if a probe for its digest misses)."""
+    if MAP_CACHE:
+        probe = build_shuffle_map_request(job_id, task_id, chunk, reducers, cache_probe=True)
+        response = registry.call(address, 'ShuffleMapTask', probe, timeout)
+        if record_cache_probe(chunk, response):
+            return response
+    return registry.call(address, 'ShuffleMapTask', build_shuffle_map_request(job_id, task_id, chunk, reducers),
+                         timeout)
+
+def run_direct_map_phase(registry, chunks, job_id, reducers, pushes):
+    """Execute Map phase with direct shuffle - map workers push partitions straight to reducers.
+
+    Only task assignments go out and small statistics come back; the
+    intermediate counts never pass through the client. The pushes each map
+    task reports as acknowledged are counted in pushes (a PartitionPushes).
+    """
+    workers = select_workers(registry)
+    num_words = num_unique_words = 0
+    
+    def collect(task_index, response):
+        nonlocal num_words, num_unique_words
+        num_words += response.num_words
+        num_unique_words += response.num_unique_words
+        registry.add_traffic('PushPartition', response.bytes_pushed, 0)
+        for push in response.pushes:
+            pushes.record(push.partition, push.bytes)
+    
+    print(f"\n[Map Phase] Starting job {job_id}: {len(chunks)} task(s) on {len(workers)} worker(s) with direct shuffle...")
+    start_time = time.perf_counter()
+    
+    # Backup attempts and retries are safe: reducers ignore a second push from the same task id
+    scheduler = new_scheduler(workers)
+    scheduler.run(
+        enumerate(chunks),
+        lambda worker_index, task, attempt: send_shuffle_map_chunk(
+            registry, workers[worker_index], job_id, task[0], task[1], reducers, task_deadline(attempt, len(task[1]))),
+        on_result=collect,
+        on_error=task_error_reporter('ShuffleMapTask', workers),
+        affinity=cache_affinity(workers) if MAP_CACHE else None,
+    )
+    
+    elapsed = time.perf_counter() - start_time
+    print(f"[Map Phase] Complete - Time: {elapsed:.6f}s, Words: {num_words}, "
+          f"Partial counts pushed to reducers: {num_unique_words}")
+    return elapsed, scheduler
+
+def finish_partition(registry, address, request, num_bytes):
+    """Collect one partition from its reducer, retrying there unless the reducer no longer holds it."""
+    for attempt in range(1, TASK_MAX_ATTEMPTS + 1):
+        try:
+            return registry.call(address, 'FinishPartition', request, task_deadline(attempt, num_bytes))
+        except grpc.RpcError as e:
+            if (attempt == TASK_MAX_ATTEMPTS or not is_retryable(e)
+                    or e.code() in (grpc.StatusCode.NOT_FOUND, grpc.StatusCode.FAILED_PRECONDITION)):
+                raise
+            print_task_error('FinishPartition', request.partition, address, e)
+            time.sleep(RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
 
+def run_finish_phase(registry, job_id, reducers, pushes):
+    """Execute Reduce phase with direct shuffle - collect each partition from its reducer.
+
+    A partition only exists on its reducer and FinishPartition hands it over
+    exactly once, so a failed call is only retried on the same reducer (which
+    keeps the partition until a call returns it), with a deadline sized by the
+    bytes pushed to the partition; if that fails too, the job fails.
+    Each call carries the number of map tasks whose pushes to the partition
+    were acknowledged, so a reducer that lost some fails instead of
+    returning partial counts.
+    """
+    final_results = {}
+    failed_partitions = []
+    
+    print(f"[Reduce Phase] Collecting {NUM_REDUCE_PARTITIONS} partition(s) from {len(set(reducers))} worker(s)...")
+    reduce_start = time.perf_counter()
+    
+    with ThreadPoolExecutor(max_workers=len(reducers)) as executor:
+        futures = {}
+        for partition in range(NUM_REDUCE_PARTITIONS):
+            request = mapreduce_pb2.FinishPartitionRequest(job_id=job_id, partition=partition, top_k=TOP_K,
+                                                           num_map_tasks=pushes.num_tasks[partition],
+                                                           **output_fields(job_id, partition))
+            future = executor.submit(finish_partition, registry, reducer_address(reducers, partition), request,
+                                     pushes.num_bytes[partition])
+            futures[future] = partition
+        
         for future in as_completed(futures):
-            key = futures[future]
+            partition = futures[future]
             try:
                 response = future.result()
-                if response and response.result:
-                    final_results[key] = response.result
+                collect_reduce_response(final_results, response)
             except grpc.RpcError as e:
-                print(f"!!! Error calling ReduceTask: {e.details()}")
+                print(f"!!! Error calling FinishPartition for partition {partition}: {e.details()}")
+                failed_partitions.append(partition)
             except Exception as e:
                 print(f"!!! Unexpected error: {e}")
-
+                failed_partitions.append(partition)
+    
+    if failed_partitions:
+        raise JobFailedError(failed_partitions, TASK_MAX_ATTEMPTS)
     reduce_elapsed = time.perf_counter() - reduce_start
-    print(f"[Reduce Phase] Complete - Time: {reduce_elapsed:.6f}s, Results: {len(final_results)} keys")
-    return final_results, reduce_elapsed, shuffle_elapsed
+    print(f"[Reduce Phase] Complete - Time: {reduce_elapsed:.6f}s, Results: {num_result_keys(final_results)} keys")
+    return final_results, reduce_elapsed
+
+def traffic_summary_lines(registry):
+    """Return performance summary lines with the message bytes sent and received in each phase."""
+    phases = {}
+    for rpc_name, (sent, received) in registry.traffic.items():
+        phase = phases.setdefault(RPC_PHASES.get(rpc_name, rpc_name), [0, 0])
+        phase[0] += sent
+        phase[1] += received
+    lines = []
+    for phase, (sent, received) in phases.items():
+        lines.append(f"  {phase + ' Bytes:':<22} sent {sent / (1024 * 1024):.2f} MB, received {received / (1024 * 1024):.2f} MB")
+    if lines:
+        lines.append(f"  (serialized message sizes, before {GRPC_COMPRESSION} compression)"
+                     if GRPC_COMPRESSION != 'none' else "  (serialized message sizes, uncompressed)")
+    return lines
+
+def select_top_k(final_results):
+    """Return the TOP_K words of the reducers' local top-K candidates (all results if TOP_K is unset).
+
+    Every word is reduced by exactly one partition, so the top TOP_K of the
+    union of the local lists is the exact global top TOP_K.
+    """
+    if not TOP_K:
+        return final_results
+    return dict(top_k_items(final_results, TOP_K))
+
+def report_output_files(job_id):
+    """Summarize the result files the reducers wrote, k-way merging them into one file if OUTPUT_MERGE."""
+    files = sorted(output_files, key=lambda output_file: output_file.name)
+    num_keys = sum(output_file.num_keys for output_file in files)
+    num_words = sum(output_file.num_words for output_file in files)
+    print(f"[Output] {len(files)} partition file(s) in {os.path.join(OUTPUT_DIR, job_id)}: "
+          f"{num_keys} keys, {num_words} words, sorted by {OUTPUT_ORDER}")
+    if OUTPUT_MERGE:
+        start_time = time.perf_counter()
+        merged_path = resolve_output_file(OUTPUT_DIR, f'{job_id}/{MERGED_FILE_NAME}')
+        paths = [resolve_output_file(OUTPUT_DIR, output_file.name) for output_file in files]
+        num_lines = merge_partition_files(paths, merged_path, by_count=OUTPUT_ORDER == 'count')
+        elapsed = time.perf_counter() - start_time
+        print(f"[Output] Merged {len(paths)} file(s) into {merged_path}: {num_lines} keys in {elapsed:.6f}s")
+
+def merged_sketch(intermediate_data):
+    """Return the sketch merged from every map task (an empty one if there was no input)."""
+    if intermediate_data:
+        return intermediate_data[0]
+    return WordSketch(*sketch_parameters(SKETCH_EPSILON, SKETCH_DELTA, SKETCH_HLL_PRECISION, SKETCH_HEAVY_HITTERS))
+
+def display_sketch_results(sketch):
+    """Display the estimated counts of the heavy hitters (the top TOP_K only if set) and the error bounds."""
+    print("\n" + "="*60)
+    print(f"APPROXIMATE TOP {TOP_K} WORDS" if TOP_K else "APPROXIMATE WORD COUNTS (HEAVY HITTERS)")
+    print("="*60)
+    for word, estimate, lower_bound in sketch.top_words(TOP_K):
+        print(f"  {word}: ~{estimate} (at least {lower_bound})")
+    print("-"*60)
+    for line in error_summary_lines(sketch):
+        print(f"  {line}")
+    print("="*60)
 
 def parse_and_display_results(final_results):
-    """Parse and display word counts from server results."""
-    all_word_counts = {}
-    for result_str in final_results.values():
-        for line in result_str.split('\n'):
-            line = line.strip()
-            if line:
-                try:
-                    key, count = line.split(':', 1)
-                    all_word_counts[key] = int(count)
-                except ValueError:
-                    pass
-    
-    sorted_words = sorted(all_word_counts.items(), key=lambda item: item[1], reverse=True)
+    """Display final word counts."""
+    sorted_words = sorted(final_results.items(), key=lambda item: item[1], reverse=True)
     for key, count in sorted_words:
         print(f"  {key}: {count}")
 
+def abort_job(registry, job_id, reducers):
+    """Tell the reducers of a failed direct or pipelined job to drop its partitions and refuse later pushes."""
+    request = mapreduce_pb2.AbortJobRequest(job_id=job_id)
+    for address in sorted(set(reducers)):
+        try:
+            response = registry.call(address, 'AbortJob', request, TASK_DEADLINE_SECONDS)
+            print(f"[Abort] {address} dropped {response.num_partitions} partition(s) of job {job_id}")
+        except grpc.RpcError as e:
+            print(f"!!! Error calling AbortJob on {address}: {e.code().name}: {e.details()}")
+
 def run_mapreduce():
     """Main coordinator - orchestrates MapReduce job."""
     start_time = time.perf_counter()
     map_wall = reduce_wall = shuffle_wall = 0.0
+    map_scheduler = reduce_scheduler = pipeline = None
+    open_reducers = None  # Reducers holding partitions of this job until they are finished
+    # One pooled channel per worker for the whole job
+    registry = WorkerRegistry(WORKER_ADDRESSES, GRPC_OPTIONS,
+                              metadata=call_metadata(MAP_FORMAT == 'encoded', GRPC_COMPRESSION),
+                              compression=COMPRESSION_ALGORITHMS.get(GRPC_COMPRESSION))
+    
+    if CLIENT_MODE == 'async':
+        from client import async_client
+        coordinator = async_client.AsyncCoordinator(sys.modules[__name__])
+        map_phase, reduce_phase = coordinator.run_map_phase, coordinator.run_reduce_phase
+        direct_map_phase = coordinator.run_direct_map_phase
+    else:
+        map_phase, reduce_phase, direct_map_phase = run_map_phase, run_reduce_phase, run_direct_map_phase
     
     try:
-        # Read and split input
-        input_data = read_input_file(INPUT_FILE_NAME)
-        chunks = split_input_data(input_data, NUM_WORKERS)
-        print(f"[Setup] Input split into {len(chunks)} chunk(s)")
-        
-        # Map phase
-        intermediate_data, map_wall = run_map_phase(chunks)
+        # Names the job's reduce partitions on the reducers and its result files
+        job_id = uuid.uuid4().hex
+        if SHUFFLE_MODE == 'direct':
+            # Map workers shuffle among themselves; the shuffle is timed as part of the map phase.
+            # Reducers are fixed for the whole job because they hold the partitions until finished
+            reducers = open_reducers = select_workers(registry)
+            pushes = PartitionPushes(NUM_REDUCE_PARTITIONS)
+            with open_input_splitter(INPUT_FILE_NAME) as splitter:
+                print(f"[Setup] Input split into {len(splitter)} chunk(s)")
+                map_wall, map_scheduler = direct_map_phase(registry, splitter, job_id, reducers, pushes)
+            final_results, reduce_wall = run_finish_phase(registry, job_id, reducers, pushes)
+            open_reducers = None
+        elif SHUFFLE_MODE == 'pipelined':
+            # Map results are pushed to the reducers while the map phase runs; the shuffle phase is only what
+            # is left of it afterwards, and FinishPartition tells the reducers that the map side is done
+            reducers = open_reducers = select_workers(registry)
+            with open_input_splitter(INPUT_FILE_NAME) as splitter, \
+                    PipelinedShuffle(sys.modules[__name__], registry, job_id, reducers) as pipeline:
+                print(f"[Setup] Input split into {len(splitter)} chunk(s)")
+                _, map_wall, map_scheduler = map_phase(registry, splitter, pipeline)
+                shuffle_wall = pipeline.drain()
+            final_results, reduce_wall = run_finish_phase(registry, job_id, reducers, pipeline.pushes)
+            open_reducers = None
+        else:
+            # Split input (memory-mapped, chunks are decoded only when sent)
+            with open_input_splitter(INPUT_FILE_NAME) as splitter:
+                print(f"[Setup] Input split into {len(splitter)} chunk(s)")
+                
+                # Map phase
+                intermediate_data, map_wall, map_scheduler = map_phase(registry, splitter)
+            
+            # Reduce phase (the merged sketch is the result in approximate mode)
+            if COUNT_MODE != 'approximate':
+                final_results, reduce_wall, shuffle_wall, reduce_scheduler = reduce_phase(
+                    registry, intermediate_data, job_id)
         
-        # Reduce phase
-        final_results, reduce_wall, shuffle_wall = run_reduce_phase(intermediate_data)
-        
-        # Display results
-        print("\n" + "="*60)
-        print("FINAL WORD COUNTS")
-        print("="*60)
-        parse_and_display_results(final_results)
-        print("="*60)
+        # Display results (only a summary when the reducers wrote result files)
+        if COUNT_MODE == 'approximate':
+            display_sketch_results(merged_sketch(intermediate_data))
+        elif OUTPUT_DIR:
+            report_output_files(job_id)
+        else:
+            final_results = select_top_k(final_results)
+            print("\n" + "="*60)
+            print(f"TOP {TOP_K} WORDS" if TOP_K else "FINAL WORD COUNTS")
+            print("="*60)
+            parse_and_display_results(final_results)
+            print("="*60)
         
     except FileNotFoundError as e:
         print(e)
+    except JobFailedError as e:
+        print(f"\n!!! Job failed: {e}")
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
     finally:
+        # A failed job's partitions (and late pushes for them) would otherwise stay on the reducers
+        if open_reducers:
+            abort_job(registry, job_id, open_reducers)
+        registry.close()
+        
         # Performance summary
         end_time = time.perf_counter()
         total_duration = end_time - start_time
@@ -177,16 +739,84 @@ def run_mapreduce():
         print(f"\n{'='*60}")
         print(f"PERFORMANCE SUMMARY - {NUM_WORKERS} Worker(s)")
         print(f"{'='*60}")
+        print(f"Reduce Partitions:        {NUM_REDUCE_PARTITIONS}")
         print(f"Total Execution Time:     {total_duration:.6f} seconds")
         print(f"  Map Phase:             {map_wall:.6f} seconds")
-        print(f"  Shuffle Phase:         {shuffle_wall:.6f} seconds")
+        if SHUFFLE_MODE == 'direct':
+            print("  Shuffle Phase:         worker-to-worker, within Map Phase")
+        elif SHUFFLE_MODE == 'pipelined':
+            print(f"  Shuffle Phase:         {shuffle_wall:.6f} seconds after the Map Phase (pipelined)")
+        else:
+            print(f"  Shuffle Phase:         {shuffle_wall:.6f} seconds")
         print(f"  Reduce Phase:          {reduce_wall:.6f} seconds")
         print(f"  Other (overhead):      {overhead:.6f} seconds")
+        for line in traffic_summary_lines(registry):
+            print(line)
+        for line in registry.telemetry.summary_lines():
+            print(line)
+        for line in partition_load_stats.summary_lines():
+            print(line)
+        if pipeline:
+            for line in pipeline.summary_lines():
+                print(line)
+        for line in cache_stats.summary_lines():
+            print(line)
+        if map_scheduler:
+            for line in map_scheduler.summary_lines('Map'):
+                print(line)
+        if reduce_scheduler:
+            for line in reduce_scheduler.summary_lines('Reduce'):
+                print(line)
         print(f"{'='*60}\n")
 
 
 if __name__ == '__main__':
-    if not WORKER_ADDRESSES:
+    if MAP_FORMAT not in ('combined', 'encoded', 'legacy'):
+        print(f"ERROR: MAP_FORMAT must be 'combined', 'encoded' or 'legacy', got '{MAP_FORMAT}'.")
+    elif GRPC_COMPRESSION not in COMPRESSION_ALGORITHMS:
+        print(f"ERROR: GRPC_COMPRESSION must be 'none', 'gzip' or 'deflate', got '{GRPC_COMPRESSION}'.")
+    elif SHUFFLE_MODE not in ('client', 'direct', 'pipelined'):
+        print(f"ERROR: SHUFFLE_MODE must be 'client', 'direct' or 'pipelined', got '{SHUFFLE_MODE}'.")
+    elif SHUFFLE_MODE == 'direct' and (MAP_STREAMING or MAP_FORMAT not in COUNTED_FORMATS):
+        print("ERROR: SHUFFLE_MODE=direct requires MAP_FORMAT=combined or encoded without MAP_STREAMING.")
+    elif SHUFFLE_MODE == 'pipelined' and MAP_FORMAT not in COUNTED_FORMATS:
+        print("ERROR: SHUFFLE_MODE=pipelined requires MAP_FORMAT=combined or encoded.")
+    elif MAP_STREAMING and MAP_FORMAT not in COUNTED_FORMATS:
+        print("ERROR: MAP_STREAMING requires MAP_FORMAT=combined or encoded.")
+    elif MAP_CACHE and (MAP_STREAMING or MAP_FORMAT not in COUNTED_FORMATS):
+        print("ERROR: MAP_CACHE requires MAP_FORMAT=combined or encoded without MAP_STREAMING.")
+    elif INPUT_DIR and (MAP_STREAMING or MAP_CACHE):
+        print("ERROR: INPUT_DIR cannot be combined with MAP_STREAMING or MAP_CACHE, which send the chunks' bytes.")
+    elif NUM_CHUNKS < 1 or CHUNK_SIZE < 0:
+        print("ERROR: NUM_CHUNKS must be at least 1 and CHUNK_SIZE must not be negative.")
+    elif NUM_REDUCE_PARTITIONS < 1:
+        print("ERROR: NUM_REDUCE_PARTITIONS must be at least 1.")
+    elif PARTITIONER not in ('hash', 'sampled') or (PARTITIONER == 'sampled' and SHUFFLE_MODE != 'client'):
+        print("ERROR: PARTITIONER must be 'hash' or 'sampled', and PARTITIONER=sampled requires SHUFFLE_MODE=client.")
+    elif PARTITION_SAMPLE_SIZE < 1 or HOT_KEY_FRACTION <= 0:
+        print("ERROR: PARTITION_SAMPLE_SIZE must be at least 1 and HOT_KEY_FRACTION positive.")
+    elif TOP_K < 0:
+        print("ERROR: TOP_K must not be negative.")
+    elif OUTPUT_ORDER not in ('key', 'count') or (OUTPUT_DIR and TOP_K):
+        print("ERROR: OUTPUT_ORDER must be 'key' or 'count', and OUTPUT_DIR cannot be combined with TOP_K.")
+    elif COUNT_MODE not in ('exact', 'approximate'):
+        print(f"ERROR: COUNT_MODE must be 'exact' or 'approximate', got '{COUNT_MODE}'.")
+    elif COUNT_MODE == 'approximate' and (SHUFFLE_MODE != 'client' or MAP_STREAMING or OUTPUT_DIR):
+        print("ERROR: COUNT_MODE=approximate requires SHUFFLE_MODE=client and cannot be combined with MAP_STREAMING "
+              "or OUTPUT_DIR.")
+    elif COUNT_MODE == 'approximate' and not (0 < SKETCH_EPSILON < 1 and 0 < SKETCH_DELTA < 1
+                                              and 4 <= SKETCH_HLL_PRECISION <= 18 and SKETCH_HEAVY_HITTERS >= 1):
+        print("ERROR: SKETCH_EPSILON and SKETCH_DELTA must be between 0 and 1, SKETCH_HLL_PRECISION between 4 and 18 "
+              "and SKETCH_HEAVY_HITTERS at least 1.")
+    elif TASK_MAX_ATTEMPTS < 1 or TASK_DEADLINE_SECONDS <= 0 or TASK_DEADLINE_SECONDS_PER_MB < 0:
+        print("ERROR: TASK_MAX_ATTEMPTS must be at least 1, TASK_DEADLINE_SECONDS positive and "
+              "TASK_DEADLINE_SECONDS_PER_MB not negative.")
+    elif CLIENT_MODE not in ('threads', 'async') or IN_FLIGHT_PER_WORKER < 1:
+        print("ERROR: CLIENT_MODE must be 'threads' or 'async' and IN_FLIGHT_PER_WORKER at least 1.")
+    elif CLIENT_MODE == 'async' and SHUFFLE_MODE == 'direct' and IN_FLIGHT_PER_WORKER > MAX_SHUFFLE_MAP_TASKS:
+        print(f"ERROR: With SHUFFLE_MODE=direct, IN_FLIGHT_PER_WORKER must not exceed MAX_SHUFFLE_MAP_TASKS "
+              f"({MAX_SHUFFLE_MAP_TASKS}, half of the workers' SERVER_THREADS).")
+    elif not WORKER_ADDRESSES:
         print("ERROR: Please define at least one worker address in WORKER_ADDRESSES.")
     else:
         run_mapreduce()
\ No newline at end of file
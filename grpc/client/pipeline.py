@@ -0,0 +1,174 @@
+"""
+Pipelined shuffle for the gRPC coordinator, selected with SHUFFLE_MODE=pipelined.
+
+With the client shuffle, no map result is partitioned before the last map
+task has finished (a global barrier), and the reduce phase only starts
+after that. Here every map result is partitioned as soon as it arrives and
+each of its partitions is pushed with PushPartition to the reducer that
+owns it, from a small pool of push threads, while the other map tasks are
+still running. Reducers add the pushed counts to their partitions as they
+come in (spilling past their memory budget) and ignore a second push from
+the same map task, so a failed push is retried on the same reducer. Once
+the map phase is over and the last pushes are acknowledged, FinishPartition
+tells each reducer that the map side is done and collects its partition.
+
+Every push is timed, so the performance summary can report how much of the
+shuffle ran while map tasks were still in flight.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import grpc
+
+from common.partitioner import PartitionPushes, partition_for_key
+from common.scheduler import JobFailedError
+from proto import mapreduce_pb2
+from proto.codec import iter_fields, pairs_to_encoded
+
+# Concurrent pushes per reducer worker
+PUSHES_PER_REDUCER = 2
+
+
+def busy_seconds(intervals, start=float('-inf'), end=float('inf')):
+    """Return the length of the union of (start, end) intervals, clipped to [start, end]."""
+    total = 0.0
+    current_start = current_end = None
+    for interval_start, interval_end in sorted(intervals):
+        interval_start, interval_end = max(interval_start, start), min(interval_end, end)
+        if interval_end <= interval_start:
+            continue
+        if current_end is None or interval_start > current_end:
+            if current_end is not None:
+                total += current_end - current_start
+            current_start, current_end = interval_start, interval_end
+        else:
+            current_end = max(current_end, interval_end)
+    if current_end is not None:
+        total += current_end - current_start
+    return total
+
+
+class PipelinedShuffle:
+    """Partitions map results as they arrive and pushes them to fixed reducers, configured by the client module."""
+
+    def __init__(self, client, registry, job_id, reducers):
+        self.client = client  # client.client module: configuration and request helpers
+        self.registry = registry
+        self.job_id = job_id
+        self.reducers = reducers
+        self.executor = ThreadPoolExecutor(max_workers=PUSHES_PER_REDUCER * len(set(reducers)))
+        self.futures = []
+        self.lock = threading.Lock()
+        self.intervals = []  # (start, end) of partitioning and pushing each map result
+        self.num_results = self.num_entries = self.num_pushes = self.bytes_pushed = 0
+        self.failed_tasks = set()
+        self.pushes = PartitionPushes(client.NUM_REDUCE_PARTITIONS)  # Acknowledged pushes per partition
+        self.map_start = time.perf_counter()
+        self.map_end = None
+        self.drain_seconds = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Stop the push threads, dropping pushes not started yet (after a failure)."""
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def shuffle(self, task_index, response):
+        """Hand one map result to the push threads (on_result callback of the map phase)."""
+        num_entries = len(response.counts.keys) + len(response.encoded.counts) if response else 0
+        if not num_entries:
+            return
+        with self.lock:
+            self.num_results += 1
+            self.num_entries += num_entries
+            self.futures.append(self.executor.submit(self._push_result, task_index, response))
+
+    def end_map_phase(self, elapsed):
+        """Record the end of the map phase and print it."""
+        self.map_end = time.perf_counter()
+        self.map_start = self.map_end - elapsed
+        print(f"[Map Phase] Complete - Time: {elapsed:.6f}s, Results: {self.num_entries} partial counts "
+              f"from {self.num_results} map result(s), pushed to reducers as they arrived")
+
+    def drain(self):
+        """Wait for the pushes still in flight and return how long that took, raising JobFailedError on failures."""
+        start_time = time.perf_counter()
+        with self.lock:
+            futures = list(self.futures)
+        wait(futures)
+        self.drain_seconds = time.perf_counter() - start_time
+        if self.failed_tasks:
+            raise JobFailedError(self.failed_tasks, self.client.TASK_MAX_ATTEMPTS)
+        print(f"[Shuffle Phase] Complete - {self.num_pushes} push(es) acknowledged, "
+              f"{self.drain_seconds:.6f}s after the map phase")
+        return self.drain_seconds
+
+    def _push_result(self, task_index, response):
+        start_time = time.perf_counter()
+        num_partitions = self.client.NUM_REDUCE_PARTITIONS
+        keys = [[] for _ in range(num_partitions)]
+        counts = [[] for _ in range(num_partitions)]
+        for key, count in iter_fields(response):
+            partition = partition_for_key(key, num_partitions)
+            keys[partition].append(key)
+            counts[partition].append(count)
+        encoded = self.client.MAP_FORMAT == 'encoded'
+        try:
+            for partition in range(num_partitions):
+                if not keys[partition]:
+                    continue
+                # Words are distinct within one map result, so entry i of the vocabulary is word i
+                fields = ({'encoded': pairs_to_encoded(keys[partition], counts[partition])} if encoded
+                          else {'counts': mapreduce_pb2.KeyCounts(keys=keys[partition], counts=counts[partition])})
+                request = mapreduce_pb2.PartitionData(job_id=self.job_id, task_id=task_index, partition=partition,
+                                                      **fields)
+                self._push(self.client.reducer_address(self.reducers, partition), task_index, request)
+        except Exception as error:
+            if not isinstance(error, grpc.RpcError):  # RPC errors were reported by _push
+                self.client.print_task_error('PushPartition', task_index, '', error)
+            with self.lock:
+                self.failed_tasks.add(task_index)
+        finally:
+            with self.lock:
+                self.intervals.append((start_time, time.perf_counter()))
+
+    def _push(self, address, task_index, request):
+        """Push one partition to its reducer, retrying there: only that reducer holds the partition."""
+        client = self.client
+        num_bytes = request.ByteSize()
+        for attempt in range(1, client.TASK_MAX_ATTEMPTS + 1):
+            try:
+                self.registry.call(address, 'PushPartition', request, client.task_deadline(attempt, num_bytes))
+                self.pushes.record(request.partition, num_bytes)
+                with self.lock:
+                    self.num_pushes += 1
+                    self.bytes_pushed += num_bytes
+                return
+            except grpc.RpcError as error:
+                client.print_task_error('PushPartition', task_index, address, error)
+                if attempt == client.TASK_MAX_ATTEMPTS or not client.is_retryable(error):
+                    raise
+                time.sleep(client.RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+
+    def summary_lines(self):
+        """Return performance summary lines with how much of the shuffle overlapped the map phase."""
+        with self.lock:
+            intervals = list(self.intervals)
+        if not intervals or self.map_end is None:
+            return []
+        busy = busy_seconds(intervals)
+        overlapped = busy_seconds(intervals, self.map_start, self.map_end)
+        map_seconds = self.map_end - self.map_start
+        return [
+            f"Pipeline Overlap:         shuffle busy {busy:.6f}s, {overlapped:.6f}s of it "
+            f"({100 * overlapped / busy if busy else 0:.1f}%) while map tasks ran "
+            f"({100 * overlapped / map_seconds if map_seconds else 0:.1f}% of the map phase)",
+            f"  Pushes:                 {self.num_pushes} of {self.num_results} map result(s), "
+            f"{self.bytes_pushed / (1024 * 1024):.2f} MB; {self.drain_seconds:.6f}s left after the map phase",
+        ]
@@ -0,0 +1,184 @@
+"""
+Coordinator-side registry of gRPC workers.
+
+Workers are discovered from, in order of precedence:
+  - WORKER_ADDRESSES: comma-separated host:port list
+  - WORKER_SERVICE: host:port of a headless Service; its DNS name resolves
+    to one address per ready worker pod
+  - the static list worker1:50051 ... worker<NUM_WORKERS>:50051
+
+The registry keeps one channel per worker for the whole job, with
+keepalive pings so idle connections between phases are not dropped, and
+asks every worker's standard grpc.health.v1 Health service whether it is
+serving. Work is routed only to serving workers, least loaded first (fewest
+RPCs in flight from this client, then fastest health check response).
+Every call carries the same metadata and compression, and the serialized
+size of its request and response is added to the per-RPC traffic totals.
+Its round trip is added to the per-worker telemetry totals together with
+the TaskTelemetry the worker returned for it.
+"""
+
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import grpc
+from grpc_health.v1 import health_pb2, health_pb2_grpc
+
+from common.telemetry import TELEMETRY_FIELDS, TelemetryStats
+from proto import mapreduce_pb2, mapreduce_pb2_grpc
+
+# Service name the workers report health for
+SERVICE_NAME = mapreduce_pb2.DESCRIPTOR.services_by_name['MapReduceService'].full_name
+# Client-side keepalive; the workers allow pings this frequent
+KEEPALIVE_OPTIONS = [
+    ('grpc.keepalive_time_ms', 30000),
+    ('grpc.keepalive_timeout_ms', 10000),
+    ('grpc.keepalive_permit_without_calls', 1),
+    ('grpc.http2.max_pings_without_data', 0),
+]
+
+
+def discover_worker_addresses(num_workers, port=50051):
+    """Return the worker addresses from WORKER_ADDRESSES, WORKER_SERVICE DNS, or the static names."""
+    addresses = os.environ.get('WORKER_ADDRESSES', '')
+    if addresses.strip():
+        return [address.strip() for address in addresses.split(',') if address.strip()]
+    service = os.environ.get('WORKER_SERVICE', '')
+    if service:
+        host, _, service_port = service.partition(':')
+        service_port = int(service_port or port)
+        infos = socket.getaddrinfo(host, service_port, type=socket.SOCK_STREAM)
+        ips = sorted({info[4][0] for info in infos})
+        return [f'[{ip}]:{service_port}' if ':' in ip else f'{ip}:{service_port}' for ip in ips]
+    return [f'worker{i+1}:{port}' for i in range(num_workers)]
+
+
+def response_telemetry(response):
+    """Return the TaskTelemetry of a response as {field: value}, or None if the worker sent none."""
+    if 'telemetry' not in response.DESCRIPTOR.fields_by_name or not response.HasField('telemetry'):
+        return None
+    return {field: getattr(response.telemetry, field) for field in TELEMETRY_FIELDS}
+
+
+class WorkerRegistry:
+    """Pooled channels, health state and in-flight load of the known workers."""
+
+    def __init__(self, addresses, options=(), metadata=(), compression=None):
+        self.addresses = list(addresses)
+        self.options = list(options) + KEEPALIVE_OPTIONS
+        self.metadata = tuple(metadata)  # Sent with every call (e.g. counts format, response compression)
+        self.compression = compression   # grpc.Compression of every request, None for the channel default
+        self.traffic = {}      # RPC name -> [request bytes, response bytes], serialized before compression
+        self.channels = {}     # address -> channel, shared by every phase of the job
+        self.stubs = {}        # address -> MapReduceServiceStub
+        self.serving = {}      # address -> True if the last health check said SERVING
+        self.check_time = {}   # address -> seconds the last health check took
+        self.in_flight = {address: 0 for address in self.addresses}
+        self.telemetry = TelemetryStats()  # Per-worker round trips and the workers' task telemetry
+        self.lock = threading.Lock()
+
+    def _channel(self, address):
+        """Return the pooled channel of a worker, opening it on first use (holding the lock)."""
+        channel = self.channels.get(address)
+        if channel is None:
+            channel = self.channels[address] = grpc.insecure_channel(address, options=self.options)
+        return channel
+
+    def channel(self, address):
+        """Return the pooled channel of a worker, opening it on first use."""
+        with self.lock:
+            return self._channel(address)
+
+    def stub(self, address):
+        """Return the MapReduceService stub of a worker."""
+        with self.lock:
+            stub = self.stubs.get(address)
+            if stub is None:
+                stub = self.stubs[address] = mapreduce_pb2_grpc.MapReduceServiceStub(self._channel(address))
+            return stub
+
+    def check(self, address, timeout=2.0):
+        """Run one health check against a worker and return True if it is serving."""
+        stub = health_pb2_grpc.HealthStub(self.channel(address))
+        start = time.perf_counter()
+        try:
+            response = stub.Check(health_pb2.HealthCheckRequest(service=SERVICE_NAME), timeout=timeout)
+            serving = response.status == health_pb2.HealthCheckResponse.SERVING
+        except grpc.RpcError as e:
+            if e.code() == grpc.StatusCode.UNIMPLEMENTED:
+                # A worker without the Health service answered, so it is alive
+                serving = True
+            else:
+                print(f"!!! Health check of {address} failed: {e.code().name}")
+                serving = False
+        with self.lock:
+            self.serving[address] = serving
+            self.check_time[address] = time.perf_counter() - start
+        return serving
+
+    def refresh(self, timeout=2.0):
+        """Health-check every distinct worker concurrently."""
+        unique = list(dict.fromkeys(self.addresses))
+        if not unique:
+            return
+        with ThreadPoolExecutor(max_workers=len(unique)) as executor:
+            list(executor.map(lambda address: self.check(address, timeout), unique))
+
+    def live_workers(self, limit=None):
+        """Return serving worker addresses, least loaded first, at most limit of them."""
+        with self.lock:
+            live = [address for address in self.addresses if self.serving.get(address)]
+            live.sort(key=lambda address: (self.in_flight[address], self.check_time.get(address, 0.0)))
+        return live[:limit] if limit else live
+
+    def add_traffic(self, rpc_name, sent, received):
+        """Add request and response bytes to the traffic totals of an RPC."""
+        with self.lock:
+            totals = self.traffic.setdefault(rpc_name, [0, 0])
+            totals[0] += sent
+            totals[1] += received
+
+    def _count_frames(self, rpc_name, frames):
+        """Yield the frames of a request stream, counting each one as it is sent."""
+        for frame in frames:
+            self.add_traffic(rpc_name, frame.ByteSize(), 0)
+            yield frame
+
+    def count_request(self, rpc_name, request):
+        """Count a request (or wrap a request stream to count its frames) and return it."""
+        if hasattr(request, 'ByteSize'):
+            self.add_traffic(rpc_name, request.ByteSize(), 0)
+            return request
+        return self._count_frames(rpc_name, request)
+
+    def count_response(self, rpc_name, response, address=None, round_trip_seconds=0.0):
+        """Count a response (and, given its worker address, its round trip and telemetry) and return it."""
+        self.add_traffic(rpc_name, 0, response.ByteSize())
+        if address is not None:
+            self.telemetry.record(address, round_trip_seconds, response_telemetry(response))
+        return response
+
+    def call(self, address, rpc_name, request, timeout):
+        """Invoke a unary or stream-request RPC on a worker, counting it as in flight."""
+        with self.lock:
+            self.in_flight[address] += 1
+        try:
+            start = time.perf_counter()
+            response = getattr(self.stub(address), rpc_name)(
+                self.count_request(rpc_name, request), timeout,
+                metadata=self.metadata, compression=self.compression)
+            return self.count_response(rpc_name, response, address, time.perf_counter() - start)
+        finally:
+            with self.lock:
+                self.in_flight[address] -= 1
+
+    def close(self):
+        """Close every pooled channel."""
+        with self.lock:
+            for channel in self.channels.values():
+                channel.close()
+            self.channels.clear()
+            self.stubs.clear()
@@ -11,6 +11,18 @@ from proto.mapreduce_pb2 import (
     MapResponse,
     ReduceRequest,
     ReduceResponse,
+    OutputFile,
+    KeyCounts,
+    EncodedCounts,
+    MapFrame,
+    CombinedMapResponse,
+    CombinedReduceRequest,
+    CombinedReduceResponse,
+    ShuffleMapRequest,
+    ShuffleMapResponse,
+    PartitionData,
+    PushPartitionResponse,
+    FinishPartitionRequest,
 )
 
 from proto.mapreduce_pb2_grpc import (
@@ -19,15 +31,55 @@ from proto.mapreduce_pb2_grpc import (
     add_MapReduceServiceServicer_to_server,
 )
 
+from proto.codec import (
+    counts_to_message,
+    merge_message_into,
+    message_to_counts,
+    counts_to_encoded,
+    pairs_to_encoded,
+    iter_encoded,
+    merge_encoded_into,
+    merge_fields_into,
+    iter_fields,
+    counts_fields,
+    call_metadata,
+    negotiate,
+)
+
 __all__ = [
     # Messages
     'MapRequest',
     'MapResponse',
     'ReduceRequest',
     'ReduceResponse',
+    'OutputFile',
+    'KeyCounts',
+    'EncodedCounts',
+    'MapFrame',
+    'CombinedMapResponse',
+    'CombinedReduceRequest',
+    'CombinedReduceResponse',
+    'ShuffleMapRequest',
+    'ShuffleMapResponse',
+    'PartitionData',
+    'PushPartitionResponse',
+    'FinishPartitionRequest',
     # Service
     'MapReduceServiceStub',
     'MapReduceServiceServicer',
     'add_MapReduceServiceServicer_to_server',
+    # KeyCounts / EncodedCounts helpers
+    'counts_to_message',
+    'merge_message_into',
+    'message_to_counts',
+    'counts_to_encoded',
+    'pairs_to_encoded',
+    'iter_encoded',
+    'merge_encoded_into',
+    'merge_fields_into',
+    'iter_fields',
+    'counts_fields',
+    'call_metadata',
+    'negotiate',
 ]
 
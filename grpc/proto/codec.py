@@ -0,0 +1,117 @@
+"""
+Conversions between counted intermediate messages and plain Python count dictionaries.
+
+Used by both the client and the workers so the counted intermediate format
+is built and parsed the same way on either side of the wire.
+
+Counts travel either as KeyCounts (one string per entry) or, when the
+caller sends COUNTS_FORMAT_KEY: 'encoded' in the call metadata, as
+EncodedCounts: the distinct words once, newline-joined in a single bytes
+field, plus packed varint ids and counts. Words come from tokenize(), which
+splits on whitespace, so they never contain '\\n'. Decoding is one decode()
+and one split() instead of one string object per entry in the parser.
+
+A caller may also ask for a compressed response with COMPRESSION_KEY;
+the worker applies it with context.set_compression().
+"""
+
+import grpc
+
+from proto.mapreduce_pb2 import EncodedCounts, KeyCounts
+
+# Call metadata keys (gRPC metadata keys are lowercase)
+COUNTS_FORMAT_KEY = 'x-counts-format'
+COMPRESSION_KEY = 'x-response-compression'
+# Compression names accepted in GRPC_COMPRESSION and COMPRESSION_KEY
+COMPRESSION_ALGORITHMS = {
+    'none': grpc.Compression.NoCompression,
+    'gzip': grpc.Compression.Gzip,
+    'deflate': grpc.Compression.Deflate,
+}
+
+
+def counts_to_message(counts):
+    """Build a KeyCounts message from a {word: count} mapping."""
+    return KeyCounts(keys=list(counts.keys()), counts=list(counts.values()))
+
+
+def merge_message_into(counts, message):
+    """Add the (possibly repeated) entries of a KeyCounts message into counts."""
+    for key, count in zip(message.keys, message.counts):
+        counts[key] = counts.get(key, 0) + count
+    return counts
+
+
+def message_to_counts(message):
+    """Aggregate a KeyCounts message into a new {word: count} dictionary."""
+    return merge_message_into({}, message)
+
+
+def counts_to_encoded(counts):
+    """Build an EncodedCounts message from a {word: count} mapping (unique words, no ids)."""
+    return EncodedCounts(vocabulary='\n'.join(counts).encode('utf-8'), counts=list(counts.values()))
+
+
+def pairs_to_encoded(keys, counts):
+    """Build an EncodedCounts message from parallel lists in which words may repeat."""
+    vocabulary = {}
+    ids = [vocabulary.setdefault(key, len(vocabulary)) for key in keys]
+    if len(vocabulary) == len(keys):
+        ids = []  # Every word is distinct, so entry i is word i
+    return EncodedCounts(vocabulary='\n'.join(vocabulary).encode('utf-8'), ids=ids, counts=counts)
+
+
+def iter_encoded(message):
+    """Yield the (word, count) entries of an EncodedCounts message."""
+    if not message.counts:
+        return iter(())
+    vocabulary = message.vocabulary.decode('utf-8').split('\n')
+    words = map(vocabulary.__getitem__, message.ids) if message.ids else vocabulary
+    return zip(words, message.counts)
+
+
+def merge_encoded_into(counts, message):
+    """Add the (possibly repeated) entries of an EncodedCounts message into counts."""
+    for key, count in iter_encoded(message):
+        counts[key] = counts.get(key, 0) + count
+    return counts
+
+
+def merge_fields_into(counts, message):
+    """Add both the counts (KeyCounts) and encoded (EncodedCounts) fields of a message into counts."""
+    merge_message_into(counts, message.counts)
+    return merge_encoded_into(counts, message.encoded)
+
+
+def iter_fields(message):
+    """Yield the (word, count) entries of both the counts and encoded fields of a message."""
+    yield from zip(message.counts.keys, message.counts.counts)
+    yield from iter_encoded(message.encoded)
+
+
+def counts_fields(counts, encoded):
+    """Return the keyword arguments that set a message's counts, encoded if asked for."""
+    if encoded:
+        return {'encoded': counts_to_encoded(counts)}
+    return {'counts': counts_to_message(counts)}
+
+
+def call_metadata(encoded=False, compression='none'):
+    """Return the call metadata asking a worker for encoded counts and a compressed response."""
+    metadata = []
+    if encoded:
+        metadata.append((COUNTS_FORMAT_KEY, 'encoded'))
+    if compression != 'none':
+        metadata.append((COMPRESSION_KEY, compression))
+    return tuple(metadata)
+
+
+def negotiate(context):
+    """Apply the response compression a call asked for and return (encoded, compression name)."""
+    metadata = dict(context.invocation_metadata())
+    compression = metadata.get(COMPRESSION_KEY, 'none')
+    if compression not in COMPRESSION_ALGORITHMS:
+        compression = 'none'
+    if compression != 'none':
+        context.set_compression(COMPRESSION_ALGORITHMS[compression])
+    return metadata.get(COUNTS_FORMAT_KEY) == 'encoded', compression
@@ -21,7 +21,10 @@ _runtime_version.ValidateProtobufRuntimeVersion(
 
 _sym_db = _symbol_database.Default()
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0fmapreduce.proto\" \n\nMapRequest\x12\x12\n\ninput_data\x18\x01 \x01(\t\"\x1d\n\x0bMapResponse\x12\x0e\n\x06mapped\x18\x01 \x03(\t\"$\n\rReduceRequest\x12\x13\n\x0bmapped_data\x18\x01 \x03(\t\" \n\x0eReduceResponse\x12\x0e\n\x06result\x18\x01 \x01(\t2g\n\x10MapReduceService\x12$\n\x07MapTask\x12\x0b.MapRequest\x1a\x0c.MapResponse\x12-\n\nReduceTask\x12\x0e.ReduceRequest\x1a\x0f.ReduceResponseb\x06proto3')
+
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0fmapreduce.proto\"g\n\nMapRequest\x12\x12\n\ninput_data\x18\x01 \x01(\t\x12\x0e\n\x06\x64igest\x18\x02 \x01(\t\x12\x13\n\x0b\x63\x61\x63he_probe\x18\x03 \x01(\x08\x12 \n\x0binput_range\x18\x04 \x01(\x0b\x32\x0b.InputRange\"@\n\nInputRange\x12\x12\n\ninput_file\x18\x01 \x01(\t\x12\x0e\n\x06offset\x18\x02 \x01(\x03\x12\x0e\n\x06length\x18\x03 \x01(\x03\"@\n\x0bMapResponse\x12\x0e\n\x06mapped\x18\x01 \x03(\t\x12!\n\ttelemetry\x18\x02 \x01(\x0b\x32\x0e.TaskTelemetry\"_\n\rReduceRequest\x12\x13\n\x0bmapped_data\x18\x01 \x03(\t\x12\r\n\x05top_k\x18\x02 \x01(\x05\x12\x13\n\x0boutput_file\x18\x03 \x01(\t\x12\x15\n\rsort_by_count\x18\x04 \x01(\x08\"e\n\x0eReduceResponse\x12\x0e\n\x06result\x18\x01 \x01(\t\x12 \n\x0boutput_file\x18\x02 \x01(\x0b\x32\x0b.OutputFile\x12!\n\ttelemetry\x18\x03 \x01(\x0b\x32\x0e.TaskTelemetry\"?\n\nOutputFile\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\x10\n\x08num_keys\x18\x02 \x01(\x03\x12\x11\n\tnum_words\x18\x03 \x01(\x03\"\xfb\x01\n\rTaskTelemetry\x12\x15\n\rqueue_seconds\x18\x01 \x01(\x01\x12\x17\n\x0f\x63ompute_seconds\x18\x02 \x01(\x01\x12\x19\n\x11serialize_seconds\x18\x03 \x01(\x01\x12\x17\n\x0fshuffle_seconds\x18\x04 \x01(\x01\x12\x15\n\rtotal_seconds\x18\x05 \x01(\x01\x12\x10\n\x08items_in\x18\x06 \x01(\x03\x12\x11\n\titems_out\x18\x07 \x01(\x03\x12\x10\n\x08\x62ytes_in\x18\x08 \x01(\x03\x12\x11\n\tbytes_out\x18\t \x01(\x03\x12\x0e\n\x06spills\x18\n \x01(\x03\x12\x15\n\rspilled_bytes\x18\x0b \x01(\x03\")\n\tKeyCounts\x12\x0c\n\x04keys\x18\x01 \x03(\t\x12\x0e\n\x06\x63ounts\x18\x02 \x03(\x03\"@\n\rEncodedCounts\x12\x12\n\nvocabulary\x18\x01 \x01(\x0c\x12\x0b\n\x03ids\x18\x02 \x03(\r\x12\x0e\n\x06\x63ounts\x18\x03 \x03(\x03\"\x18\n\x08MapFrame\x12\x0c\n\x04\x64\x61ta\x18\x01 \x01(\x0c\"\x89\x01\n\x13\x43ombinedMapResponse\x12\x1a\n\x06\x63ounts\x18\x01 \x01(\x0b\x32\n.KeyCounts\x12\x1f\n\x07\x65ncoded\x18\x02 \x01(\x0b\x32\x0e.EncodedCounts\x12\x12\n\ncache_miss\x18\x03 \x01(\x08\x12!\n\ttelemetry\x18\x04 \x01(\x0b\x32\x0e.TaskTelemetry\"\x8f\x01\n\x15\x43ombinedReduceRequest\x12\x1a\n\x06\x63ounts\x18\x01 \x01(\x0b\x32\n.KeyCounts\x12\x1f\n\x07\x65ncoded\x18\x02 \x01(\x0b\x32\x0e.EncodedCounts\x12\r\n\x05top_k\x18\x03 \x01(\x05\x12\x13\n\x0boutput_file\x18\x04 \x01(\t\x12\x15\n\rsort_by_count\x18\x05 \x01(\x08\"\x9a\x01\n\x16\x43ombinedReduceResponse\x12\x1a\n\x06\x63ounts\x18\x01 \x01(\x0b\x32\n.KeyCounts\x12\x1f\n\x07\x65ncoded\x18\x02 \x01(\x0b\x32\x0e.EncodedCounts\x12 \n\x0boutput_file\x18\x03 \x01(\x0b\x32\x0b.OutputFile\x12!\n\ttelemetry\x18\x04 \x01(\x0b\x32\x0e.TaskTelemetry\"\xaa\x01\n\x11ShuffleMapRequest\x12\x0e\n\x06job_id\x18\x01 \x01(\t\x12\x0f\n\x07task_id\x18\x02 \x01(\x05\x12\x12\n\ninput_data\x18\x03 \x01(\t\x12\x19\n\x11reducer_addresses\x18\x04 \x03(\t\x12\x0e\n\x06\x64igest\x18\x05 \x01(\t\x12\x13\n\x0b\x63\x61\x63he_probe\x18\x06 \x01(\x08\x12 \n\x0binput_range\x18\x07 \x01(\x0b\x32\x0b.InputRange\"\xae\x01\n\x12ShuffleMapResponse\x12\x11\n\tnum_words\x18\x01 \x01(\x03\x12\x18\n\x10num_unique_words\x18\x02 \x01(\x03\x12\x14\n\x0c\x62ytes_pushed\x18\x03 \x01(\x03\x12\x12\n\ncache_miss\x18\x04 \x01(\x08\x12!\n\ttelemetry\x18\x05 \x01(\x0b\x32\x0e.TaskTelemetry\x12\x1e\n\x06pushes\x18\x06 \x03(\x0b\x32\x0e.PartitionPush\"1\n\rPartitionPush\x12\x11\n\tpartition\x18\x01 \x01(\x05\x12\r\n\x05\x62ytes\x18\x02 \x01(\x03\"\x80\x01\n\rPartitionData\x12\x0e\n\x06job_id\x18\x01 \x01(\t\x12\x0f\n\x07task_id\x18\x02 \x01(\x05\x12\x11\n\tpartition\x18\x03 \x01(\x05\x12\x1a\n\x06\x63ounts\x18\x04 \x01(\x0b\x32\n.KeyCounts\x12\x1f\n\x07\x65ncoded\x18\x05 \x01(\x0b\x32\x0e.EncodedCounts\"*\n\x15PushPartitionResponse\x12\x11\n\tduplicate\x18\x01 \x01(\x08\"\x8d\x01\n\x16\x46inishPartitionRequest\x12\x0e\n\x06job_id\x18\x01 \x01(\t\x12\x11\n\tpartition\x18\x02 \x01(\x05\x12\r\n\x05top_k\x18\x03 \x01(\x05\x12\x13\n\x0boutput_file\x18\x04 \x01(\t\x12\x15\n\rsort_by_count\x18\x05 \x01(\x08\x12\x15\n\rnum_map_tasks\x18\x06 \x01(\x05\"!\n\x0f\x41\x62ortJobRequest\x12\x0e\n\x06job_id\x18\x01 \x01(\t\"*\n\x10\x41\x62ortJobResponse\x12\x16\n\x0enum_partitions\x18\x01 \x01(\x05\"\xb5\x01\n\x10SketchMapRequest\x12\x12\n\ninput_data\x18\x01 \x01(\t\x12\r\n\x05width\x18\x02 \x01(\r\x12\r\n\x05\x64\x65pth\x18\x03 \x01(\r\x12\x11\n\tprecision\x18\x04 \x01(\r\x12\x15\n\rheavy_hitters\x18\x05 \x01(\r\x12\x0e\n\x06\x64igest\x18\x06 \x01(\t\x12\x13\n\x0b\x63\x61\x63he_probe\x18\x07 \x01(\x08\x12 \n\x0binput_range\x18\x08 \x01(\x0b\x32\x0b.InputRange\"Z\n\x11SketchMapResponse\x12\x0e\n\x06sketch\x18\x01 \x01(\x0c\x12\x12\n\ncache_miss\x18\x02 \x01(\x08\x12!\n\ttelemetry\x18\x03 \x01(\x0b\x32\x0e.TaskTelemetry2\xba\x04\n\x10MapReduceService\x12$\n\x07MapTask\x12\x0b.MapRequest\x1a\x0c.MapResponse\x12-\n\nReduceTask\x12\x0e.ReduceRequest\x1a\x0f.ReduceResponse\x12\x34\n\x0f\x43ombinedMapTask\x12\x0b.MapRequest\x1a\x14.CombinedMapResponse\x12\x45\n\x12\x43ombinedReduceTask\x12\x16.CombinedReduceRequest\x1a\x17.CombinedReduceResponse\x12\x32\n\rStreamMapTask\x12\t.MapFrame\x1a\x14.CombinedMapResponse(\x01\x12\x39\n\x0eShuffleMapTask\x12\x12.ShuffleMapRequest\x1a\x13.ShuffleMapResponse\x12\x37\n\rPushPartition\x12\x0e.PartitionData\x1a\x16.PushPartitionResponse\x12\x43\n\x0f\x46inishPartition\x12\x17.FinishPartitionRequest\x1a\x17.CombinedReduceResponse\x12/\n\x08\x41\x62ortJob\x12\x10.AbortJobRequest\x1a\x11.AbortJobResponse\x12\x36\n\rSketchMapTask\x12\x11.SketchMapRequest\x1a\x12.SketchMapResponseb\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -29,13 +32,51 @@ _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'mapreduce_pb2', _globals)
 if not _descriptor._USE_C_DESCRIPTORS:
   DESCRIPTOR._loaded_options = None
   _globals['_MAPREQUEST']._serialized_start=19
-  _globals['_MAPREQUEST']._serialized_end=51
-  _globals['_MAPRESPONSE']._serialized_start=53
-  _globals['_MAPRESPONSE']._serialized_end=82
-  _globals['_REDUCEREQUEST']._serialized_start=84
-  _globals['_REDUCEREQUEST']._serialized_end=120
-  _globals['_REDUCERESPONSE']._serialized_start=122
-  _globals['_REDUCERESPONSE']._serialized_end=154
-  _globals['_MAPREDUCESERVICE']._serialized_start=156
-  _globals['_MAPREDUCESERVICE']._serialized_end=259
+  _globals['_MAPREQUEST']._serialized_end=122
+  _globals['_INPUTRANGE']._serialized_start=124
+  _globals['_INPUTRANGE']._serialized_end=188
+  _globals['_MAPRESPONSE']._serialized_start=190
+  _globals['_MAPRESPONSE']._serialized_end=254
+  _globals['_REDUCEREQUEST']._serialized_start=256
+  _globals['_REDUCEREQUEST']._serialized_end=351
+  _globals['_REDUCERESPONSE']._serialized_start=353
+  _globals['_REDUCERESPONSE']._serialized_end=454
+  _globals['_OUTPUTFILE']._serialized_start=456
+  _globals['_OUTPUTFILE']._serialized_end=519
+  _globals['_TASKTELEMETRY']._serialized_start=522
+  _globals['_TASKTELEMETRY']._serialized_end=773
+  _globals['_KEYCOUNTS']._serialized_start=775
+  _globals['_KEYCOUNTS']._serialized_end=816
+  _globals['_ENCODEDCOUNTS']._serialized_start=818
+  _globals['_ENCODEDCOUNTS']._serialized_end=882
+  _globals['_MAPFRAME']._serialized_start=884
+  _globals['_MAPFRAME']._serialized_end=908
+  _globals['_COMBINEDMAPRESPONSE']._serialized_start=911
+  _globals['_COMBINEDMAPRESPONSE']._serialized_end=1048
+  _globals['_COMBINEDREDUCEREQUEST']._serialized_start=1051
+  _globals['_COMBINEDREDUCEREQUEST']._serialized_end=1194
+  _globals['_COMBINEDREDUCERESPONSE']._serialized_start=1197
+  _globals['_COMBINEDREDUCERESPONSE']._serialized_end=1351
+  _globals['_SHUFFLEMAPREQUEST']._serialized_start=1354
+  _globals['_SHUFFLEMAPREQUEST']._serialized_end=1524
+  _globals['_SHUFFLEMAPRESPONSE']._serialized_start=1527
+  _globals['_SHUFFLEMAPRESPONSE']._serialized_end=1701
+  _globals['_PARTITIONPUSH']._serialized_start=1703
+  _globals['_PARTITIONPUSH']._serialized_end=1752
+  _globals['_PARTITIONDATA']._serialized_start=1755
+  _globals['_PARTITIONDATA']._serialized_end=1883
+  _globals['_PUSHPARTITIONRESPONSE']._serialized_start=1885
+  _globals['_PUSHPARTITIONRESPONSE']._serialized_end=1927
+  _globals['_FINISHPARTITIONREQUEST']._serialized_start=1930
+  _globals['_FINISHPARTITIONREQUEST']._serialized_end=2071
+  _globals['_ABORTJOBREQUEST']._serialized_start=2073
+  _globals['_ABORTJOBREQUEST']._serialized_end=2106
+  _globals['_ABORTJOBRESPONSE']._serialized_start=2108
+  _globals['_ABORTJOBRESPONSE']._serialized_end=2150
+  _globals['_SKETCHMAPREQUEST']._serialized_start=2153
+  _globals['_SKETCHMAPREQUEST']._serialized_end=2334
+  _globals['_SKETCHMAPRESPONSE']._serialized_start=2336
+  _globals['_SKETCHMAPRESPONSE']._serialized_end=2426
+  _globals['_MAPREDUCESERVICE']._serialized_start=2429
+  _globals['_MAPREDUCESERVICE']._serialized_end=2999
 # @@protoc_insertion_point(module_scope)
@@ -26,7 +26,10 @@ if _version_not_supported:
 
 
 class MapReduceServiceStub(object):
-    """Missing associated documentation comment in .proto file."""
+    """MapReduce Service Definition
+    This service defines the Map and Reduce operations for the word count application
+
+    """
 
     def __init__(self, channel):
         """Constructor.
@@ -44,19 +47,128 @@ class MapReduceServiceStub(object):
                 request_serializer=mapreduce__pb2.ReduceRequest.SerializeToString,
                 response_deserializer=mapreduce__pb2.ReduceResponse.FromString,
                 _registered_method=True)
+        self.CombinedMapTask = channel.unary_unary(
+                '/MapReduceService/CombinedMapTask',
+                request_serializer=mapreduce__pb2.MapRequest.SerializeToString,
+                response_deserializer=mapreduce__pb2.CombinedMapResponse.FromString,
+                _registered_method=True)
+        self.CombinedReduceTask = channel.unary_unary(
+                '/MapReduceService/CombinedReduceTask',
+                request_serializer=mapreduce__pb2.CombinedReduceRequest.SerializeToString,
+                response_deserializer=mapreduce__pb2.CombinedReduceResponse.FromString,
+                _registered_method=True)
+        self.StreamMapTask = channel.stream_unary(
+                '/MapReduceService/StreamMapTask',
+                request_serializer=mapreduce__pb2.MapFrame.SerializeToString,
+                response_deserializer=mapreduce__pb2.CombinedMapResponse.FromString,
+                _registered_method=True)
+        self.ShuffleMapTask = channel.unary_unary(
+                '/MapReduceService/ShuffleMapTask',
+                request_serializer=mapreduce__pb2.ShuffleMapRequest.SerializeToString,
+                response_deserializer=mapreduce__pb2.ShuffleMapResponse.FromString,
+                _registered_method=True)
+        self.PushPartition = channel.unary_unary(
+                '/MapReduceService/PushPartition',
+                request_serializer=mapreduce__pb2.PartitionData.SerializeToString,
+                response_deserializer=mapreduce__pb2.PushPartitionResponse.FromString,
+                _registered_method=True)
+        self.FinishPartition = channel.unary_unary(
+                '/MapReduceService/FinishPartition',
+                request_serializer=mapreduce__pb2.FinishPartitionRequest.SerializeToString,
+                response_deserializer=mapreduce__pb2.CombinedReduceResponse.FromString,
+                _registered_method=True)
+        self.AbortJob = channel.unary_unary(
+                '/MapReduceService/AbortJob',
+                request_serializer=mapreduce__pb2.AbortJobRequest.SerializeToString,
+                response_deserializer=mapreduce__pb2.AbortJobResponse.FromString,
+                _registered_method=True)
+        self.SketchMapTask = channel.unary_unary(
+                '/MapReduceService/SketchMapTask',
+                request_serializer=mapreduce__pb2.SketchMapRequest.SerializeToString,
+                response_deserializer=mapreduce__pb2.SketchMapResponse.FromString,
+                _registered_method=True)
 
 
 class MapReduceServiceServicer(object):
-    """Missing associated documentation comment in .proto file."""
+    """MapReduce Service Definition
+    This service defines the Map and Reduce operations for the word count application
+
+    """
 
     def MapTask(self, request, context):
-        """Missing associated documentation comment in .proto file."""
+        """MapTask processes a chunk of input text and emits (word:1) pairs
+        """
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
     def ReduceTask(self, request, context):
-        """Missing associated documentation comment in .proto file."""
+        """ReduceTask aggregates values for each key and produces final counts
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def CombinedMapTask(self, request, context):
+        """CombinedMapTask processes a chunk of input text and emits per-word counts
+        (map-side combiner), instead of one "word:1" string per token. With a
+        digest it can also answer from, and fill, the worker's map result cache
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def CombinedReduceTask(self, request, context):
+        """CombinedReduceTask aggregates partial counts and produces final counts
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def StreamMapTask(self, request_iterator, context):
+        """StreamMapTask receives a chunk of input as a stream of bounded frames and
+        emits per-word counts, so no single message has to hold the whole chunk
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ShuffleMapTask(self, request, context):
+        """ShuffleMapTask maps a chunk, hash-partitions the counts and pushes each
+        partition straight to the worker that reduces it (worker-to-worker shuffle)
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def PushPartition(self, request, context):
+        """PushPartition receives one map task's partial counts for a reduce partition
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def FinishPartition(self, request, context):
+        """FinishPartition returns the final counts of a reduce partition and drops its state
+        (NOT_FOUND if the reducer lost pushes the coordinator saw acknowledged); later
+        pushes for the partition are refused (FAILED_PRECONDITION)
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def AbortJob(self, request, context):
+        """AbortJob drops every partition a reducer holds for a failed job and makes it
+        refuse later pushes for the job (FAILED_PRECONDITION)
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def SketchMapTask(self, request, context):
+        """SketchMapTask counts a chunk into a fixed-size mergeable sketch (approximate
+        mode): the coordinator merges the sketches and no reduce phase runs
+        """
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
@@ -74,6 +186,46 @@ def add_MapReduceServiceServicer_to_server(servicer, server):
                     request_deserializer=mapreduce__pb2.ReduceRequest.FromString,
                     response_serializer=mapreduce__pb2.ReduceResponse.SerializeToString,
             ),
+            'CombinedMapTask': grpc.unary_unary_rpc_method_handler(
+                    servicer.CombinedMapTask,
+                    request_deserializer=mapreduce__pb2.MapRequest.FromString,
+                    response_serializer=mapreduce__pb2.CombinedMapResponse.SerializeToString,
+            ),
+            'CombinedReduceTask': grpc.unary_unary_rpc_method_handler(
+                    servicer.CombinedReduceTask,
+                    request_deserializer=mapreduce__pb2.CombinedReduceRequest.FromString,
+                    response_serializer=mapreduce__pb2.CombinedReduceResponse.SerializeToString,
+            ),
+            'StreamMapTask': grpc.stream_unary_rpc_method_handler(
+                    servicer.StreamMapTask,
+                    request_deserializer=mapreduce__pb2.MapFrame.FromString,
+                    response_serializer=mapreduce__pb2.CombinedMapResponse.SerializeToString,
+            ),
+            'ShuffleMapTask': grpc.unary_unary_rpc_method_handler(
+                    servicer.ShuffleMapTask,
+                    request_deserializer=mapreduce__pb2.ShuffleMapRequest.FromString,
+                    response_serializer=mapreduce__pb2.ShuffleMapResponse.SerializeToString,
+            ),
+            'PushPartition': grpc.unary_unary_rpc_method_handler(
+                    servicer.PushPartition,
+                    request_deserializer=mapreduce__pb2.PartitionData.FromString,
+                    response_serializer=mapreduce__pb2.PushPartitionResponse.SerializeToString,
+            ),
+            'FinishPartition': grpc.unary_unary_rpc_method_handler(
+                    servicer.FinishPartition,
+                    request_deserializer=mapreduce__pb2.FinishPartitionRequest.FromString,
+                    response_serializer=mapreduce__pb2.CombinedReduceResponse.SerializeToString,
+            ),
+            'AbortJob': grpc.unary_unary_rpc_method_handler(
+                    servicer.AbortJob,
+                    request_deserializer=mapreduce__pb2.AbortJobRequest.FromString,
+                    response_serializer=mapreduce__pb2.AbortJobResponse.SerializeToString,
+            ),
+            'SketchMapTask': grpc.unary_unary_rpc_method_handler(
+                    servicer.SketchMapTask,
+                    request_deserializer=mapreduce__pb2.SketchMapRequest.FromString,
+                    response_serializer=mapreduce__pb2.SketchMapResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'MapReduceService', rpc_method_handlers)
@@ -83,7 +235,10 @@ def add_MapReduceServiceServicer_to_server(servicer, server):
 
  # This class is part of an EXPERIMENTAL API.
 class MapReduceService(object):
-    """Missing associated documentation comment in .proto file."""
+    """MapReduce Service Definition
+    This service defines the Map and Reduce operations for the word count application
+
+    """
 
     @staticmethod
     def MapTask(request,
@@ -138,3 +293,219 @@ class MapReduceService(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def CombinedMapTask(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/MapReduceService/CombinedMapTask',
+            mapreduce__pb2.MapRequest.SerializeToString,
+            mapreduce__pb2.CombinedMapResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def CombinedReduceTask(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/MapReduceService/CombinedReduceTask',
+            mapreduce__pb2.CombinedReduceRequest.SerializeToString,
+            mapreduce__pb2.CombinedReduceResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def StreamMapTask(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_unary(
+            request_iterator,
+            target,
+            '/MapReduceService/StreamMapTask',
+            mapreduce__pb2.MapFrame.SerializeToString,
+            mapreduce__pb2.CombinedMapResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def ShuffleMapTask(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/MapReduceService/ShuffleMapTask',
+            mapreduce__pb2.ShuffleMapRequest.SerializeToString,
+            mapreduce__pb2.ShuffleMapResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def PushPartition(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/MapReduceService/PushPartition',
+            mapreduce__pb2.PartitionData.SerializeToString,
+            mapreduce__pb2.PushPartitionResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def FinishPartition(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/MapReduceService/FinishPartition',
+            mapreduce__pb2.FinishPartitionRequest.SerializeToString,
+            mapreduce__pb2.CombinedReduceResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def AbortJob(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/MapReduceService/AbortJob',
+            mapreduce__pb2.AbortJobRequest.SerializeToString,
+            mapreduce__pb2.AbortJobResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def SketchMapTask(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/MapReduceService/SketchMapTask',
+            mapreduce__pb2.SketchMapRequest.SerializeToString,
+            mapreduce__pb2.SketchMapResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
@@ -1,87 +1,625 @@
+import collections
+import functools
 import os
 import grpc
+import signal
+import threading
 import time
-from concurrent import futures
+from grpc_health.v1 import health, health_pb2, health_pb2_grpc
 from proto import mapreduce_pb2, mapreduce_pb2_grpc
+from proto.codec import COMPRESSION_ALGORITHMS, counts_fields, iter_fields, negotiate
+from common.mapcache import MapResultCache, verify_digest
+from common.multicore import MapProcessPool
+from common.partitioner import partition_counts
+from common.resultfiles import resolve_output_file, write_partition_file
+from common.sketches import WordSketch
+from common.spill import SpillingCounter
+from common.splitter import read_word_range, resolve_input_file
+from common.telemetry import QueueTimingExecutor, WorkerMetrics, start_metrics_server
+from common.tokenizer import count_words, tokenize
 
 # Configuration
 WORKER_ID = int(os.environ.get('WORKER_ID', 1))
-PORT = 50051
+PORT = int(os.environ.get('PORT', '50051'))
+# Increase gRPC max message size to 50 MB (server and worker-to-worker channels)
+GRPC_OPTIONS = [
+    ('grpc.max_send_message_length', 50 * 1024 * 1024),
+    ('grpc.max_receive_message_length', 50 * 1024 * 1024)
+]
+# Accept the keepalive pings the coordinator sends on its pooled channels
+SERVER_KEEPALIVE_OPTIONS = [
+    ('grpc.keepalive_permit_without_calls', 1),
+    ('grpc.http2.min_recv_ping_interval_without_data_ms', 10000),
+]
+# Threads serving RPCs (at least 2). At most half of them run ShuffleMapTasks at once and further ones are refused
+# with RESOURCE_EXHAUSTED: a ShuffleMapTask waits on PushPartition calls that need free threads on the reducers,
+# so map tasks must never fill every worker's pool
+SERVER_THREADS = int(os.environ.get('SERVER_THREADS', '10'))
+MAX_SHUFFLE_MAP_TASKS = max(1, SERVER_THREADS // 2)
+# Deadline of a PushPartition call: PUSH_DEADLINE_SECONDS plus PUSH_DEADLINE_SECONDS_PER_MB for every MB pushed,
+# and never past the ShuffleMapTask's own deadline
+PUSH_DEADLINE_SECONDS = float(os.environ.get('PUSH_DEADLINE_SECONDS', '10'))
+PUSH_DEADLINE_SECONDS_PER_MB = float(os.environ.get('PUSH_DEADLINE_SECONDS_PER_MB', '2'))
+# Seconds in-flight calls get to finish after SIGTERM (health reports NOT_SERVING meanwhile)
+SHUTDOWN_GRACE_SECONDS = float(os.environ.get('SHUTDOWN_GRACE_SECONDS', '5'))
+# Processes used to count large map inputs (default: the container's CPU quota, 1 disables)
+MAP_PROCESSES = int(os.environ.get('MAP_PROCESSES', '0'))
+# Inputs shorter than this many characters are counted in the request thread
+MAP_PARALLEL_MIN_CHARS = int(os.environ.get('MAP_PARALLEL_MIN_CHARS', str(1_000_000)))
+# Map result cache: counts of up to MAP_CACHE_BYTES of encoded results in memory, and (if MAP_CACHE_DIR is set)
+# up to MAP_CACHE_DIR_BYTES more in that local directory, kept across restarts. 0 bytes disables it
+MAP_CACHE_BYTES = int(os.environ.get('MAP_CACHE_BYTES', str(64 * 1024 * 1024)))
+MAP_CACHE_DIR = os.environ.get('MAP_CACHE_DIR', '')
+MAP_CACHE_DIR_BYTES = int(os.environ.get('MAP_CACHE_DIR_BYTES', str(1024 * 1024 * 1024)))
+# Port of the Prometheus metrics endpoint (GET /metrics over plain HTTP), 0 disables it
+METRICS_PORT = int(os.environ.get('METRICS_PORT', '8000'))
+# Directory reducers write result files to when a reduce call names one (shared with the client)
+OUTPUT_DIR = os.environ.get('OUTPUT_DIR', '')
+# Directory map tasks read input files from when they carry a byte range instead of text (shared with the client)
+INPUT_DIR = os.environ.get('INPUT_DIR', '')
+# Estimated memory one reduce task (or direct-shuffle partition) may aggregate in before it spills
+# sorted runs to SPILL_DIR (default: the system temporary directory) and merges them; 0 never spills
+REDUCE_MEMORY_BYTES = int(os.environ.get('REDUCE_MEMORY_BYTES', str(256 * 1024 * 1024)))
+SPILL_DIR = os.environ.get('SPILL_DIR', '')
+# Direct-shuffle partitions that no push or FinishPartition touched for this long are dropped, in case
+# their coordinator died before finishing or aborting the job; 0 keeps them until then
+PARTITION_TTL_SECONDS = float(os.environ.get('PARTITION_TTL_SECONDS', '3600'))
+# Finished or dropped partitions and aborted jobs remembered, so late pushes for them are refused
+CLOSED_PARTITIONS_REMEMBERED = int(os.environ.get('CLOSED_PARTITIONS_REMEMBERED', '100000'))
+# ASCII bytes that str.split() treats as whitespace; a multi-byte UTF-8
+# character never contains them, so cutting after one is always safe
+WHITESPACE_BYTES = (b' ', b'\t', b'\n', b'\r', b'\x0b', b'\x0c', b'\x1c', b'\x1d', b'\x1e', b'\x1f')
+
+
+def iter_frame_text(frames):
+    """Join streamed byte frames into decoded text segments that end on whitespace.
+
+    Bytes after the last whitespace of a frame (a partial word or a partial
+    UTF-8 character) are carried into the next frame, so no word is split
+    and memory stays bounded by the frame size plus the longest word.
+    """
+    carry = b""
+    for frame in frames:
+        data = carry + frame.data if carry else frame.data
+        cut = max(data.rfind(ws) for ws in WHITESPACE_BYTES) + 1
+        if cut:
+            yield data[:cut].decode('utf-8', errors='replace')
+        carry = data[cut:]
+    if carry:
+        yield carry.decode('utf-8', errors='replace')
+
+
+def push_deadline(num_bytes, context):
+    """Return the deadline of a PushPartition call sending num_bytes on behalf of the call context serves."""
+    deadline = PUSH_DEADLINE_SECONDS + PUSH_DEADLINE_SECONDS_PER_MB * num_bytes / (1024 * 1024)
+    remaining = context.time_remaining()
+    return min(deadline, remaining) if remaining is not None else deadline
+
+
+def timed_task(method):
+    """Run a servicer method with a TaskTimer of its RPC (passed as timer) and report the timer.
+
+    The method laps 'compute' (and 'shuffle') itself; building the response
+    after the last lap is counted as serialize. The telemetry is returned in
+    the response (if it has a telemetry field) and added to the worker's metrics.
+    """
+    @functools.wraps(method)
+    def wrapper(self, request, context):
+        with self.metrics.task(method.__name__) as timer:
+            response = method(self, request, context, timer)
+            timer.lap('serialize')
+            if hasattr(request, 'ByteSize'):
+                timer.bytes_in = request.ByteSize()
+            timer.bytes_out = response.ByteSize()
+            if 'telemetry' in response.DESCRIPTOR.fields_by_name:
+                response.telemetry.CopyFrom(mapreduce_pb2.TaskTelemetry(**timer.finish()))
+            return response
+    return wrapper
+
+
+class PartitionState:
+    """Partial counts received for one reduce partition of a job."""
+    
+    def __init__(self):
+        self.counts = SpillingCounter(REDUCE_MEMORY_BYTES, SPILL_DIR)
+        self.task_ids = set()  # Map tasks already merged, so a re-sent push is not counted twice
+        self.closed = False  # Set once the counts were handed over by FinishPartition or dropped
+        self.touched = time.monotonic()  # Last push or FinishPartition, for PARTITION_TTL_SECONDS
+        self.lock = threading.Lock()
+    
+    def close(self):
+        """Drop the counts; pushes that were waiting for the lock are refused."""
+        with self.lock:
+            self.closed = True
+            self.counts.close()
+
 
 class MapReduceServicer(mapreduce_pb2_grpc.MapReduceServiceServicer):
     """MapReduce worker service - handles Map and Reduce tasks."""
     
-    def __init__(self):
+    def __init__(self, map_pool=None, map_cache=None, metrics=None):
         self.worker_id = WORKER_ID
+        self.map_pool = map_pool or MapProcessPool(count_words, processes=1)
+        self.map_cache = map_cache or MapResultCache(0)
+        self.metrics = metrics or WorkerMetrics(WORKER_ID)
+        self.partitions = {}  # (job_id, partition) -> PartitionState
+        self.closed_partitions = collections.OrderedDict()  # (job_id, partition) -> None, oldest first
+        self.aborted_jobs = collections.OrderedDict()  # job_id -> None, oldest first
+        self.partitions_lock = threading.Lock()
+        self.peer_stubs = {}  # Reducer address -> stub, reused across ShuffleMapTasks
+        self.peer_stubs_lock = threading.Lock()
+        self.shuffle_map_slots = threading.BoundedSemaphore(MAX_SHUFFLE_MAP_TASKS)
+    
+    def _peer_stub(self, address):
+        """Return a cached stub for another worker."""
+        with self.peer_stubs_lock:
+            stub = self.peer_stubs.get(address)
+            if stub is None:
+                channel = grpc.insecure_channel(address, options=GRPC_OPTIONS)
+                stub = self.peer_stubs[address] = mapreduce_pb2_grpc.MapReduceServiceStub(channel)
+            return stub
+    
+    def _partition_state(self, job_id, partition, context):
+        """Return the state of a reduce partition, creating it on first use, or abort if it was closed."""
+        key = (job_id, partition)
+        expired = []
+        with self.partitions_lock:
+            closed = job_id in self.aborted_jobs or key in self.closed_partitions
+            state = self.partitions.get(key)
+            if state is None and not closed:
+                if PARTITION_TTL_SECONDS:
+                    now = time.monotonic()
+                    expired = self._pop_partitions([other for other, other_state in self.partitions.items()
+                                                    if now - other_state.touched > PARTITION_TTL_SECONDS])
+                state = self.partitions[key] = PartitionState()
+        for expired_state in expired:
+            expired_state.close()
+        if expired:
+            print(f"Worker {self.worker_id} dropped {len(expired)} partition(s) idle for "
+                  f"more than {PARTITION_TTL_SECONDS}s")
+        if closed:
+            self._abort_closed(job_id, partition, context)
+        return state
+    
+    def _pop_partitions(self, keys):
+        """Remove partitions (holding partitions_lock), remember them as closed and return their states."""
+        for key in keys:
+            self.closed_partitions[key] = None
+        while len(self.closed_partitions) > CLOSED_PARTITIONS_REMEMBERED:
+            self.closed_partitions.popitem(last=False)
+        return [self.partitions.pop(key) for key in keys if key in self.partitions]
+    
+    def _abort_closed(self, job_id, partition, context):
+        """Refuse a push for a partition that was finished or dropped, or for an aborted job."""
+        context.abort(grpc.StatusCode.FAILED_PRECONDITION, f"Worker {self.worker_id} already closed partition "
+                                                           f"{partition} of job {job_id}")
     
-    def _tokenize_text(self, text):
-        """Tokenize text: split by whitespace and filter alphanumeric characters."""
-        text = text.lower()
-        words = [''.join(filter(str.isalnum, word)) for word in text.split()]
-        return [word for word in words if word]
+    def _output_path(self, request, context):
+        """Return the path of the result file a reduce request names, aborting the call if it cannot be written."""
+        if not OUTPUT_DIR:
+            context.abort(grpc.StatusCode.FAILED_PRECONDITION, f"Worker {self.worker_id} has no OUTPUT_DIR")
+        try:
+            return resolve_output_file(OUTPUT_DIR, request.output_file)
+        except ValueError as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
     
-    def MapTask(self, request, context):
+    def _write_output(self, request, path, counts):
+        """Write a reduce result to its sorted result file and return the OutputFile message."""
+        num_keys, num_words = write_partition_file(path, counts, request.sort_by_count)
+        print(f"Worker {self.worker_id} wrote {num_keys} keys to {path}")
+        return mapreduce_pb2.OutputFile(name=request.output_file, num_keys=num_keys, num_words=num_words)
+    
+    def _cached_counts(self, request, context):
+        """Return the cached counts of a cache probe's digest, or None on a miss."""
+        try:
+            counts = self.map_cache.get(request.digest)
+        except ValueError as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        outcome = f"hit, {len(counts)} unique words" if counts is not None else "miss"
+        print(f"Worker {self.worker_id} map cache {outcome} ({self.map_cache.summary()})")
+        return counts
+    
+    def _input_text(self, request, context):
+        """Return a map request's input text: input_data, or the words of its input_range read from INPUT_DIR."""
+        if not request.HasField('input_range'):
+            return request.input_data or ""
+        if not INPUT_DIR:
+            context.abort(grpc.StatusCode.FAILED_PRECONDITION, f"Worker {self.worker_id} has no INPUT_DIR")
+        input_range = request.input_range
+        try:
+            path = resolve_input_file(INPUT_DIR, input_range.input_file)
+            return read_word_range(path, input_range.offset, input_range.length)
+        except ValueError as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        except OSError as e:
+            # Possibly only this worker's mount: another worker may still read it
+            context.abort(grpc.StatusCode.FAILED_PRECONDITION, f"Worker {self.worker_id} cannot read input: {e}")
+    
+    def _count_input(self, request, context, input_text):
+        """Count the words of a map request's input text, caching the counts if it carries a digest."""
+        if request.digest:
+            try:
+                verify_digest(request.digest, input_text.encode('utf-8'))
+            except ValueError as e:
+                context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        counts = self.map_pool.count(input_text)
+        if request.digest:
+            self.map_cache.put(request.digest, counts)
+        return counts
+    
+    @timed_task
+    def MapTask(self, request, context, timer):
         """Map phase: tokenize input text and emit (word:1) pairs."""
         start_time = time.perf_counter()
         
-        input_text = request.input_data or ""
+        input_text = self._input_text(request, context)
+        negotiate(context)  # Response compression only: legacy pairs have no encoded form
         print(f"Worker {self.worker_id} received MapTask: '{(input_text[:30])}...'")
         
         # Process: Tokenize and emit key-value pairs
-        words = self._tokenize_text(input_text)
+        words = tokenize(input_text)
         intermediate_results = [f"{word}:1" for word in words]
+        timer.lap('compute')
+        timer.items_in = timer.items_out = len(intermediate_results)
         
         elapsed = time.perf_counter() - start_time
         print(f"Worker {self.worker_id} MapTask completed: {len(intermediate_results)} pairs in {elapsed:.6f}s")
         
         return mapreduce_pb2.MapResponse(mapped=intermediate_results)
     
-    def ReduceTask(self, request, context):
+    @timed_task
+    def ReduceTask(self, request, context, timer):
         """Reduce phase: aggregate values for each key."""
         start_time = time.perf_counter()
         
+        negotiate(context)  # Response compression only: legacy pairs have no encoded form
         print(f"Worker {self.worker_id} received ReduceTask")
         
-        # Process: Aggregate counts for each key
-        counts = {}
-        for item in request.mapped_data:
-            try:
-                key, value_str = item.split(':', 1)
-                counts[key] = counts.get(key, 0) + int(value_str)
-            except ValueError:
-                print(f"Warning: Skipping invalid pair: {item}")
+        # Process: Aggregate counts for each key (spilling sorted runs to disk past the memory budget)
+        def parsed_pairs():
+            for item in request.mapped_data:
+                try:
+                    key, value_str = item.split(':', 1)
+                    yield key, int(value_str)
+                except ValueError:
+                    print(f"Warning: Skipping invalid pair: {item}")
         
-        # Format: Create sorted output string
-        sorted_results = [f"{key}:{count}" for key, count in sorted(counts.items())]
+        with SpillingCounter(REDUCE_MEMORY_BYTES, SPILL_DIR) as counts:
+            counts.add_pairs(parsed_pairs())
+            timer.lap('compute')
+            timer.items_in = len(request.mapped_data)
+            
+            if request.output_file:
+                output_file = self._write_output(request, self._output_path(request, context), counts)
+                timer.record_spills(counts)
+                timer.items_out = output_file.num_keys
+                return mapreduce_pb2.ReduceResponse(output_file=output_file)
+            
+            # Format: Create sorted output string (only the top words by count in top-K mode)
+            items = counts.top_k(request.top_k) if request.top_k else counts.items()
+            sorted_results = [f"{key}:{count}" for key, count in items]
+            timer.record_spills(counts)
         result = "\n".join(sorted_results)
+        timer.items_out = len(sorted_results)
         
         elapsed = time.perf_counter() - start_time
         print(f"Worker {self.worker_id} ReduceTask completed: {len(sorted_results)} keys in {elapsed:.6f}s")
         
         return mapreduce_pb2.ReduceResponse(result=result)
+    
+    @timed_task
+    def CombinedMapTask(self, request, context, timer):
+        """Map phase with combiner: tokenize input text and emit per-word counts."""
+        start_time = time.perf_counter()
+        
+        input_text = self._input_text(request, context)
+        encoded, _ = negotiate(context)
+        if request.cache_probe:
+            counts = self._cached_counts(request, context)
+            timer.lap('compute')
+            if counts is None:
+                return mapreduce_pb2.CombinedMapResponse(cache_miss=True)
+            timer.items_in, timer.items_out = sum(counts.values()), len(counts)
+            return mapreduce_pb2.CombinedMapResponse(**counts_fields(counts, encoded))
+        print(f"Worker {self.worker_id} received CombinedMapTask: '{(input_text[:30])}...'")
+        
+        # Process: Tokenize and pre-aggregate counts for this chunk (on several cores if large)
+        counts = self._count_input(request, context, input_text)
+        timer.lap('compute')
+        timer.items_in, timer.items_out = sum(counts.values()), len(counts)
+        
+        elapsed = time.perf_counter() - start_time
+        print(f"Worker {self.worker_id} CombinedMapTask completed: {len(counts)} unique words in {elapsed:.6f}s")
+        
+        return mapreduce_pb2.CombinedMapResponse(**counts_fields(counts, encoded))
+    
+    @timed_task
+    def StreamMapTask(self, request_iterator, context, timer):
+        """Map phase over a stream of input frames: emit per-word counts for the whole stream."""
+        start_time = time.perf_counter()
+        
+        encoded, _ = negotiate(context)
+        print(f"Worker {self.worker_id} received StreamMapTask")
+        
+        # Process: Tokenize each whitespace-aligned segment as it arrives (spread over the map processes)
+        def counted_frames():
+            for frame in request_iterator:
+                timer.bytes_in += frame.ByteSize()
+                yield frame
+        
+        counts = self.map_pool.count_segments(iter_frame_text(counted_frames()))
+        timer.lap('compute')
+        timer.items_in, timer.items_out = sum(counts.values()), len(counts)
+        
+        elapsed = time.perf_counter() - start_time
+        print(f"Worker {self.worker_id} StreamMapTask completed: {len(counts)} unique words in {elapsed:.6f}s")
+        
+        return mapreduce_pb2.CombinedMapResponse(**counts_fields(counts, encoded))
+    
+    @timed_task
+    def CombinedReduceTask(self, request, context, timer):
+        """Reduce phase with counted input: sum partial counts for each key."""
+        start_time = time.perf_counter()
+        
+        encoded, _ = negotiate(context)
+        print(f"Worker {self.worker_id} received CombinedReduceTask")
+        
+        # Process: Aggregate partial counts (plain and dictionary-encoded) and sort by key
+        # (or keep only the local top K candidates, best first), spilling past the memory budget
+        with SpillingCounter(REDUCE_MEMORY_BYTES, SPILL_DIR) as counts:
+            counts.add_pairs(iter_fields(request))
+            timer.lap('compute')
+            timer.items_in = len(request.counts.keys) + len(request.encoded.counts)
+            if request.output_file:
+                output_file = self._write_output(request, self._output_path(request, context), counts)
+                timer.record_spills(counts)
+                timer.items_out = output_file.num_keys
+                return mapreduce_pb2.CombinedReduceResponse(output_file=output_file)
+            sorted_counts = dict(counts.top_k(request.top_k) if request.top_k else counts.items())
+            timer.record_spills(counts)
+        timer.lap('compute')
+        timer.items_out = len(sorted_counts)
+        
+        elapsed = time.perf_counter() - start_time
+        print(f"Worker {self.worker_id} CombinedReduceTask completed: {len(sorted_counts)} keys in {elapsed:.6f}s")
+        
+        return mapreduce_pb2.CombinedReduceResponse(**counts_fields(sorted_counts, encoded))
+    
+    @timed_task
+    def ShuffleMapTask(self, request, context, timer):
+        """Map phase with direct shuffle: count a chunk and push each partition to its reducer."""
+        # Refuse rather than wait for a slot: a waiting handler would hold a server thread too
+        if not self.shuffle_map_slots.acquire(blocking=False):
+            context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED,
+                          f"Worker {self.worker_id} is already running {MAX_SHUFFLE_MAP_TASKS} ShuffleMapTasks")
+        try:
+            return self._shuffle_map(request, context, timer)
+        finally:
+            self.shuffle_map_slots.release()
+    
+    def _shuffle_map(self, request, context, timer):
+        start_time = time.perf_counter()
+        
+        input_text = self._input_text(request, context)
+        # Push partitions in the format and compression the coordinator asked for
+        encoded, compression = negotiate(context)
+        print(f"Worker {self.worker_id} received ShuffleMapTask {request.task_id} of job {request.job_id}")
+        
+        # Process: Count words (or take a cache probe's cached counts), then hash-partition them over the reducers
+        if request.cache_probe:
+            counts = self._cached_counts(request, context)
+            if counts is None:
+                timer.lap('compute')
+                return mapreduce_pb2.ShuffleMapResponse(cache_miss=True)
+        else:
+            counts = self._count_input(request, context, input_text)
+        partitions = partition_counts(counts, len(request.reducer_addresses))
+        timer.lap('compute')
+        timer.items_in, timer.items_out = sum(counts.values()), len(counts)
+        
+        # Shuffle: Push every non-empty partition to the worker that reduces it, in parallel
+        pushes = []
+        pushed = []
+        bytes_pushed = 0
+        for partition, part in enumerate(partitions):
+            if part:
+                stub = self._peer_stub(request.reducer_addresses[partition])
+                push_request = mapreduce_pb2.PartitionData(
+                    job_id=request.job_id,
+                    task_id=request.task_id,
+                    partition=partition,
+                    **counts_fields(part, encoded),
+                )
+                num_bytes = push_request.ByteSize()
+                bytes_pushed += num_bytes
+                pushed.append(mapreduce_pb2.PartitionPush(partition=partition, bytes=num_bytes))
+                pushes.append(stub.PushPartition.future(push_request, timeout=push_deadline(num_bytes, context),
+                                                        compression=COMPRESSION_ALGORITHMS[compression]))
+        for push in pushes:
+            push.result()  # Re-raises a failed push, failing this map task
+        timer.lap('shuffle')
+        
+        elapsed = time.perf_counter() - start_time
+        print(f"Worker {self.worker_id} ShuffleMapTask completed: {len(counts)} unique words "
+              f"pushed to {len(pushes)} partition(s) in {elapsed:.6f}s")
+        
+        return mapreduce_pb2.ShuffleMapResponse(num_words=sum(counts.values()), num_unique_words=len(counts),
+                                                bytes_pushed=bytes_pushed, pushes=pushed)
+    
+    @timed_task
+    def PushPartition(self, request, context, timer):
+        """Shuffle phase: merge one map task's partial counts into a reduce partition."""
+        state = self._partition_state(request.job_id, request.partition, context)
+        with state.lock:
+            if state.closed:
+                self._abort_closed(request.job_id, request.partition, context)
+            state.touched = time.monotonic()
+            if request.task_id in state.task_ids:
+                return mapreduce_pb2.PushPartitionResponse(duplicate=True)
+            state.task_ids.add(request.task_id)
+            state.counts.add_pairs(iter_fields(request))
+        timer.lap('compute')
+        timer.items_in = len(request.counts.keys) + len(request.encoded.counts)
+        return mapreduce_pb2.PushPartitionResponse(duplicate=False)
+    
+    @timed_task
+    def FinishPartition(self, request, context, timer):
+        """Reduce phase: return the final counts of a partition (or its top_k words) and drop it.
+        
+        The partition is dropped only once its response is built and the call
+        is still live, so a call that runs past its deadline (e.g. merging a
+        large spilled partition) leaves it in place for the coordinator's retry.
+        Once it is dropped, later pushes for it are refused.
+        """
+        start_time = time.perf_counter()
+        encoded, _ = negotiate(context)
+        
+        # Check the output file before the partition is handed over
+        path = self._output_path(request, context) if request.output_file else None
+        key = (request.job_id, request.partition)
+        with self.partitions_lock:
+            aborted = request.job_id in self.aborted_jobs
+            closed = key in self.closed_partitions
+            state = self.partitions.get(key)
+        if aborted:
+            context.abort(grpc.StatusCode.FAILED_PRECONDITION, f"Job {request.job_id} was aborted on "
+                                                               f"worker {self.worker_id}")
+        if closed:
+            context.abort(grpc.StatusCode.NOT_FOUND, f"Worker {self.worker_id} already closed partition "
+                                                     f"{request.partition} of job {request.job_id}")
+        if state is None and request.num_map_tasks:
+            context.abort(grpc.StatusCode.NOT_FOUND, f"Worker {self.worker_id} has no partition {request.partition} "
+                                                     f"of job {request.job_id}")
+        state = state or PartitionState()
+        with state.lock:
+            if state.closed:
+                context.abort(grpc.StatusCode.NOT_FOUND, f"Worker {self.worker_id} already closed partition "
+                                                         f"{request.partition} of job {request.job_id}")
+            state.touched = time.monotonic()
+            if len(state.task_ids) < request.num_map_tasks:
+                context.abort(grpc.StatusCode.NOT_FOUND,
+                              f"Worker {self.worker_id} holds pushes from {len(state.task_ids)} of "
+                              f"{request.num_map_tasks} map task(s) for partition {request.partition}")
+            if path:
+                output_file = self._write_output(request, path, state.counts)
+                timer.items_in = timer.items_out = output_file.num_keys
+                response = mapreduce_pb2.CombinedReduceResponse(output_file=output_file)
+            else:
+                items = state.counts.top_k(request.top_k) if request.top_k else state.counts.items()
+                sorted_counts = dict(items)
+                timer.lap('compute')
+                timer.items_out = len(sorted_counts)
+                if not request.top_k:
+                    timer.items_in = len(sorted_counts)
+                response = mapreduce_pb2.CombinedReduceResponse(**counts_fields(sorted_counts, encoded))
+            timer.record_spills(state.counts)
+            if not context.is_active():
+                context.abort(grpc.StatusCode.DEADLINE_EXCEEDED, f"Worker {self.worker_id} kept partition "
+                                                                 f"{request.partition} for a retry")
+            # Hand the partition over
+            state.closed = True
+            state.counts.close()
+        with self.partitions_lock:
+            self._pop_partitions([key])
+        
+        elapsed = time.perf_counter() - start_time
+        print(f"Worker {self.worker_id} FinishPartition {request.partition} of job {request.job_id}: "
+              f"{timer.items_out} keys from {len(state.task_ids)} map task(s) in {elapsed:.6f}s")
+        
+        return response
+
+    
+    @timed_task
+    def AbortJob(self, request, context, timer):
+        """Drop every partition of a failed job and refuse later pushes for it."""
+        with self.partitions_lock:
+            self.aborted_jobs[request.job_id] = None
+            while len(self.aborted_jobs) > CLOSED_PARTITIONS_REMEMBERED:
+                self.aborted_jobs.popitem(last=False)
+            states = self._pop_partitions([key for key in self.partitions if key[0] == request.job_id])
+        for state in states:
+            state.close()
+        timer.items_in = len(states)
+        print(f"Worker {self.worker_id} AbortJob {request.job_id}: dropped {len(states)} partition(s)")
+        return mapreduce_pb2.AbortJobResponse(num_partitions=len(states))
+    
+    @timed_task
+    def SketchMapTask(self, request, context, timer):
+        """Approximate map phase: count a chunk into a fixed-size sketch the coordinator merges."""
+        start_time = time.perf_counter()
+        
+        try:
+            sketch = WordSketch(request.width, request.depth, request.precision, request.heavy_hitters)
+        except ValueError as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        if request.cache_probe:
+            counts = self._cached_counts(request, context)
+            if counts is None:
+                timer.lap('compute')
+                return mapreduce_pb2.SketchMapResponse(cache_miss=True)
+            sketch.add_counts(counts)
+        else:
+            input_text = self._input_text(request, context)
+            print(f"Worker {self.worker_id} received SketchMapTask: '{(input_text[:30])}...'")
+            if request.digest:
+                # The cache needs the chunk's exact counts
+                sketch.add_counts(self._count_input(request, context, input_text))
+            else:
+                # Process: Stream the words into the sketch, whose size does not depend on the vocabulary
+                sketch.add_text(input_text)
+        timer.lap('compute')
+        timer.items_in, timer.items_out = sketch.total, len(sketch.heavy_hitters)
+        
+        elapsed = time.perf_counter() - start_time
+        print(f"Worker {self.worker_id} SketchMapTask completed: {sketch.total} words "
+              f"sketched in {elapsed:.6f}s")
+        
+        return mapreduce_pb2.SketchMapResponse(sketch=sketch.to_bytes())
 
 
 def serve():
     """Start the gRPC server with increased max message size."""
-    # Increase gRPC max message size to 50 MB
-    server_options = [
-        ('grpc.max_send_message_length', 50 * 1024 * 1024),
-        ('grpc.max_receive_message_length', 50 * 1024 * 1024)
-    ]
-
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10), options=server_options)
-    servicer = MapReduceServicer()
+    # Create the map process pool before any gRPC threads exist
+    map_pool = MapProcessPool(count_words, processes=MAP_PROCESSES or None, min_chars=MAP_PARALLEL_MIN_CHARS)
+    print(f"Worker {WORKER_ID} using {map_pool.processes} map process(es)")
+
+    # The executor timestamps every submitted call, so handlers can report their queue wait
+    server = grpc.server(QueueTimingExecutor(max_workers=SERVER_THREADS),
+                         options=GRPC_OPTIONS + SERVER_KEEPALIVE_OPTIONS)
+    map_cache = MapResultCache(MAP_CACHE_BYTES, MAP_CACHE_DIR, MAP_CACHE_DIR_BYTES)
+    print(f"Worker {WORKER_ID} map cache: {map_cache.summary()}")
+    metrics = WorkerMetrics(WORKER_ID)
+    servicer = MapReduceServicer(map_pool, map_cache, metrics)
     mapreduce_pb2_grpc.add_MapReduceServiceServicer_to_server(servicer, server)
     
+    # Standard gRPC health service, used by the coordinator to route work to live workers
+    health_servicer = health.HealthServicer()
+    health_pb2_grpc.add_HealthServicer_to_server(health_servicer, server)
+    service_name = mapreduce_pb2.DESCRIPTOR.services_by_name['MapReduceService'].full_name
+    for name in ('', service_name):
+        health_servicer.set(name, health_pb2.HealthCheckResponse.SERVING)
+    
     server.add_insecure_port(f'[::]:{PORT}')
     server.start()
     print(f"MapReduce Worker {WORKER_ID} running on port {PORT}...")
+    if METRICS_PORT:
+        try:
+            start_metrics_server(metrics, METRICS_PORT)
+            print(f"Worker {WORKER_ID} serving Prometheus metrics on port {METRICS_PORT} (/metrics)")
+        except OSError as e:
+            print(f"!!! Worker {WORKER_ID} cannot serve metrics on port {METRICS_PORT}: {e}")
 
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
     try:
-        while True:
-            time.sleep(86400)
+        stop_event.wait()
     except KeyboardInterrupt:
-        server.stop(0)
+        pass
+    # Stop receiving new work, then let in-flight calls finish
+    print(f"Worker {WORKER_ID} shutting down...")
+    health_servicer.enter_graceful_shutdown()
+    server.stop(SHUTDOWN_GRACE_SECONDS).wait()
+    map_pool.shutdown()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,143 @@
+"""
+asyncio (aiohttp) coordinator for the REST stack, selected with CLIENT_MODE=async.
+
+Runs the same map and reduce phases as the threaded coordinator in
+client.py, with its configuration, payload formats, shuffle and retries,
+but keeps up to IN_FLIGHT_PER_WORKER requests in flight per worker from a
+single thread instead of one blocking request per worker thread. Each
+phase uses one aiohttp session whose connection pool is bounded to the
+same number of connections per worker.
+"""
+
+import asyncio
+import time
+
+import aiohttp
+
+from common.async_scheduler import AsyncTaskScheduler
+
+
+class AsyncCoordinator:
+    """Map and reduce phases over aiohttp, configured by the client module."""
+
+    def __init__(self, client):
+        self.client = client  # client.client module: configuration and payload helpers
+
+    def new_session(self):
+        """Create a keep-alive session with IN_FLIGHT_PER_WORKER connections per worker."""
+        connector = aiohttp.TCPConnector(limit=0, limit_per_host=self.client.IN_FLIGHT_PER_WORKER)
+        return aiohttp.ClientSession(connector=connector)
+
+    def new_scheduler(self):
+        """Create an async scheduler over the configured workers."""
+        return AsyncTaskScheduler(self.client.NUM_WORKERS, in_flight_per_worker=self.client.IN_FLIGHT_PER_WORKER,
+                                  max_attempts=self.client.TASK_MAX_ATTEMPTS,
+                                  retry_backoff=self.client.RETRY_BACKOFF_SECONDS, retryable=is_retryable)
+
+    async def post_counts(self, session, url, body, content_type, timeout, extra_headers=None):
+        """POST a payload and return the {word: count} response, raising on HTTP errors."""
+        body, headers = self.client.prepare_request(body, content_type)
+        if extra_headers:
+            headers.update(extra_headers)
+        start = time.perf_counter()
+        async with session.post(url, data=body, headers=headers,
+                                timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            response.raise_for_status()
+            # aiohttp has already undone any Content-Encoding
+            content = await response.read()
+            self.client.record_telemetry(url, time.perf_counter() - start, response.headers)
+            return self.client.decode_counts_response(response.headers.get('Content-Type', ''), content)
+
+    async def get_cached_counts(self, session, url, timeout):
+        """GET a chunk's cached {word: count} from /map/<digest>, or None if the worker has not cached it."""
+        start = time.perf_counter()
+        async with session.get(url, headers=self.client.accept_headers(),
+                               timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            if response.status == 404:
+                self.client.record_telemetry(url, time.perf_counter() - start, response.headers)
+                return None
+            response.raise_for_status()
+            content = await response.read()
+            self.client.record_telemetry(url, time.perf_counter() - start, response.headers)
+            return self.client.decode_counts_response(response.headers.get('Content-Type', ''), content)
+
+    async def map_phase(self, chunks):
+        """Send every chunk to /map (/sketch) and return the per-chunk counts (merged sketch) and the scheduler."""
+        client = self.client
+        all_intermediate_data = []
+
+        def collect(task_index, response):
+            client.collect_map_response(all_intermediate_data, response)
+
+        async with self.new_session() as session:
+            async def send_map_chunk(worker_index, chunk, attempt):
+                url = client.map_url(worker_index)
+                if not client.MAP_CACHE:
+                    return await self.post_counts(session, url, *client.encode_map_request(chunk),
+                                                  client.task_deadline(attempt))
+                digest = client.chunk_digest(chunk)
+                counts = await self.get_cached_counts(session, client.map_url(worker_index, digest),
+                                                      client.task_deadline(attempt))
+                if client.record_cache_probe(chunk, counts):
+                    return counts
+                return await self.post_counts(session, url, *client.encode_map_request(chunk),
+                                              client.task_deadline(attempt), {client.DIGEST_HEADER: digest})
+
+            scheduler = self.new_scheduler()
+            await scheduler.run(chunks, send_map_chunk, on_result=collect,
+                                on_error=client.task_error_reporter('MapTask'),
+                                affinity=client.cache_affinity(client.WORKER_ADDRESSES) if client.MAP_CACHE else None)
+        return all_intermediate_data, scheduler
+
+    async def reduce_phase(self, worker_data, job_id):
+        """Send every reduce task to /reduce and return the merged counts and the scheduler."""
+        client = self.client
+        final_results = {}
+
+        def collect(task_index, response):
+            if response:
+                client.collect_reduce_response(final_results, response)
+
+        async with self.new_session() as session:
+            async def send_reduce_request(worker_index, task, attempt):
+                task_index, data = task
+                url = client.reduce_url(worker_index, job_id, task_index)
+                return await self.post_counts(session, url, *client.encode_reduce_request(*data),
+                                              client.task_deadline(attempt))
+
+            scheduler = self.new_scheduler()
+            await scheduler.run(list(enumerate(worker_data)), send_reduce_request, on_result=collect,
+                                on_error=client.task_error_reporter('ReduceTask'))
+        return final_results, scheduler
+
+    def run_map_phase(self, chunks):
+        """Execute Map phase with many requests in flight per worker."""
+        print(f"\n[Map Phase] Starting {len(chunks)} task(s) on {self.client.NUM_WORKERS} worker(s), "
+              f"up to {self.client.IN_FLIGHT_PER_WORKER} in flight each...")
+        start_time = time.perf_counter()
+        all_intermediate_data, scheduler = asyncio.run(self.map_phase(chunks))
+        elapsed = time.perf_counter() - start_time
+        print(f"[Map Phase] Complete - Time: {elapsed:.6f}s, {self.client.map_results_summary(all_intermediate_data)}")
+        return all_intermediate_data, elapsed, scheduler
+
+    def run_reduce_phase(self, intermediate_data, job_id):
+        """Execute Reduce phase - shuffle data and send it to the workers asynchronously."""
+        shuffle_start = time.perf_counter()
+        worker_data, num_unique_keys = self.client.shuffle_intermediate_data(intermediate_data)
+        shuffle_elapsed = time.perf_counter() - shuffle_start
+        print(f"[Shuffle Phase] Complete - Time: {shuffle_elapsed:.6f}s, Unique keys: {num_unique_keys}")
+
+        print(f"[Reduce Phase] Starting {len(worker_data)} task(s) on {self.client.NUM_WORKERS} worker(s)...")
+        reduce_start = time.perf_counter()
+        final_results, scheduler = asyncio.run(self.reduce_phase(worker_data, job_id))
+        reduce_elapsed = time.perf_counter() - reduce_start
+        print(f"[Reduce Phase] Complete - Time: {reduce_elapsed:.6f}s, "
+              f"Results: {self.client.num_result_keys(final_results)} keys")
+        return final_results, reduce_elapsed, shuffle_elapsed, scheduler
+
+
+def is_retryable(error):
+    """Return True if another attempt of a failed task may succeed."""
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status >= 500
+    return isinstance(error, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
@@ -1,121 +1,444 @@
+import gzip
+import json
 import os
+import sys
 import time
-from collections import defaultdict
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import uuid
+from urllib.parse import urlencode, urlsplit
 import requests
+from requests.adapters import HTTPAdapter
+from common.kvcodec import COLUMNAR_MEDIA_TYPE, MEDIA_TYPE, decode_counts, encode_columnar
+from common.mapcache import DIGEST_HEADER, MapCacheStats, cache_affinity, chunk_digest
+from common.partitioner import SPLIT, PartitionLoadStats, PartitionPlan, sample_stride
+from common.resultfiles import MERGED_FILE_NAME, merge_partition_files, partition_file_name, resolve_output_file
+from common.scheduler import JobFailedError, TaskScheduler
+from common.sketches import MEDIA_TYPE as SKETCH_MEDIA_TYPE, WordSketch, error_summary_lines, sketch_parameters
+from common.spill import SpillingGroups, SpillStats
+from common.splitter import InputSplitter
+from common.telemetry import TELEMETRY_HEADER, TelemetryStats, parse_telemetry_header
+from common.topk import top_k_items
 
 # Configuration
 NUM_WORKERS = int(os.environ.get('NUM_WORKERS', '2'))
-WORKER_ADDRESSES = [f"http://worker{i+1}:5000" for i in range(NUM_WORKERS)]
-INPUT_FILE_NAME = "testfile.txt"
+# Workers: WORKER_ADDRESSES (comma-separated base URLs, the first NUM_WORKERS are used) or http://worker1..N:5000
+WORKER_ADDRESSES = ([address.strip() for address in os.environ.get('WORKER_ADDRESSES', '').split(',') if address.strip()]
+                    or [f"http://worker{i+1}:5000" for i in range(NUM_WORKERS)])[:NUM_WORKERS]
+INPUT_FILE_NAME = os.environ.get('INPUT_FILE', 'testfile.txt')
+# Input splitting: NUM_CHUNKS chunks, or chunks of about CHUNK_SIZE bytes if set. Many more
+# tasks than workers (TASKS_PER_WORKER each) let fast workers pull more of them from the queue
+TASKS_PER_WORKER = int(os.environ.get('TASKS_PER_WORKER', '4'))
+NUM_CHUNKS = int(os.environ.get('NUM_CHUNKS', str(NUM_WORKERS * TASKS_PER_WORKER)))
+CHUNK_SIZE = int(os.environ.get('CHUNK_SIZE', '0'))
+# Speculative execution: back up map tasks running longer than SPECULATIVE_FACTOR x the median latency
+SPECULATIVE_EXECUTION = os.environ.get('SPECULATIVE_EXECUTION', 'true').lower() in ('1', 'true', 'yes')
+SPECULATIVE_FACTOR = float(os.environ.get('SPECULATIVE_FACTOR', '2.0'))
+# Retries: a failed task is retried on another worker after RETRY_BACKOFF_SECONDS (doubling), up to
+# TASK_MAX_ATTEMPTS attempts; each retry also gets twice the previous TASK_DEADLINE_SECONDS timeout
+TASK_MAX_ATTEMPTS = int(os.environ.get('TASK_MAX_ATTEMPTS', '3'))
+TASK_DEADLINE_SECONDS = float(os.environ.get('TASK_DEADLINE_SECONDS', '10'))
+RETRY_BACKOFF_SECONDS = float(os.environ.get('RETRY_BACKOFF_SECONDS', '0.5'))
+# Payload format: 'binary' (raw text chunks and packed key/count pairs) or 'json'; workers reply in the
+# format the client accepts, so 'binary' falls back to JSON against workers that do not support it
+REST_FORMAT = os.environ.get('REST_FORMAT', 'binary').lower()
+# Set to 'gzip' to compress request bodies and accept gzipped responses
+REST_COMPRESSION = os.environ.get('REST_COMPRESSION', 'none').lower()
+# Map result cache: ask each worker for a chunk's cached counts by digest first and upload the chunk only on a
+# miss. Chunk i goes to the same worker on every run
+MAP_CACHE = os.environ.get('MAP_CACHE', 'false').lower() in ('1', 'true', 'yes')
+# Top-K mode: if set, reducers return only their TOP_K most frequent words and the client prints the
+# exact top TOP_K instead of the whole vocabulary
+TOP_K = int(os.environ.get('TOP_K', '0'))
+# Counting: 'exact', or 'approximate': workers return fixed-size mergeable sketches of their chunks (/sketch), which
+# this client merges as they arrive (no shuffle or reduce phase). Counts are at most SKETCH_EPSILON x the total
+# number of words too high with probability 1 - SKETCH_DELTA (Count-Min Sketch), the number of distinct words comes
+# from a HyperLogLog of 2^SKETCH_HLL_PRECISION registers, and the SKETCH_HEAVY_HITTERS most frequent words are
+# tracked (Misra-Gries) and printed (only the top TOP_K if set), with their error bounds
+COUNT_MODE = os.environ.get('COUNT_MODE', 'exact').lower()
+SKETCH_EPSILON = float(os.environ.get('SKETCH_EPSILON', '0.001'))
+SKETCH_DELTA = float(os.environ.get('SKETCH_DELTA', '0.01'))
+SKETCH_HLL_PRECISION = int(os.environ.get('SKETCH_HLL_PRECISION', '14'))
+SKETCH_HEAVY_HITTERS = int(os.environ.get('SKETCH_HEAVY_HITTERS', '100'))
+# Result files: if OUTPUT_DIR is set (a directory shared with the workers), each reduce task writes its counts
+# to a sorted TSV file under OUTPUT_DIR/<job id>/, sorted by OUTPUT_ORDER ('key' or 'count'), instead of
+# returning them; OUTPUT_MERGE also k-way merges them into one sorted result.tsv. Only a summary is printed
+OUTPUT_DIR = os.environ.get('OUTPUT_DIR', '')
+OUTPUT_ORDER = os.environ.get('OUTPUT_ORDER', 'key').lower()
+OUTPUT_MERGE = os.environ.get('OUTPUT_MERGE', 'false').lower() in ('1', 'true', 'yes')
+# Shuffle partitioner: 'round_robin' (words dealt out to the NUM_WORKERS reduce tasks in turn) or 'sampled': balance
+# the tasks by the volume of a sample of about PARTITION_SAMPLE_SIZE map output entries, splitting words estimated
+# above HOT_KEY_FRACTION of a balanced task over several tasks (not with TOP_K or OUTPUT_DIR, which need one task
+# per word)
+PARTITIONER = os.environ.get('PARTITIONER', 'round_robin').lower()
+PARTITION_SAMPLE_SIZE = int(os.environ.get('PARTITION_SAMPLE_SIZE', '100000'))
+HOT_KEY_FRACTION = float(os.environ.get('HOT_KEY_FRACTION', '0.5'))
+# Shuffle memory: the client groups map results by word in about SHUFFLE_MEMORY_BYTES, spilling sorted runs to
+# SPILL_DIR (default: the system temporary directory) and merging them past it; 0 never spills
+SHUFFLE_MEMORY_BYTES = int(os.environ.get('SHUFFLE_MEMORY_BYTES', str(256 * 1024 * 1024)))
+SPILL_DIR = os.environ.get('SPILL_DIR', '')
+# Coordinator: 'threads' (one request per worker at a time) or 'async' (asyncio, see client/async_client.py)
+CLIENT_MODE = os.environ.get('CLIENT_MODE', 'threads').lower()
+# Requests kept in flight per worker by the async coordinator
+IN_FLIGHT_PER_WORKER = int(os.environ.get('IN_FLIGHT_PER_WORKER', '4'))
 
 print(f"\n{'='*60}")
-print(f"REST MapReduce Configuration: {NUM_WORKERS} Worker(s)")
+print(f"REST MapReduce Configuration: {NUM_WORKERS} Worker(s), {REST_FORMAT} payloads, "
+      f"{REST_COMPRESSION} compression, {CLIENT_MODE} coordinator")
+if MAP_CACHE:
+    print("Map result cache: chunks are uploaded only on a cache miss")
+if PARTITIONER == 'sampled':
+    print(f"Sampled partitioner: reduce tasks balanced on about {PARTITION_SAMPLE_SIZE} map output entries")
+if COUNT_MODE == 'approximate':
+    print(f"Approximate mode: sketches with epsilon {SKETCH_EPSILON}, delta {SKETCH_DELTA}, "
+          f"HyperLogLog precision {SKETCH_HLL_PRECISION}, {SKETCH_HEAVY_HITTERS} heavy hitters")
+elif TOP_K:
+    print(f"Top-K mode: reducers return their top {TOP_K} word(s)")
+if OUTPUT_DIR:
+    print(f"Result files: {OUTPUT_DIR}, sorted by {OUTPUT_ORDER}{', merged' if OUTPUT_MERGE else ''}")
 print(f"{'='*60}")
 
-def read_input_file(filename):
-    """Read input file."""
+# Description of every result file the reducers wrote in this job ({"name", "num_keys", "num_words"})
+output_files = []
+# Hits and misses of the MAP_CACHE probes
+cache_stats = MapCacheStats()
+# Per-worker round trips and the task telemetry the workers returned with them
+telemetry_stats = TelemetryStats()
+# Runs the shuffle spilled to SPILL_DIR
+shuffle_spill_stats = SpillStats()
+# Reduce input entries per reduce task of the shuffle
+partition_load_stats = PartitionLoadStats()
+
+def open_input_splitter(filename):
+    """Memory-map the input file and split it into whitespace-aligned chunks."""
     if not os.path.exists(filename):
         raise FileNotFoundError(f"Error: The input file '{filename}' was not found.")
-    print(f"Reading input data from: {filename}")
-    with open(filename, 'r', encoding='utf-8') as f:
-        return f.read()
-
-def split_input_data(data, num_chunks):
-    """Split input data into chunks for workers."""
-    chunk_size = len(data) // num_chunks
-    chunks = []
-    for i in range(num_chunks):
-        start = i * chunk_size
-        end = (i + 1) * chunk_size if i < num_chunks - 1 else len(data)
-        chunks.append(data[start:end])
-    return chunks
+    print(f"Mapping input data from: {filename}")
+    return InputSplitter(filename, num_chunks=NUM_CHUNKS, chunk_size=CHUNK_SIZE)
+
+def new_session():
+    """Create a keep-alive session that pools connections to every worker."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=max(1, NUM_WORKERS), pool_maxsize=max(1, NUM_WORKERS) * 2)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+# Shared by every task of the job, so connections are reused instead of reopened per request
+session = new_session()
+
+def accept_headers():
+    """Return the headers negotiating the format and compression of a counts response."""
+    return {
+        'Accept': f'{MEDIA_TYPE}, application/json;q=0.5' if REST_FORMAT == 'binary' else 'application/json',
+        'Accept-Encoding': 'gzip' if REST_COMPRESSION == 'gzip' else 'identity',
+    }
+
+def prepare_request(body, content_type):
+    """Return the (possibly gzipped) body and the headers of a request, negotiating the response format."""
+    headers = {'Content-Type': content_type, **accept_headers()}
+    if REST_COMPRESSION == 'gzip':
+        body = gzip.compress(body, compresslevel=1)
+        headers['Content-Encoding'] = 'gzip'
+    return body, headers
+
+def decode_counts_response(content_type, content):
+    """Return {word: count} (a WordSketch from /sketch) from a response body the HTTP library has already decompressed."""
+    if content_type.startswith(SKETCH_MEDIA_TYPE):
+        return WordSketch.from_bytes(content)
+    if content_type.startswith(MEDIA_TYPE):
+        return decode_counts(content)
+    return json.loads(content)
+
+def encode_map_request(chunk):
+    """Return the body and content type of a /map request (raw text in binary mode, copied only now)."""
+    if REST_FORMAT == 'binary':
+        return bytes(chunk), 'text/plain; charset=utf-8'
+    return json.dumps({"chunk": str(chunk, 'utf-8')}).encode('utf-8'), 'application/json'
+
+def encode_reduce_request(keys, lengths, counts):
+    """Return the body and content type of a columnar /reduce request."""
+    if REST_FORMAT == 'binary':
+        return encode_columnar(keys, lengths, counts), COLUMNAR_MEDIA_TYPE
+    return json.dumps({"keys": keys, "lengths": lengths, "counts": counts}).encode('utf-8'), 'application/json'
+
+def record_telemetry(url, round_trip_seconds, headers):
+    """Add a request's round trip and the worker's TELEMETRY_HEADER to the totals of the worker at url."""
+    parts = urlsplit(url)
+    telemetry_stats.record(f"{parts.scheme}://{parts.netloc}", round_trip_seconds,
+                           parse_telemetry_header(headers.get(TELEMETRY_HEADER)))
+
+def post_counts(url, body, content_type, timeout, extra_headers=None):
+    """POST a payload and return the {word: count} response, raising on HTTP errors."""
+    body, headers = prepare_request(body, content_type)
+    if extra_headers:
+        headers.update(extra_headers)
+    start = time.perf_counter()
+    response = session.post(url, data=body, headers=headers, timeout=timeout)
+    record_telemetry(url, time.perf_counter() - start, response.headers)
+    response.raise_for_status()
+    return decode_counts_response(response.headers.get('Content-Type', ''), response.content)
+
+def get_cached_counts(url, timeout):
+    """GET a chunk's cached {word: count} from /map/<digest>, or None if the worker has not cached it."""
+    start = time.perf_counter()
+    response = session.get(url, headers=accept_headers(), timeout=timeout)
+    record_telemetry(url, time.perf_counter() - start, response.headers)
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return decode_counts_response(response.headers.get('Content-Type', ''), response.content)
+
+def record_cache_probe(chunk, counts):
+    """Count a cache probe and return True if it found the chunk's counts."""
+    hit = counts is not None
+    cache_stats.record(hit, len(chunk))
+    return hit
+
+def sketch_parameters_query():
+    """Return the /sketch query string of the configured sketch parameters."""
+    width, depth, precision, heavy_hitters = sketch_parameters(SKETCH_EPSILON, SKETCH_DELTA, SKETCH_HLL_PRECISION,
+                                                               SKETCH_HEAVY_HITTERS)
+    return urlencode({'width': width, 'depth': depth, 'precision': precision, 'heavy_hitters': heavy_hitters})
+
+def map_url(worker_index, digest=''):
+    """Return the URL a worker maps chunks at (/sketch in approximate mode), or probes its cache for digest at."""
+    url = WORKER_ADDRESSES[worker_index] + ("/sketch" if COUNT_MODE == 'approximate' else "/map")
+    if digest:
+        url += f"/{digest}"
+    return f"{url}?{sketch_parameters_query()}" if COUNT_MODE == 'approximate' else url
+
+def send_map_chunk(worker_index, chunk, timeout):
+    """Send one memory-mapped chunk to a worker (with MAP_CACHE, only if a probe for its digest misses)."""
+    if not MAP_CACHE:
+        return post_counts(map_url(worker_index), *encode_map_request(chunk), timeout)
+    digest = chunk_digest(chunk)
+    counts = get_cached_counts(map_url(worker_index, digest), timeout)
+    if record_cache_probe(chunk, counts):
+        return counts
+    return post_counts(map_url(worker_index), *encode_map_request(chunk), timeout, {DIGEST_HEADER: digest})
+
+def collect_map_response(all_intermediate_data, response):
+    """Add one map response to all_intermediate_data.
+
+    In approximate mode each chunk's sketch is merged as it arrives into the
+    single sketch all_intermediate_data holds.
+    """
+    if COUNT_MODE != 'approximate':
+        if response:
+            # Each worker returns a dict of word counts
+            all_intermediate_data.append(response)
+    elif all_intermediate_data:
+        all_intermediate_data[0].merge(response)
+    else:
+        all_intermediate_data.append(response)
+
+def map_results_summary(all_intermediate_data):
+    """Describe the results of the map phase."""
+    if COUNT_MODE == 'approximate':
+        num_words = all_intermediate_data[0].total if all_intermediate_data else 0
+        return f"Results: sketches of {num_words} words merged"
+    return f"Results collected: {len(all_intermediate_data)}"
+
+def reduce_url(worker_index, job_id, task_index):
+    """Return the /reduce URL of a reduce task, asking for a local top-K or a result file if configured."""
+    url = WORKER_ADDRESSES[worker_index] + "/reduce"
+    params = {}
+    if TOP_K:
+        params['top_k'] = TOP_K
+    if OUTPUT_DIR:
+        params['output_file'] = partition_file_name(job_id, task_index)
+        params['order'] = OUTPUT_ORDER
+    return f"{url}?{urlencode(params)}" if params else url
+
+def send_reduce_data(url, keys, lengths, counts, timeout):
+    """Send one reduce task's columnar data (unique words, counts per word, all counts) to a worker."""
+    return post_counts(url, *encode_reduce_request(keys, lengths, counts), timeout)
+
+def task_deadline(attempt):
+    """Return the request timeout of a task attempt, doubling it for every retry."""
+    return TASK_DEADLINE_SECONDS * 2 ** (attempt - 1)
+
+def is_retryable(error):
+    """Return True if another attempt of a failed task may succeed."""
+    if isinstance(error, requests.HTTPError):
+        return error.response is None or error.response.status_code >= 500
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+def new_scheduler(speculative=SPECULATIVE_EXECUTION):
+    """Create a pull-based task scheduler over the configured workers."""
+    return TaskScheduler(NUM_WORKERS, speculative=speculative, speculative_factor=SPECULATIVE_FACTOR,
+                         max_attempts=TASK_MAX_ATTEMPTS, retry_backoff=RETRY_BACKOFF_SECONDS,
+                         retryable=is_retryable)
+
+def task_error_reporter(task_name):
+    """Return an on_error callback that reports failed task attempts."""
+    def report_error(task_index, worker_index, error):
+        worker_addr = WORKER_ADDRESSES[worker_index]
+        print(f"!!! Error calling {task_name} for task {task_index} on {worker_addr}: {error}")
+    return report_error
 
 def run_map_phase(chunks):
-    """Execute Map phase - send chunks to REST workers and collect results."""
+    """Execute Map phase - send chunks to REST workers and collect results.
+
+    Workers pull chunks from a shared queue, stragglers get speculative
+    backups and failed chunks are retried on another worker.
+    """
     all_intermediate_data = []
     
-    print(f"\n[Map Phase] Starting on {NUM_WORKERS} worker(s)...")
+    print(f"\n[Map Phase] Starting {len(chunks)} task(s) on {NUM_WORKERS} worker(s)...")
     start_time = time.perf_counter()
 
-    with ThreadPoolExecutor(max_workers=NUM_WORKERS) as executor:
-        futures = {}
-        for i, chunk in enumerate(chunks):
-            worker_index = i % NUM_WORKERS
-            worker_url = WORKER_ADDRESSES[worker_index] + "/map"
-            future = executor.submit(lambda url, c: requests.post(url, json={"chunk": c}).json(), worker_url, chunk)
-            futures[future] = worker_index
-
-        for future in as_completed(futures):
-            worker_index = futures[future]
-            try:
-                response = future.result()
-                if response:
-                    # Each worker returns a dict of word counts
-                    all_intermediate_data.append(response)
-            except Exception as e:
-                worker_addr = WORKER_ADDRESSES[worker_index]
-                print(f"!!! Error calling MapTask on {worker_addr}: {e}")
+    scheduler = new_scheduler()
+    scheduler.run(
+        chunks,
+        lambda worker_index, chunk, attempt: send_map_chunk(worker_index, chunk, task_deadline(attempt)),
+        on_result=lambda task_index, response: collect_map_response(all_intermediate_data, response),
+        on_error=task_error_reporter('MapTask'),
+        affinity=cache_affinity(WORKER_ADDRESSES) if MAP_CACHE else None,
+    )
 
     elapsed = time.perf_counter() - start_time
-    print(f"[Map Phase] Complete - Time: {elapsed:.6f}s, Results collected: {len(all_intermediate_data)}")
-    return all_intermediate_data, elapsed
+    print(f"[Map Phase] Complete - Time: {elapsed:.6f}s, {map_results_summary(all_intermediate_data)}")
+    return all_intermediate_data, elapsed, scheduler
+
+def sampled_partition_plan(intermediate_data):
+    """Build a PartitionPlan over NUM_WORKERS reduce tasks from about PARTITION_SAMPLE_SIZE map output entries.
+
+    Whole map results are taken at a stride; every (word, count) entry
+    counts as one unit of reduce input.
+    """
+    stride = sample_stride(sum(len(data_dict) for data_dict in intermediate_data), PARTITION_SAMPLE_SIZE)
+    keys = (word for data_dict in intermediate_data[::stride] for word in data_dict)
+    return PartitionPlan.from_sample(keys, NUM_WORKERS, HOT_KEY_FRACTION, split_hot_keys=not (TOP_K or OUTPUT_DIR))
+
+def shuffle_intermediate_data(intermediate_data):
+    """Group map results by word and split the words into NUM_WORKERS reduce tasks.
+
+    Each task holds columns: each word once, how many map results counted
+    it, and those counts back to back. Words are dealt out to the tasks in
+    turn, or with PARTITIONER=sampled by a sampled PartitionPlan, which may
+    share a hot word's counts out over several tasks. Returns the non-empty
+    tasks and the number of unique words, and records the entries each task
+    received in partition_load_stats. The map results are consumed (removed
+    from intermediate_data) as they are grouped, and the grouping spills
+    sorted runs to SPILL_DIR past SHUFFLE_MEMORY_BYTES, so words come out in order.
+    """
+    plan = sampled_partition_plan(intermediate_data) if PARTITIONER == 'sampled' else None
+    with SpillingGroups(SHUFFLE_MEMORY_BYTES, SPILL_DIR) as grouped_data:
+        while intermediate_data:
+            grouped_data.add_counts(intermediate_data.pop())
+
+        worker_data = [([], [], []) for _ in range(NUM_WORKERS)]
+        num_unique_keys = 0
+        for i, (key, group) in enumerate(grouped_data.items()):
+            partition = plan.partition_of(key) if plan else i % NUM_WORKERS
+            pieces = plan.split_entries(key, group) if partition == SPLIT else ((partition, group),)
+            for partition, piece in pieces:
+                keys, lengths, counts = worker_data[partition]
+                keys.append(key)
+                lengths.append(len(piece))
+                counts.extend(piece)
+            num_unique_keys += 1
+        shuffle_spill_stats.record(grouped_data)
+    partition_load_stats.record([len(counts) for _, _, counts in worker_data], len(plan.split_keys) if plan else 0)
+    return [data for data in worker_data if data[0]], num_unique_keys
+
+def merge_reduce_response(final_results, response):
+    """Add a worker's aggregated {word: count} response to the final results."""
+    for word, count in response.items():
+        final_results[word] = final_results.get(word, 0) + count
+
+def collect_reduce_response(final_results, response):
+    """Add a reduce response to final_results, or the result file it describes to output_files."""
+    if OUTPUT_DIR:
+        output_files.append(response["output_file"])
+    else:
+        merge_reduce_response(final_results, response)
 
-def run_reduce_phase(intermediate_data):
-    """Execute Reduce phase - shuffle data and send to REST workers."""
-    # Shuffle: group data by word
+def num_result_keys(final_results):
+    """Return the number of words returned to the client or written to result files."""
+    return len(final_results) + sum(output_file["num_keys"] for output_file in output_files)
+
+def run_reduce_phase(intermediate_data, job_id):
+    """Execute Reduce phase - shuffle data and send to REST workers.
+
+    Each key group is one reduce task; a failed one is retried on another
+    worker while the map results stay in memory, so nothing is re-mapped.
+    """
     shuffle_start = time.perf_counter()
-    grouped_data = defaultdict(list)
-    for data_dict in intermediate_data:
-        for word, count in data_dict.items():
-            grouped_data[word].append(count)
-    unique_keys = list(grouped_data.keys())
+    worker_data, num_unique_keys = shuffle_intermediate_data(intermediate_data)
     shuffle_elapsed = time.perf_counter() - shuffle_start
-    print(f"[Shuffle Phase] Complete - Time: {shuffle_elapsed:.6f}s, Unique keys: {len(unique_keys)}")
-
-    # Partition keys across workers and prepare data in format worker expects
-    # Worker expects: {"counts": [{word1: count1}, {word2: count2}, ...]}
-    # So we need to send lists of dictionaries, not lists of numbers
-    worker_data = [[] for _ in range(NUM_WORKERS)]
-    for i, key in enumerate(unique_keys):
-        worker_index = i % NUM_WORKERS
-        # Each dictionary represents counts from one map result
-        # For each count value, create a dict with the word and its count
-        for count in grouped_data[key]:
-            worker_data[worker_index].append({key: count})
+    print(f"[Shuffle Phase] Complete - Time: {shuffle_elapsed:.6f}s, Unique keys: {num_unique_keys}")
 
     # Reduce: send grouped data to workers
     final_results = {}
-    print(f"[Reduce Phase] Starting on {NUM_WORKERS} worker(s)...")
+    print(f"[Reduce Phase] Starting {len(worker_data)} task(s) on {NUM_WORKERS} worker(s)...")
     reduce_start = time.perf_counter()
 
-    def send_reduce_request(url, data):
+    def send_reduce_request(worker_index, task, attempt):
         """Helper function to send reduce request to worker."""
-        return requests.post(url, json={"counts": data}).json()
-
-    with ThreadPoolExecutor(max_workers=NUM_WORKERS) as executor:
-        futures = {}
-        for worker_index in range(NUM_WORKERS):
-            if worker_data[worker_index]:  # Only send if there's data for this worker
-                worker_url = WORKER_ADDRESSES[worker_index] + "/reduce"
-                data_to_send = worker_data[worker_index]
-                future = executor.submit(send_reduce_request, worker_url, data_to_send)
-                futures[future] = worker_index
-
-        for future in as_completed(futures):
-            worker_index = futures[future]
-            try:
-                response = future.result()
-                if response:
-                    # Each worker returns a dict of aggregated word counts
-                    for word, count in response.items():
-                        final_results[word] = final_results.get(word, 0) + count
-            except Exception as e:
-                print(f"!!! Error calling ReduceTask on worker {worker_index}: {e}")
+        task_index, data = task
+        url = reduce_url(worker_index, job_id, task_index)
+        return send_reduce_data(url, *data, task_deadline(attempt))
+
+    def collect(task_index, response):
+        if response:
+            # Each worker returns a dict of aggregated word counts (or describes its result file)
+            collect_reduce_response(final_results, response)
+
+    scheduler = new_scheduler(speculative=False)
+    scheduler.run(
+        list(enumerate(worker_data)),
+        send_reduce_request,
+        on_result=collect,
+        on_error=task_error_reporter('ReduceTask'),
+    )
 
     reduce_elapsed = time.perf_counter() - reduce_start
-    print(f"[Reduce Phase] Complete - Time: {reduce_elapsed:.6f}s, Results: {len(final_results)} keys")
-    return final_results, reduce_elapsed, shuffle_elapsed
+    print(f"[Reduce Phase] Complete - Time: {reduce_elapsed:.6f}s, Results: {num_result_keys(final_results)} keys")
+    return final_results, reduce_elapsed, shuffle_elapsed, scheduler
+
+def select_top_k(final_results):
+    """Return the TOP_K words of the reducers' local top-K candidates (all results if TOP_K is unset).
+
+    Every word is sent to exactly one reduce task, so the top TOP_K of the
+    union of the local lists is the exact global top TOP_K.
+    """
+    if not TOP_K:
+        return final_results
+    return dict(top_k_items(final_results, TOP_K))
+
+def report_output_files(job_id):
+    """Summarize the result files the reducers wrote, k-way merging them into one file if OUTPUT_MERGE."""
+    files = sorted(output_files, key=lambda output_file: output_file["name"])
+    num_keys = sum(output_file["num_keys"] for output_file in files)
+    num_words = sum(output_file["num_words"] for output_file in files)
+    print(f"[Output] {len(files)} partition file(s) in {os.path.join(OUTPUT_DIR, job_id)}: "
+          f"{num_keys} keys, {num_words} words, sorted by {OUTPUT_ORDER}")
+    if OUTPUT_MERGE:
+        start_time = time.perf_counter()
+        merged_path = resolve_output_file(OUTPUT_DIR, f'{job_id}/{MERGED_FILE_NAME}')
+        paths = [resolve_output_file(OUTPUT_DIR, output_file["name"]) for output_file in files]
+        num_lines = merge_partition_files(paths, merged_path, by_count=OUTPUT_ORDER == 'count')
+        elapsed = time.perf_counter() - start_time
+        print(f"[Output] Merged {len(paths)} file(s) into {merged_path}: {num_lines} keys in {elapsed:.6f}s")
+
+def merged_sketch(intermediate_data):
+    """Return the sketch merged from every map task (an empty one if there was no input)."""
+    if intermediate_data:
+        return intermediate_data[0]
+    return WordSketch(*sketch_parameters(SKETCH_EPSILON, SKETCH_DELTA, SKETCH_HLL_PRECISION, SKETCH_HEAVY_HITTERS))
+
+def display_sketch_results(sketch):
+    """Display the estimated counts of the heavy hitters (the top TOP_K only if set) and the error bounds."""
+    print("\n" + "="*60)
+    print(f"APPROXIMATE TOP {TOP_K} WORDS" if TOP_K else "APPROXIMATE WORD COUNTS (HEAVY HITTERS)")
+    print("="*60)
+    for word, estimate, lower_bound in sketch.top_words(TOP_K):
+        print(f"  {word}: ~{estimate} (at least {lower_bound})")
+    print("-"*60)
+    for line in error_summary_lines(sketch):
+        print(f"  {line}")
+    print("="*60)
 
 def parse_and_display_results(final_results):
     """Display final word counts."""
@@ -127,28 +450,47 @@ def run_mapreduce():
     """Main coordinator - orchestrates MapReduce job."""
     start_time = time.perf_counter()
     map_wall = reduce_wall = shuffle_wall = 0.0
+    map_scheduler = reduce_scheduler = None
+
+    if CLIENT_MODE == 'async':
+        # Imported here so the threaded coordinator does not need aiohttp
+        from client import async_client
+        coordinator = async_client.AsyncCoordinator(sys.modules[__name__])
+        map_phase, reduce_phase = coordinator.run_map_phase, coordinator.run_reduce_phase
+    else:
+        map_phase, reduce_phase = run_map_phase, run_reduce_phase
 
     try:
-        # Read and split input
-        input_data = read_input_file(INPUT_FILE_NAME)
-        chunks = split_input_data(input_data, NUM_WORKERS)
-        print(f"[Setup] Input split into {len(chunks)} chunk(s)")
+        # Names the job's result files
+        job_id = uuid.uuid4().hex
+        # Split input (memory-mapped, chunks are decoded only when sent)
+        with open_input_splitter(INPUT_FILE_NAME) as splitter:
+            print(f"[Setup] Input split into {len(splitter)} chunk(s)")
 
-        # Map phase
-        intermediate_data, map_wall = run_map_phase(chunks)
+            # Map phase
+            intermediate_data, map_wall, map_scheduler = map_phase(splitter)
 
-        # Reduce phase
-        final_results, reduce_wall, shuffle_wall = run_reduce_phase(intermediate_data)
+        # Reduce phase (the merged sketch is the result in approximate mode)
+        if COUNT_MODE != 'approximate':
+            final_results, reduce_wall, shuffle_wall, reduce_scheduler = reduce_phase(intermediate_data, job_id)
 
-        # Display results
-        print("\n" + "="*60)
-        print("FINAL WORD COUNTS")
-        print("="*60)
-        parse_and_display_results(final_results)
-        print("="*60)
+        # Display results (only a summary when the reducers wrote result files)
+        if COUNT_MODE == 'approximate':
+            display_sketch_results(merged_sketch(intermediate_data))
+        elif OUTPUT_DIR:
+            report_output_files(job_id)
+        else:
+            final_results = select_top_k(final_results)
+            print("\n" + "="*60)
+            print(f"TOP {TOP_K} WORDS" if TOP_K else "FINAL WORD COUNTS")
+            print("="*60)
+            parse_and_display_results(final_results)
+            print("="*60)
 
     except FileNotFoundError as e:
         print(e)
+    except JobFailedError as e:
+        print(f"\n!!! Job failed: {e}")
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
     finally:
@@ -165,10 +507,46 @@ def run_mapreduce():
         print(f"  Shuffle Phase:         {shuffle_wall:.6f} seconds")
         print(f"  Reduce Phase:          {reduce_wall:.6f} seconds")
         print(f"  Other (overhead):      {overhead:.6f} seconds")
+        for line in telemetry_stats.summary_lines():
+            print(line)
+        for line in shuffle_spill_stats.summary_lines('Shuffle'):
+            print(line)
+        for line in partition_load_stats.summary_lines():
+            print(line)
+        for line in cache_stats.summary_lines():
+            print(line)
+        if map_scheduler:
+            for line in map_scheduler.summary_lines('Map'):
+                print(line)
+        if reduce_scheduler:
+            for line in reduce_scheduler.summary_lines('Reduce'):
+                print(line)
         print(f"{'='*60}\n")
 
 if __name__ == '__main__':
-    if not WORKER_ADDRESSES:
-        print("ERROR: Please define at least one worker address in WORKER_ADDRESSES.")
+    if NUM_CHUNKS < 1 or CHUNK_SIZE < 0:
+        print("ERROR: NUM_CHUNKS must be at least 1 and CHUNK_SIZE must not be negative.")
+    elif REST_FORMAT not in ('binary', 'json') or REST_COMPRESSION not in ('gzip', 'none'):
+        print("ERROR: REST_FORMAT must be 'binary' or 'json' and REST_COMPRESSION 'gzip' or 'none'.")
+    elif CLIENT_MODE not in ('threads', 'async') or IN_FLIGHT_PER_WORKER < 1:
+        print("ERROR: CLIENT_MODE must be 'threads' or 'async' and IN_FLIGHT_PER_WORKER at least 1.")
+    elif TOP_K < 0 or SHUFFLE_MEMORY_BYTES < 0:
+        print("ERROR: TOP_K and SHUFFLE_MEMORY_BYTES must not be negative.")
+    elif PARTITIONER not in ('round_robin', 'sampled') or PARTITION_SAMPLE_SIZE < 1 or HOT_KEY_FRACTION <= 0:
+        print("ERROR: PARTITIONER must be 'round_robin' or 'sampled', PARTITION_SAMPLE_SIZE at least 1 and "
+              "HOT_KEY_FRACTION positive.")
+    elif OUTPUT_ORDER not in ('key', 'count') or (OUTPUT_DIR and TOP_K):
+        print("ERROR: OUTPUT_ORDER must be 'key' or 'count', and OUTPUT_DIR cannot be combined with TOP_K.")
+    elif COUNT_MODE not in ('exact', 'approximate') or (COUNT_MODE == 'approximate' and OUTPUT_DIR):
+        print("ERROR: COUNT_MODE must be 'exact' or 'approximate', and COUNT_MODE=approximate cannot be combined "
+              "with OUTPUT_DIR.")
+    elif COUNT_MODE == 'approximate' and not (0 < SKETCH_EPSILON < 1 and 0 < SKETCH_DELTA < 1
+                                              and 4 <= SKETCH_HLL_PRECISION <= 18 and SKETCH_HEAVY_HITTERS >= 1):
+        print("ERROR: SKETCH_EPSILON and SKETCH_DELTA must be between 0 and 1, SKETCH_HLL_PRECISION between 4 and 18 "
+              "and SKETCH_HEAVY_HITTERS at least 1.")
+    elif TASK_MAX_ATTEMPTS < 1 or TASK_DEADLINE_SECONDS <= 0:
+        print("ERROR: TASK_MAX_ATTEMPTS must be at least 1 and TASK_DEADLINE_SECONDS positive.")
+    elif len(WORKER_ADDRESSES) < NUM_WORKERS or not WORKER_ADDRESSES:
+        print("ERROR: Please define at least NUM_WORKERS worker addresses in WORKER_ADDRESSES.")
     else:
         run_mapreduce()
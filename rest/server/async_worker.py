@@ -0,0 +1,153 @@
+"""
+asyncio (aiohttp) REST worker, selected with WORKER_SERVER=aiohttp.
+
+Serves the same /map, /map/<digest>, /reduce, /sketch, /sketch/<digest>
+and /metrics endpoints and payload formats as the Flask worker. Requests are read and answered on the
+event loop, while decoding, counting and encoding run in a thread pool (and
+large map inputs also fan out over the map process pool), so many requests
+can be in flight without the event loop waiting on CPU work.
+"""
+
+import asyncio
+import json
+import time
+
+from aiohttp import web
+
+from common.mapcache import DIGEST_HEADER, MapResultCache
+from common.telemetry import (METRICS_CONTENT_TYPE, TELEMETRY_HEADER, QueueTimingExecutor, WorkerMetrics,
+                              telemetry_header)
+from server.payloads import (count_map_input, decode_body, encode_counts_response, encode_sketch_response,
+                             new_sketch, parse_top_k, reduce_counts, select_top_k, sketch_map_input,
+                             write_reduce_output)
+
+# Largest accepted request body (aiohttp's default is 1 MB)
+MAX_REQUEST_BYTES = 1024 * 1024 * 1024  # 1 GB
+
+
+def create_app(map_pool, worker_id, gzip_min_bytes, executor, output_dir='', map_cache=None, metrics=None,
+               reduce_memory_bytes=0, spill_dir=''):
+    """Return the aiohttp application serving /map, /map/<digest>, /reduce, /sketch, /sketch/<digest> and /metrics.
+
+    Tasks run in executor; with a QueueTimingExecutor their telemetry includes the queue wait.
+    /reduce spills to spill_dir past reduce_memory_bytes (0 never spills).
+    """
+    map_cache = map_cache or MapResultCache(0)
+    metrics = metrics or WorkerMetrics(worker_id)
+
+    def run_map(timer, mimetype, data, accept, accept_encoding, request_info):
+        start_time = time.perf_counter()
+        input_text, intermediate_results = count_map_input(map_pool, map_cache, mimetype, data,
+                                                           request_info.headers.get(DIGEST_HEADER), timer)
+        print(f"Worker {worker_id} received MapTask: '{(input_text[:30])}...'")
+        elapsed = time.perf_counter() - start_time
+        print(f"Worker {worker_id} MapTask completed: {len(intermediate_results)} unique words in {elapsed:.6f}s")
+        return 200, *encode_counts_response(intermediate_results, accept, accept_encoding, gzip_min_bytes, timer)
+
+    def run_cached_map(timer, mimetype, data, accept, accept_encoding, request_info):
+        counts = map_cache.get(request_info.match_info['digest'])
+        timer.lap('compute')
+        outcome = f"hit, {len(counts)} unique words" if counts is not None else "miss"
+        print(f"Worker {worker_id} map cache {outcome} ({map_cache.summary()})")
+        if counts is None:
+            return 404, json.dumps({"error": "not cached"}).encode('utf-8'), 'application/json', None
+        timer.items_in, timer.items_out = sum(counts.values()), len(counts)
+        return 200, *encode_counts_response(counts, accept, accept_encoding, gzip_min_bytes, timer)
+
+    def run_reduce(timer, mimetype, data, accept, accept_encoding, request_info):
+        start_time = time.perf_counter()
+        query = request_info.query
+        print(f"Worker {worker_id} received ReduceTask")
+        top_k = parse_top_k(query.get('top_k'))
+        with reduce_counts(mimetype, data, timer, reduce_memory_bytes, spill_dir) as counts:
+            if query.get('output_file'):
+                output = write_reduce_output(output_dir, query['output_file'], counts, query.get('order'), top_k)
+                timer.items_out = output["output_file"]["num_keys"]
+            else:
+                final_counts = select_top_k(counts, top_k)
+                timer.lap('compute')
+                timer.items_out = len(final_counts)
+            timer.record_spills(counts)
+        elapsed = time.perf_counter() - start_time
+        print(f"Worker {worker_id} ReduceTask completed: {timer.items_out} keys in {elapsed:.6f}s")
+        if query.get('output_file'):
+            return 200, json.dumps(output).encode('utf-8'), 'application/json', None
+        return 200, *encode_counts_response(final_counts, accept, accept_encoding, gzip_min_bytes, timer)
+
+    def run_sketch(timer, mimetype, data, accept, accept_encoding, request_info):
+        start_time = time.perf_counter()
+        sketch = new_sketch(request_info.query)
+        input_text = sketch_map_input(map_pool, map_cache, sketch, mimetype, data,
+                                      request_info.headers.get(DIGEST_HEADER), timer)
+        print(f"Worker {worker_id} received SketchTask: '{(input_text[:30])}...'")
+        result = encode_sketch_response(sketch, accept_encoding, gzip_min_bytes, timer)
+        elapsed = time.perf_counter() - start_time
+        print(f"Worker {worker_id} SketchTask completed: {sketch.total} words sketched in {elapsed:.6f}s")
+        return 200, *result
+
+    def run_cached_sketch(timer, mimetype, data, accept, accept_encoding, request_info):
+        sketch = new_sketch(request_info.query)
+        counts = map_cache.get(request_info.match_info['digest'])
+        timer.lap('compute')
+        outcome = f"hit, {len(counts)} unique words" if counts is not None else "miss"
+        print(f"Worker {worker_id} map cache {outcome} ({map_cache.summary()})")
+        if counts is None:
+            return 404, json.dumps({"error": "not cached"}).encode('utf-8'), 'application/json', None
+        sketch.add_counts(counts)
+        timer.lap('compute')
+        timer.items_in = sketch.total
+        return 200, *encode_sketch_response(sketch, accept_encoding, gzip_min_bytes, timer)
+
+    def run_timed(name, task, mimetype, data, accept, accept_encoding, request_info):
+        # Runs in the executor, so the timer picks up how long the task was queued there
+        with metrics.task(name) as timer:
+            data = decode_body(data, request_info.headers.get('Content-Encoding'))
+            timer.bytes_in = len(data)
+            result = task(timer, mimetype, data, accept, accept_encoding, request_info)
+            timer.lap('serialize')
+            return result, telemetry_header(timer)
+
+    def handler(name, task):
+        async def handle(request):
+            # Still compressed: the app runs without auto_decompress, so run_timed gunzips it off the event loop
+            data = await request.read()
+            try:
+                (status, body, mimetype, content_encoding), telemetry = \
+                    await asyncio.get_running_loop().run_in_executor(
+                        executor, run_timed, name, task, request.content_type, data,
+                        request.headers.get('Accept'), request.headers.get('Accept-Encoding'), request)
+            except ValueError as e:
+                print(f"!!! Worker {worker_id} rejected a request: {e}")
+                return web.json_response({"error": str(e)}, status=400)
+            response = web.Response(status=status, body=body, content_type=mimetype)
+            response.headers[TELEMETRY_HEADER] = telemetry
+            if content_encoding:
+                response.headers['Content-Encoding'] = content_encoding
+            return response
+        return handle
+
+    async def handle_metrics(request):
+        return web.Response(body=metrics.render().encode('utf-8'), headers={'Content-Type': METRICS_CONTENT_TYPE})
+
+    app = web.Application(client_max_size=MAX_REQUEST_BYTES)
+    app.router.add_post('/map', handler('map', run_map))
+    app.router.add_get('/map/{digest}', handler('map_cached', run_cached_map))
+    app.router.add_post('/reduce', handler('reduce', run_reduce))
+    app.router.add_post('/sketch', handler('sketch', run_sketch))
+    app.router.add_get('/sketch/{digest}', handler('sketch_cached', run_cached_sketch))
+    app.router.add_get('/metrics', handle_metrics)
+    return app
+
+
+def serve(map_pool, worker_id, port, gzip_min_bytes, output_dir='', map_cache=None, metrics=None,
+          reduce_memory_bytes=0, spill_dir=''):
+    """Run the aiohttp worker until interrupted."""
+    executor = QueueTimingExecutor(max_workers=max(4, 2 * map_pool.processes))
+    print(f"REST MapReduce Worker {worker_id} (aiohttp) running on port {port}...")
+    try:
+        web.run_app(create_app(map_pool, worker_id, gzip_min_bytes, executor, output_dir, map_cache, metrics,
+                               reduce_memory_bytes, spill_dir),
+                    host="0.0.0.0", port=port, print=None, auto_decompress=False)
+    finally:
+        executor.shutdown()
+        map_pool.shutdown()
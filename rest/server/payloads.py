@@ -0,0 +1,199 @@
+"""
+Request and response payload handling shared by the Flask and aiohttp workers.
+
+Request formats are picked from Content-Type (raw text/plain or JSON for
+/map; columnar binary, binary pairs or JSON for /reduce) and response
+formats from Accept, with JSON as the fallback. Bodies may be gzipped in
+either direction, negotiated through Content-Encoding / Accept-Encoding.
+A /map upload carrying the chunk's digest (DIGEST_HEADER) has its counts
+cached under it, and GET /map/<digest> answers from that cache.
+/reduce may be asked for only its top_k words by count, or to write its
+result to a sorted file under the worker's output directory instead of
+returning it (query parameters); it aggregates under a memory budget,
+spilling sorted runs to disk past it (see common/spill.py). /sketch
+(approximate mode) counts a chunk like /map, but returns a fixed-size
+sketch of the counts (see common/sketches.py) with the parameters given
+in the query, and GET /sketch/<digest> sketches cached counts.
+The task helpers lap the TaskTimer they are given (decoding and encoding
+count as serialize, counting and aggregating as compute) and fill in its
+item counts and response size.
+Invalid payloads raise ValueError.
+"""
+
+import gzip
+import json
+import zlib
+
+from common.kvcodec import COLUMNAR_MEDIA_TYPE, MEDIA_TYPE, decode_columnar, decode_pairs, encode_counts
+from common.mapcache import verify_digest
+from common.resultfiles import resolve_output_file, write_partition_file
+from common.sketches import MEDIA_TYPE as SKETCH_MEDIA_TYPE, WordSketch
+from common.spill import SpillingCounter
+
+
+def accepts(header, token):
+    """Return True if an Accept or Accept-Encoding header explicitly lists token with a non-zero quality."""
+    for entry in (header or '').split(','):
+        value, *params = [part.strip() for part in entry.split(';')]
+        if value.lower() != token:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, number = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(number)
+                except ValueError:
+                    quality = 0.0
+        return quality > 0
+    return False
+
+
+def decode_body(data, content_encoding):
+    """Return the raw request body, gunzipped if the client compressed it."""
+    if (content_encoding or '').lower() == 'gzip':
+        try:
+            return gzip.decompress(data)
+        except (OSError, EOFError, zlib.error) as e:  # BadGzipFile is an OSError
+            raise ValueError(f"Invalid gzip request body: {e}") from None
+    return data
+
+
+def map_input_text(mimetype, data):
+    """Return the chunk of a /map request (a raw text/plain body or JSON {"chunk": ...})."""
+    if mimetype == 'text/plain':
+        return data.decode('utf-8')
+    return json.loads(data).get("chunk", "")
+
+
+def count_map_input(map_pool, map_cache, mimetype, data, digest, timer):
+    """Count the words of a /map request and return (input text, counts).
+
+    If the request carries the digest of its chunk, the digest is checked
+    against the chunk's UTF-8 bytes and the counts are cached under it.
+    """
+    input_text = map_input_text(mimetype, data)
+    if digest:
+        verify_digest(digest, data if mimetype == 'text/plain' else input_text.encode('utf-8'))
+    timer.lap('serialize')
+    counts = map_pool.count(input_text)
+    timer.lap('compute')
+    timer.items_in, timer.items_out = sum(counts.values()), len(counts)
+    if digest:
+        map_cache.put(digest, counts)
+    return input_text, counts
+
+
+def sketch_map_input(map_pool, map_cache, sketch, mimetype, data, digest, timer):
+    """Add the words of a /sketch request to an empty sketch and return its input text.
+
+    A request carrying a digest is counted like /map, since the cache needs
+    its exact counts; otherwise its words stream into the sketch, without
+    the counts of the chunk's whole vocabulary.
+    """
+    if digest:
+        input_text, counts = count_map_input(map_pool, map_cache, mimetype, data, digest, timer)
+        sketch.add_counts(counts)
+    else:
+        input_text = map_input_text(mimetype, data)
+        timer.lap('serialize')
+        sketch.add_text(input_text)
+    timer.lap('compute')
+    timer.items_in = sketch.total
+    return input_text
+
+
+def reduce_counts(mimetype, data, timer, memory_bytes=0, spill_dir=''):
+    """Aggregate a /reduce request into a SpillingCounter of memory_bytes (the caller closes it).
+
+    Columnar data (unique keys, number of counts per key, and all counts
+    back to back), as binary or as JSON {"keys", "lengths", "counts"}, is
+    summed without a loop over every count; binary key/count pairs and JSON
+    {"counts": [{word: count}, ...]} are added up one pair at a time.
+    """
+    final_counts = SpillingCounter(memory_bytes, spill_dir)
+    if mimetype == COLUMNAR_MEDIA_TYPE:
+        keys, lengths, counts = decode_columnar(data)
+        timer.lap('serialize')
+        final_counts.add_groups(keys, lengths, counts)
+        num_entries = len(counts)
+    elif mimetype == MEDIA_TYPE:
+        keys, counts = decode_pairs(data)
+        timer.lap('serialize')
+        final_counts.add_pairs(zip(keys, counts))
+        num_entries = len(counts)
+    else:
+        payload = json.loads(data)
+        timer.lap('serialize')
+        if "keys" in payload:
+            final_counts.add_groups(payload["keys"], payload["lengths"], payload["counts"])
+            num_entries = len(payload["counts"])
+        else:
+            num_entries = 0
+            for count_dict in payload.get("counts", []):
+                num_entries += len(count_dict)
+                final_counts.add_counts(count_dict)
+    timer.lap('compute')
+    timer.items_in = num_entries
+    return final_counts
+
+
+def parse_top_k(value):
+    """Return the top_k query parameter of a /reduce request (0 when absent)."""
+    try:
+        top_k = int(value or 0)
+    except ValueError:
+        raise ValueError(f"Invalid top_k: {value!r}") from None
+    if top_k < 0:
+        raise ValueError(f"Invalid top_k: {value!r}")
+    return top_k
+
+
+def select_top_k(counts, top_k):
+    """Return the top_k words of a reduced SpillingCounter as {word: count}, highest count first (all if top_k is 0)."""
+    return dict(counts.top_k(top_k)) if top_k else counts.to_dict()
+
+
+def write_reduce_output(output_dir, name, counts, order, top_k=0):
+    """Write a reduced SpillingCounter (its top_k words, if set) to a sorted result file.
+
+    Returns the JSON response object describing the file.
+    """
+    path = resolve_output_file(output_dir, name)
+    num_keys, num_words = write_partition_file(path, select_top_k(counts, top_k) if top_k else counts,
+                                               by_count=order == 'count')
+    return {"output_file": {"name": name, "num_keys": num_keys, "num_words": num_words}}
+
+
+def new_sketch(query):
+    """Return an empty WordSketch with the width, depth, precision and heavy_hitters query parameters of a /sketch request."""
+    try:
+        parameters = [int(query.get(name) or 0) for name in ('width', 'depth', 'precision', 'heavy_hitters')]
+    except ValueError:
+        raise ValueError("Sketch parameters must be integers") from None
+    return WordSketch(*parameters)
+
+
+def compress_response(body, mimetype, accept_encoding, gzip_min_bytes):
+    """Return (body, mimetype, content_encoding or None), gzipping a large enough body if the client accepts it."""
+    if len(body) >= gzip_min_bytes and accepts(accept_encoding, 'gzip'):
+        return gzip.compress(body, compresslevel=1), mimetype, 'gzip'
+    return body, mimetype, None
+
+
+def encode_counts_response(counts, accept, accept_encoding, gzip_min_bytes, timer):
+    """Return (body, mimetype, content_encoding or None) for a {word: count} response."""
+    if accepts(accept, MEDIA_TYPE):
+        body, mimetype = encode_counts(counts), MEDIA_TYPE
+    else:
+        body, mimetype = json.dumps(counts).encode('utf-8'), 'application/json'
+    timer.bytes_out = len(body)
+    return compress_response(body, mimetype, accept_encoding, gzip_min_bytes)
+
+
+def encode_sketch_response(sketch, accept_encoding, gzip_min_bytes, timer):
+    """Return (body, mimetype, content_encoding or None) for a sketch."""
+    timer.items_out = len(sketch.heavy_hitters)
+    body = sketch.to_bytes()
+    timer.bytes_out = len(body)
+    return compress_response(body, SKETCH_MEDIA_TYPE, accept_encoding, gzip_min_bytes)
@@ -1,57 +1,209 @@
+import functools
 import os
 import time
-from collections import defaultdict
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, make_response
+from common.mapcache import DIGEST_HEADER, MapResultCache
+from common.multicore import MapProcessPool
+from common.telemetry import METRICS_CONTENT_TYPE, TELEMETRY_HEADER, WorkerMetrics, telemetry_header
+from common.tokenizer import count_words
+from server.payloads import (count_map_input, decode_body, encode_counts_response, encode_sketch_response,
+                             new_sketch, parse_top_k, reduce_counts, select_top_k, sketch_map_input,
+                             write_reduce_output)
 
 # Configuration
 WORKER_ID = int(os.environ.get('WORKER_ID', 1))
 PORT = int(os.environ.get('PORT', 5000))
+# Processes used to count large map inputs (default: the container's CPU quota, 1 disables)
+MAP_PROCESSES = int(os.environ.get('MAP_PROCESSES', '0'))
+# Inputs shorter than this many characters are counted in the request thread
+MAP_PARALLEL_MIN_CHARS = int(os.environ.get('MAP_PARALLEL_MIN_CHARS', str(1_000_000)))
+# Responses smaller than this are not gzipped even if the client accepts it
+GZIP_MIN_BYTES = int(os.environ.get('GZIP_MIN_BYTES', '1024'))
+# Map result cache: counts of up to MAP_CACHE_BYTES of encoded results in memory, and (if MAP_CACHE_DIR is set)
+# up to MAP_CACHE_DIR_BYTES more in that local directory, kept across restarts. 0 bytes disables it
+MAP_CACHE_BYTES = int(os.environ.get('MAP_CACHE_BYTES', str(64 * 1024 * 1024)))
+MAP_CACHE_DIR = os.environ.get('MAP_CACHE_DIR', '')
+MAP_CACHE_DIR_BYTES = int(os.environ.get('MAP_CACHE_DIR_BYTES', str(1024 * 1024 * 1024)))
+# Directory /reduce writes result files to when asked for one (shared with the client)
+OUTPUT_DIR = os.environ.get('OUTPUT_DIR', '')
+# Estimated memory one /reduce request may aggregate in before it spills sorted runs to
+# SPILL_DIR (default: the system temporary directory) and merges them; 0 never spills
+REDUCE_MEMORY_BYTES = int(os.environ.get('REDUCE_MEMORY_BYTES', str(256 * 1024 * 1024)))
+SPILL_DIR = os.environ.get('SPILL_DIR', '')
+# HTTP server: 'flask' (threaded Flask server) or 'aiohttp' (asyncio, see server/async_worker.py)
+WORKER_SERVER = os.environ.get('WORKER_SERVER', 'flask').lower()
 
 app = Flask(__name__)
 
-def _tokenize_text(text):
-    """Tokenize text: split by whitespace and filter alphanumeric characters."""
-    text = text.lower()
-    words = [''.join(filter(str.isalnum, word)) for word in text.split()]
-    return [word for word in words if word]
+# Replaced with a multi-process pool when the worker is started as a script
+map_pool = MapProcessPool(count_words, processes=1)
+# Replaced with the configured cache when the worker is started as a script
+map_cache = MapResultCache(0)
+# Task telemetry of every request, served at /metrics
+metrics = WorkerMetrics(WORKER_ID)
+
+def timed_task(name):
+    """Run a view with a TaskTimer of its task (passed as timer), reporting it in TELEMETRY_HEADER and the metrics.
+
+    Whatever the view does after its timer's last lap counts as serialize.
+    """
+    def decorate(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            with metrics.task(name) as timer:
+                response = make_response(view(*args, timer=timer, **kwargs))
+                timer.lap('serialize')
+                response.headers[TELEMETRY_HEADER] = telemetry_header(timer)
+                return response
+        return wrapper
+    return decorate
+
+def read_body(timer):
+    """Return the raw request body, gunzipped if the client compressed it."""
+    data = decode_body(request.get_data(), request.headers.get('Content-Encoding'))
+    timer.bytes_in = len(data)
+    return data
+
+def sketch_response(sketch, timer):
+    """Return a sketch, gzipped if negotiated through Accept-Encoding."""
+    body, mimetype, content_encoding = encode_sketch_response(
+        sketch, request.headers.get('Accept-Encoding'), GZIP_MIN_BYTES, timer)
+    response = Response(body, mimetype=mimetype)
+    if content_encoding:
+        response.headers['Content-Encoding'] = content_encoding
+    return response
+
+def counts_response(counts, timer):
+    """Return {word: count} as binary pairs or JSON, as negotiated through Accept/Accept-Encoding."""
+    body, mimetype, content_encoding = encode_counts_response(
+        counts, request.headers.get('Accept'), request.headers.get('Accept-Encoding'), GZIP_MIN_BYTES, timer)
+    response = Response(body, mimetype=mimetype)
+    if content_encoding:
+        response.headers['Content-Encoding'] = content_encoding
+    return response
+
+@app.errorhandler(ValueError)
+def bad_payload(error):
+    """Reject undecodable request payloads."""
+    print(f"!!! Worker {WORKER_ID} rejected a request: {error}")
+    return jsonify({"error": str(error)}), 400
 
 @app.route("/map", methods=["POST"])
-def map_task():
-    """Map phase: tokenize input text and emit (word: count) dictionary."""
+@timed_task('map')
+def map_task(timer):
+    """Map phase: tokenize input text and emit (word: count) dictionary.
+
+    Accepts the chunk as a raw text/plain body or as JSON {"chunk": ...}.
+    With an X-Chunk-Digest header, the counts are also cached under it.
+    """
     start_time = time.perf_counter()
     
-    input_text = request.json.get("chunk", "")
+    # Process: Tokenize and count words (on several cores if the chunk is large)
+    input_text, intermediate_results = count_map_input(map_pool, map_cache, request.mimetype, read_body(timer),
+                                                       request.headers.get(DIGEST_HEADER), timer)
     print(f"Worker {WORKER_ID} received MapTask: '{(input_text[:30])}...'")
     
-    # Process: Tokenize and emit key-value pairs
-    words = _tokenize_text(input_text)
-    intermediate_results = {}
-    for word in words:
-        intermediate_results[word] = intermediate_results.get(word, 0) + 1
-    
     elapsed = time.perf_counter() - start_time
     print(f"Worker {WORKER_ID} MapTask completed: {len(intermediate_results)} unique words in {elapsed:.6f}s")
     
-    return jsonify(intermediate_results)
+    return counts_response(intermediate_results, timer)
+
+@app.route("/map/<digest>", methods=["GET"])
+@timed_task('map_cached')
+def cached_map_task(digest, timer):
+    """Map phase from the cache: return the counts of a chunk digest, or 404 if they are not cached."""
+    counts = map_cache.get(digest)
+    timer.lap('compute')
+    outcome = f"hit, {len(counts)} unique words" if counts is not None else "miss"
+    print(f"Worker {WORKER_ID} map cache {outcome} ({map_cache.summary()})")
+    if counts is None:
+        return jsonify({"error": "not cached"}), 404
+    timer.items_in, timer.items_out = sum(counts.values()), len(counts)
+    return counts_response(counts, timer)
 
 @app.route("/reduce", methods=["POST"])
-def reduce_task():
-    """Reduce phase: aggregate values for each key."""
+@timed_task('reduce')
+def reduce_task(timer):
+    """Reduce phase: aggregate values for each key.
+
+    Accepts the columnar, binary pair and JSON formats of reduce_counts().
+    With ?top_k=K only the K most frequent words are returned; with
+    ?output_file=NAME (and optionally &order=count) the result is written
+    to a sorted file under OUTPUT_DIR and only a description of it returned.
+    """
     start_time = time.perf_counter()
     print(f"Worker {WORKER_ID} received ReduceTask")
 
-    counts_list = request.json.get("counts", [])
-    final_counts = defaultdict(int)
+    top_k = parse_top_k(request.args.get('top_k'))
+    output_file = request.args.get('output_file')
+    with reduce_counts(request.mimetype, read_body(timer), timer, REDUCE_MEMORY_BYTES, SPILL_DIR) as counts:
+        if output_file:
+            output = write_reduce_output(OUTPUT_DIR, output_file, counts, request.args.get('order'), top_k)
+            timer.items_out = output["output_file"]["num_keys"]
+        else:
+            final_counts = select_top_k(counts, top_k)
+            timer.lap('compute')
+            timer.items_out = len(final_counts)
+        timer.record_spills(counts)
+
+    elapsed = time.perf_counter() - start_time
+    print(f"Worker {WORKER_ID} ReduceTask completed: {timer.items_out} keys in {elapsed:.6f}s")
     
-    for count_dict in counts_list:
-        for key, count in count_dict.items():
-            final_counts[key] += count
+    if output_file:
+        return jsonify(output)
+    return counts_response(final_counts, timer)
+
+@app.route("/sketch", methods=["POST"])
+@timed_task('sketch')
+def sketch_task(timer):
+    """Approximate map phase: count a chunk into a fixed-size sketch the client merges.
 
+    Accepts the same bodies and X-Chunk-Digest header as /map; the sketch
+    parameters (width, depth, precision, heavy_hitters) are query parameters.
+    """
+    start_time = time.perf_counter()
+    sketch = new_sketch(request.args)
+    input_text = sketch_map_input(map_pool, map_cache, sketch, request.mimetype, read_body(timer),
+                                  request.headers.get(DIGEST_HEADER), timer)
+    print(f"Worker {WORKER_ID} received SketchTask: '{(input_text[:30])}...'")
+    response = sketch_response(sketch, timer)
+    
     elapsed = time.perf_counter() - start_time
-    print(f"Worker {WORKER_ID} ReduceTask completed: {len(final_counts)} keys in {elapsed:.6f}s")
+    print(f"Worker {WORKER_ID} SketchTask completed: {sketch.total} words sketched in {elapsed:.6f}s")
     
-    return jsonify(final_counts)
+    return response
+
+@app.route("/sketch/<digest>", methods=["GET"])
+@timed_task('sketch_cached')
+def cached_sketch_task(digest, timer):
+    """Approximate map phase from the cache: return a sketch of a chunk digest's counts, or 404 if not cached."""
+    sketch = new_sketch(request.args)
+    counts = map_cache.get(digest)
+    timer.lap('compute')
+    outcome = f"hit, {len(counts)} unique words" if counts is not None else "miss"
+    print(f"Worker {WORKER_ID} map cache {outcome} ({map_cache.summary()})")
+    if counts is None:
+        return jsonify({"error": "not cached"}), 404
+    sketch.add_counts(counts)
+    timer.lap('compute')
+    timer.items_in = sketch.total
+    return sketch_response(sketch, timer)
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Prometheus metrics of the tasks this worker ran."""
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
 
 if __name__ == "__main__":
-    print(f"REST MapReduce Worker {WORKER_ID} running on port {PORT}...")
-    app.run(host="0.0.0.0", port=PORT)
+    # Create the map process pool before Flask starts serving threads
+    map_pool = MapProcessPool(count_words, processes=MAP_PROCESSES or None, min_chars=MAP_PARALLEL_MIN_CHARS)
+    print(f"REST MapReduce Worker {WORKER_ID} using {map_pool.processes} map process(es)")
+    map_cache = MapResultCache(MAP_CACHE_BYTES, MAP_CACHE_DIR, MAP_CACHE_DIR_BYTES)
+    print(f"REST MapReduce Worker {WORKER_ID} map cache: {map_cache.summary()}")
+    if WORKER_SERVER == 'aiohttp':
+        from server.async_worker import serve
+        serve(map_pool, WORKER_ID, PORT, GZIP_MIN_BYTES, OUTPUT_DIR, map_cache, metrics,
+              REDUCE_MEMORY_BYTES, SPILL_DIR)
+    else:
+        print(f"REST MapReduce Worker {WORKER_ID} running on port {PORT}...")
+        app.run(host="0.0.0.0", port=PORT)